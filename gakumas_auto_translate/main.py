@@ -3,7 +3,10 @@ Gakumas Auto Translate 主程序
 用于自动翻译游戏文本的工具
 """
 
-from .modules import config, checker, preprocessor, translator, merger, cleaner
+import argparse
+import sys
+from .modules import config, checker, preprocessor, translator, merger, cleaner, rebuild, watcher, pipeline
+from .modules.workspace import Workspace
 
 def print_menu():
     """打印命令行菜单"""
@@ -17,6 +20,7 @@ def print_menu():
     print("5. 完成并清理临时文件")
     print("6. 切换翻译模式")
     print("7. 收割在线协作完成稿（工作仓库 → todo/translated/csv）")
+    print("8. 用原始脚本和csv_data全量重建data目录")
     print("9. 配置并检测所需目录")
     print("0. 退出程序")
 
@@ -29,32 +33,87 @@ def check_config():
         return False
     return True
 
-def main():
-    """主程序入口"""
+def parse_args(argv=None):
+    """解析命令行参数；不带子命令时进入交互菜单"""
+    parser = argparse.ArgumentParser(description="Gakumas Auto Translate")
+    subparsers = parser.add_subparsers(dest="command")
+    watch = subparsers.add_parser("watch", help="监视dump_txt目录，新脚本写入完成后自动检查并预处理")
+    watch.add_argument("--settle", type=float, default=watcher.SETTLE_SECONDS,
+                       help="文件最后一次写入后等待的秒数，默认%(default)s")
+    watch.add_argument("--poll", action="store_true", help="不使用inotify，改为轮询目录")
+    watch.add_argument("--interval", type=float, default=watcher.POLL_INTERVAL,
+                       help="轮询间隔秒数，默认%(default)s")
+    watch.add_argument("--verbose", action="store_true", help="输出每个文件的完整预处理日志")
+    run = subparsers.add_parser("pipeline", help="在一个进程中依次执行检查到合并等阶段，以退出码报告结果")
+    run.add_argument("--from", dest="from_stage", choices=pipeline.STAGES, default="check",
+                     help="起始阶段，默认%(default)s")
+    run.add_argument("--to", dest="to_stage", choices=pipeline.STAGES, default="merge",
+                     help="结束阶段，默认%(default)s")
+    run.add_argument("--mode", choices=list(pipeline.MODES),
+                     help="合并模式（both同时生成中日双语和纯中文），默认使用当前翻译模式")
+    run.add_argument("--workers", type=int, default=0, help="预处理和合并的进程数，默认使用全部CPU核心")
+    run.add_argument("--run-translator", action="store_true",
+                     help="翻译阶段直接执行yarn translate:folder，否则准备好输入后停止")
+    run.add_argument("--status-file", help="把JSON格式的运行结果写入该文件")
+    return parser.parse_args(argv)
+
+def run_watch(args):
+    """监视模式：持续把新转储的脚本处理为待翻译CSV"""
+    if not check_config():
+        return False
+    workspace = Workspace.default()
+    source = watcher.open_source(workspace.dump_txt_path, poll=args.poll, interval=args.interval)
+    watcher.DumpWatcher(workspace, source, settle=args.settle, verbose=args.verbose).run()
+    return True
+
+def run_pipeline(args):
+    """流水线模式：无人值守地执行指定的阶段，返回退出码"""
+    if pipeline.STAGES.index(args.from_stage) > pipeline.STAGES.index(args.to_stage):
+        print(f"起始阶段 {args.from_stage} 在结束阶段 {args.to_stage} 之后")
+        return pipeline.EXIT_CODES[pipeline.FAILED]
+    workspace = Workspace.default()
+    if args.mode:
+        workspace.mode = pipeline.MODES[args.mode]
+    translate_command = pipeline.TRANSLATE_COMMAND if args.run_translator else None
+    return pipeline.run_pipeline(workspace, args.from_stage, args.to_stage, args.workers,
+                                 translate_command, args.status_file)
+
+def main(argv=None):
+    """主程序入口，命令行子命令返回退出码"""
+    args = parse_args(argv)
     # 程序启动时自动加载配置文件，但不再主动提示
     config.load_config()
+
+    if args.command == "watch":
+        return 0 if run_watch(args) else pipeline.EXIT_CODES[pipeline.FAILED]
+    if args.command == "pipeline":
+        return run_pipeline(args)
     
     while True:
         print_menu()
         choice = input("请输入选项数字: ").strip()
+        # 各功能使用当前目录的工作区（dump_txt路径和翻译模式取自配置）
+        workspace = Workspace.default()
 
         if choice == '1':
             # 功能1需要访问dump_txt_path，所以需要检查配置
             if not check_config():
                 continue
-            checker.check_new_files()
+            checker.check_new_files(workspace)
         elif choice == '2':
             # 功能2不直接访问dump_txt_path，无需检查配置
-            preprocessor.preprocess_txt_files()
+            # csv_data中已有上一版的剧本（脚本修订）沿用未改动行的译文
+            preprocessor.preprocess_txt_files(carry_over=True, workspace=workspace)
         elif choice == '3':
             # 功能3不直接访问dump_txt_path，无需检查配置
-            translator.translate_csv_files()
+            translator.translate_csv_files(workspace)
         elif choice == '4':
             # 功能4不直接访问dump_txt_path，无需检查配置
-            merger.merge_translations()
+            # 按文件并行生成txt，日志和错误报告顺序与单进程一致
+            merger.merge_translations(workers=0, workspace=workspace)
         elif choice == '5':
             # 功能5不直接访问dump_txt_path，无需检查配置
-            cleaner.cleanup_and_copy()
+            cleaner.cleanup_and_copy(workspace)
         elif choice == '6':
             # 切换翻译模式
             config.toggle_translation_mode()
@@ -62,6 +121,17 @@ def main():
             # 收割在线协作完成稿（两轨完成的 issue → 下载 CSV → 打"已入库"标签）
             import subprocess, sys
             subprocess.run([sys.executable, "tools/harvest_work_repo.py"])
+        elif choice == '8':
+            # 功能8从dump_txt读取原始脚本，需要检查配置
+            if not check_config():
+                continue
+            # 先重建到暂存目录并输出差异，确认后再整体替换data目录
+            staging_dir, _ = rebuild.build_staging(workers=0, workspace=workspace)
+            if staging_dir:
+                if input("是否用重建结果替换data目录？(y/n): ").strip().lower() == 'y':
+                    rebuild.swap_in(staging_dir, workspace.data_dir)
+                else:
+                    print(f"已保留重建结果: {staging_dir}")
         elif choice == '9':
             # 配置目录并确保 config.json 已创建
             dump_txt_path = config.configure_directories()
@@ -77,4 +147,4 @@ def main():
             print("无效的输入，请重新选择")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""
+译文沿用模块，原始脚本更新后把上一版CSV中的已有译文沿用到新生成的CSV
+"""
+
+import os
+import csv
+from difflib import SequenceMatcher
+from . import staging
+
+# 不参与对齐的信息行
+META_IDS = ('info', '译者')
+# csv_data中narration行的id为narration，预处理生成的id为0000000000000，比较前统一
+_ID_ALIASES = {'narration': '0000000000000'}
+# make_csv在缺少译文时写入的占位内容，不视为已有翻译
+_MISSING_TRANS = ('[中文翻译缺失]', '[中文选项缺失]')
+
+
+def row_key(row):
+    """行的对齐键 (id, name, text)"""
+    row_id = row.get('id') or ''
+    return (_ID_ALIASES.get(row_id, row_id), (row.get('name') or '').strip(), (row.get('text') or '').strip())
+
+
+def has_translation(row):
+    trans = row.get('trans') or ''
+    return bool(trans.strip()) and trans not in _MISSING_TRANS
+
+
+def _key_ids(rows, table):
+    """把每行的对齐键映射为整数编号（相同键编号相同），对齐时只比较整数"""
+    return [table.setdefault(row_key(row), len(table)) for row in rows]
+
+
+def carry_over_rows(rows, previous_rows):
+    """按 (id, name, text) 把rows与上一版previous_rows做序列对齐，把对齐行的已有译文写入trans
+
+    只沿用键完全相同且位于同一公共子序列中的行，新增或修改过的行保持原样（通常为空）。
+    返回 (新行列表, 沿用的行数)，不修改传入的行。
+    """
+    result = [dict(row) for row in rows]
+    new_indexes = [i for i, row in enumerate(result) if row.get('id') not in META_IDS]
+    old_rows = [row for row in previous_rows if row.get('id') not in META_IDS]
+    if not new_indexes or not old_rows:
+        return result, 0
+
+    table = {}
+    old_ids = _key_ids(old_rows, table)
+    new_ids = _key_ids([result[i] for i in new_indexes], table)
+    matcher = SequenceMatcher(None, old_ids, new_ids, autojunk=False)
+
+    carried = 0
+    for old_start, new_start, size in matcher.get_matching_blocks():
+        for offset in range(size):
+            old_row = old_rows[old_start + offset]
+            row = result[new_indexes[new_start + offset]]
+            if has_translation(old_row) and not has_translation(row):
+                row['trans'] = old_row['trans']
+                carried += 1
+    return result, carried
+
+
+def load_previous_rows(csv_name, previous_dir):
+    """读取上一版CSV的行，文件不存在或读取失败时返回None"""
+    path = os.path.join(previous_dir, csv_name)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            return list(csv.DictReader(f))
+    except (OSError, csv.Error, UnicodeDecodeError):
+        return None
+
+
+def pending_rows(rows):
+    """返回仍需翻译的行（trans为空的行，信息行保留）"""
+    return [row for row in rows if row.get('id') in META_IDS or not has_translation(row)]
+
+
+def write_pending_csv(src, dst):
+    """把src中仍需翻译的行写入dst（没有已有译文时直接链接或复制），返回 (总行数, 写入行数)"""
+    with open(src, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        rows = list(reader)
+    pending = pending_rows(rows)
+    if len(pending) == len(rows):
+        staging.link_file(src, dst)
+        return len(rows), len(rows)
+    with open(dst, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(pending)
+    return len(rows), len(pending)
+
+
+def splice_translations(orig_rows, translated_rows):
+    """把只含待翻译行的翻译结果按顺序填回完整行列表
+
+    orig_rows中已有译文的行保留原译文，其余行依次取translated_rows中的对应行；
+    行数或id对不上时返回None。
+    """
+    remaining = iter(translated_rows)
+    result = []
+    for orig_row in orig_rows:
+        if orig_row.get('id') not in META_IDS and has_translation(orig_row):
+            result.append(dict(orig_row))
+            continue
+        trans_row = next(remaining, None)
+        if trans_row is None or trans_row.get('id') != orig_row.get('id'):
+            return None
+        result.append(trans_row)
+    if next(remaining, None) is not None:
+        return None
+    return result
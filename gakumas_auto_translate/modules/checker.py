@@ -3,56 +3,142 @@
 """
 
 import os
-import shutil
-from .config import get_dump_txt_path, configure_directories
+import json
+from . import staging
+from .config import configure_directories
+from .encoding import record_files, content_hash
+from .workspace import Workspace
 
-def check_new_files():
-    """对比是否有新增txt文件"""
-    # 使用config模块的函数获取或配置dump_txt_path
-    dump_txt_path = get_dump_txt_path()
+
+# dump_txt目录的内容清单：{文件名: {size, mtime_ns, hash}}，记录上次检查时各脚本的版本，位于Workspace.dump_manifest_file
+def load_manifest(path):
+    """加载dump_txt内容清单，不存在或读取失败时返回空字典"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"读取dump清单时出错，将重新建立: {e}")
+        return {}
+
+
+def save_manifest(manifest, path):
+    """保存dump_txt内容清单"""
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+        return True
+    except Exception as e:
+        print(f"保存dump清单时出错: {e}")
+        return False
+
+
+def scan_entry(path, stat, record):
+    """返回文件的 (清单记录, 内容是否相对record变化)
+
+    大小和修改时间与record一致时直接复用记录，否则读取文件计算内容摘要；record为None时不算作内容变化。
+    """
+    if record and record['size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns:
+        return record, False
+    with open(path, 'rb') as f:
+        digest = content_hash(f.read())
+    current = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': digest}
+    return current, bool(record) and record['hash'] != digest
+
+
+def scan_dump(dump_txt_path, manifest):
+    """扫描dump_txt目录，返回 (当前清单, 内容有变化的文件, 已删除的文件)
+
+    用os.scandir取得大小和修改时间，只有与清单记录不同的文件才读取并计算内容摘要；
+    修改时间变化但内容相同的文件只更新记录。清单中没有记录的文件不算作内容变化。
+    """
+    current = {}
+    modified = set()
+    with os.scandir(dump_txt_path) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".txt") or not entry.is_file():
+                continue
+            current[entry.name], changed = scan_entry(entry.path, entry.stat(), manifest.get(entry.name))
+            if changed:
+                modified.add(entry.name)
+    deleted = set(manifest) - set(current)
+    return current, modified, deleted
+
+
+def queue_files(workspace, filenames, verbose=True):
+    """把dump_txt中的文件放入待翻译目录（同一文件系统上用硬链接）并记录编码，返回 (编码缓存, {方式: 文件数})"""
+    for d in workspace.todo_dirs:
+        os.makedirs(d, exist_ok=True)
+    counts = {}
+    for filename in filenames:
+        src = os.path.join(workspace.dump_txt_path, filename)
+        dst = os.path.join(workspace.todo_txt_dir, filename)
+        method = staging.link_file(src, dst)
+        counts[method] = counts.get(method, 0) + 1
+        if verbose:
+            print(f"已{method}: {src} -> {dst}")
+    # 识别并记录新增文件的编码，预处理和合并时直接复用
+    return record_files(workspace.todo_txt_dir, filenames), counts
+
+
+def check_new_files(workspace=None):
+    """对比是否有新增txt文件，并找出内容被修订的已有脚本（workspace默认为当前目录的工作区）
+
+    返回放入待翻译目录的文件名列表，没有新增或修订的文件时为空列表。
+    """
+    workspace = workspace or Workspace.default()
+    dump_txt_path = workspace.dump_txt_path
     
     if not dump_txt_path:
         # 如果配置文件中没有有效路径，使用configure_directories函数配置
         print("未找到dump_txt目录配置，需要先设置")
-        dump_txt_path = configure_directories()
+        dump_txt_path = workspace.dump_txt_path = configure_directories()
 
     # 确保data目录存在（虽然configure_directories已经处理过，这里为了安全保留）
-    if not os.path.exists("./data"):
-        os.makedirs("./data")
+    data_dir = workspace.data_dir
+    if not os.path.exists(data_dir):
+        os.makedirs(data_dir)
         print("已创建data目录")
         
-    # 获取两个目录的txt文件列表（仅文件名）
-    data_files = set(f for f in os.listdir("./data") if f.endswith(".txt"))
-    dump_files = set(f for f in os.listdir(dump_txt_path) if f.endswith(".txt"))
+    # 获取两个目录的txt文件列表（仅文件名），dump_txt按内容清单找出修订过的脚本
+    data_files = set(f for f in os.listdir(data_dir) if f.endswith(".txt"))
+    previous = load_manifest(workspace.dump_manifest_file)
+    manifest, modified_files, deleted_files = scan_dump(dump_txt_path, previous)
+    dump_files = set(manifest)
+    if not previous:
+        print(f"已为dump_txt的{len(manifest)}个文件建立内容清单，之后的检查可以发现同名脚本的内容修订")
 
-    # 找出新增文件
+    # 找出新增文件；同名但内容变化的已翻译脚本同样需要重新翻译
     new_files = dump_files - data_files
-    if not new_files:
+    modified_files -= new_files
+
+    if deleted_files:
+        print(f"dump_txt中已删除{len(deleted_files)}个文件:")
+        for f in sorted(deleted_files):
+            print(f"- {f}")
+    if modified_files:
+        print(f"发现{len(modified_files)}个内容修订的文件:")
+        for f in sorted(modified_files):
+            print(f"- {f}")
+    if not new_files and not modified_files:
+        save_manifest(manifest, workspace.dump_manifest_file)
         print("没有发现新增文件")
-        return False
+        return []
 
-    print(f"发现{len(new_files)}个新增文件:")
-    for f in new_files:
-        print(f"- {f}")
-
-    # 创建todo目录结构
-    todo_dirs = [
-        "./todo/untranslated/txt",
-        "./todo/untranslated/csv_orig",  # 修改为csv_orig
-        "./todo/untranslated/csv_dict",  # 新增csv_dict目录
-        "./todo/translated/csv",
-        "./todo/translated/txt"
-    ]
-    for d in todo_dirs:
-        os.makedirs(d, exist_ok=True)
-        print(f"已创建目录: {d}")
-
-    # 复制新增文件
-    dest_dir = "./todo/untranslated/txt"
-    for filename in new_files:
-        src = os.path.join(dump_txt_path, filename)
-        dst = os.path.join(dest_dir, filename)
-        shutil.copy2(src, dst)
-        print(f"已复制: {src} -> {dst}")
+    if new_files:
+        print(f"发现{len(new_files)}个新增文件:")
+        for f in new_files:
+            print(f"- {f}")
+
+    # 创建todo目录结构，放置新增和修订的文件（修订的文件预处理时沿用csv_data中未改动行的译文）
+    new_files |= modified_files
+    cache, counts = queue_files(workspace, new_files)
+    print(f"已放置{len(new_files)}个文件（{staging.format_counts(counts)}）")
+    encodings = sorted(set(cache[f]['encoding'] for f in new_files if f in cache))
+    print(f"已记录文件编码: {', '.join(encodings) or '无'}")
+
+    # 已加入待翻译的修订记入清单，下次检查不再重复报告
+    save_manifest(manifest, workspace.dump_manifest_file)
     
-    return True
\ No newline at end of file
+    return sorted(new_files)
\ No newline at end of file
@@ -4,45 +4,60 @@
 
 import os
 import shutil
+from . import staging
+from .workspace import Workspace
 
-def cleanup_and_copy():
-    """清理临时文件并复制最终文件"""
-    # 第一步：处理并复制翻译文件到data目录
-    source_dir = "./todo/translated/txt"
-    data_dir = "./data"
-    copied_files = []
+def _archive_outputs(source_dir, target_dir):
+    """把source_dir中的合并结果事务性地更新到target_dir，返回是否成功（没有需要更新的文件也算成功）"""
+    # 上次在替换目录时中断的，先恢复原目录
+    staging.recover_dir(target_dir)
+    copied_files = sorted(f for f in os.listdir(source_dir) if f.endswith(".txt"))
+    if not copied_files:
+        print(f"没有需要复制到{target_dir}的翻译文件")
+        return True
+    # 先在暂存目录中组装更新后的目录（硬链接，不复制文件内容），全部成功后整体替换，
+    # 中途出错或中断时目标目录保持原样
+    try:
+        counts = staging.update_dir(target_dir, source_dir, copied_files)
+    except Exception as e:
+        print(f"更新{target_dir}目录失败，{target_dir}目录未改动，临时文件已保留: {e}")
+        return False
+    print(f"已更新{len(copied_files)}个文件到{target_dir}目录（{staging.format_counts(counts)}）:")
+    for f in copied_files:
+        print(f"- {f}")
+    return True
 
-    # 确保源目录存在
+
+def cleanup_and_copy(workspace=None):
+    """清理临时文件并复制最终文件（workspace默认为当前目录的工作区）
+
+    中日双语或纯中文合并结果更新到data目录；双输出模式的纯中文结果更新到data_chinese目录。
+    任一目录更新失败时不清理临时文件，修正后可以重新执行。
+    """
+    workspace = workspace or Workspace.default()
+    # 第一步：把翻译文件更新到data目录
+    source_dir = workspace.translated_txt_dir
     if os.path.exists(source_dir):
-        # 处理adv_unit_开头的文件
-        print("处理adv_unit_开头的文件...")
-        
-        # 创建目标目录（如果不存在）
-        os.makedirs(data_dir, exist_ok=True)
-        
-        # 遍历所有txt文件
-        for filename in os.listdir(source_dir):
-            if filename.endswith(".txt"):
-                src = os.path.join(source_dir, filename)
-                dst = os.path.join(data_dir, filename)
-                shutil.copy2(src, dst)
-                copied_files.append(filename)
-        
-        if copied_files:
-            print(f"已复制{len(copied_files)}个文件到data目录:")
-            for f in copied_files:
-                print(f"- {f}")
-        else:
-            print("没有需要复制的翻译文件")
+        if not _archive_outputs(source_dir, workspace.data_dir):
+            return False
     else:
         print("警告: 翻译文件目录不存在 -", source_dir)
+        staging.recover_dir(workspace.data_dir)
+
+    # 双输出模式同时生成的纯中文结果，与data目录分开归档
+    chinese_dir = workspace.translated_txt_chinese_dir
+    if os.path.isdir(chinese_dir) and any(f.endswith(".txt") for f in os.listdir(chinese_dir)):
+        if not _archive_outputs(chinese_dir, workspace.data_chinese_dir):
+            return False
 
     # 第二步：清理todo目录
     todo_dirs = [
-        "./todo/untranslated/txt",
-        "./todo/untranslated/csv_orig",
-        "./todo/untranslated/csv_dict",
-        "./todo/translated/txt"
+        workspace.todo_txt_dir,
+        workspace.csv_orig_dir,
+        workspace.csv_dict_dir,
+        workspace.csv_suggest_dir,
+        workspace.translated_txt_dir,
+        workspace.translated_txt_chinese_dir
     ]
     
     cleaned_dirs = []
@@ -65,8 +80,8 @@ def cleanup_and_copy():
         print("todo目录中没有需要清理的内容")
     
     # 移动translated/csv文件到csv_data目录
-    csv_source_dir = "./todo/translated/csv"
-    csv_target_dir = "./csv_data"
+    csv_source_dir = workspace.translated_csv_dir
+    csv_target_dir = workspace.csv_data_dir
     moved_csv_files = []
     
     if os.path.exists(csv_source_dir):
@@ -78,7 +93,7 @@ def cleanup_and_copy():
             src = os.path.join(csv_source_dir, filename)
             dst = os.path.join(csv_target_dir, filename)
             if os.path.isfile(src):
-                shutil.move(src, dst)
+                staging.move_file(src, dst)
                 moved_csv_files.append(filename)
         
         if moved_csv_files:
@@ -92,8 +107,8 @@ def cleanup_and_copy():
 
     # 第三步：清理Gakumas的临时目录
     gakumas_tmp_dirs = [
-        "./GakumasPreTranslation/tmp/untranslated",
-        "./GakumasPreTranslation/tmp/translated"
+        workspace.gakumas_untranslated_dir,
+        workspace.gakumas_translated_dir
     ]
     
     cleaned_gakumas = []
@@ -9,7 +9,7 @@ from .utils import create_sample_dictionary, ensure_dir_exists
 
 # 全局配置变量
 dump_txt_path = None
-translation_mode = "bilingual"  # 翻译模式：bilingual（双语）或 chinese（纯中文）
+translation_mode = "bilingual"  # 翻译模式：bilingual（双语）、chinese（纯中文）或 dual（一次合并同时输出两种）
 # 配置文件路径
 CONFIG_FILE = "./config.json"
 
@@ -131,11 +131,18 @@ def get_translation_mode():
         
     return translation_mode
 
+# 翻译模式及其显示名称，切换时按此顺序循环
+TRANSLATION_MODES = {
+    "bilingual": "中日双语",
+    "chinese": "纯中文",
+    "dual": "中日双语+纯中文",
+}
+
 def set_translation_mode(mode):
     """设置翻译模式"""
     global translation_mode
     
-    if mode in ['bilingual', 'chinese']:
+    if mode in TRANSLATION_MODES:
         translation_mode = mode
         # 保存配置到文件
         save_config()
@@ -146,13 +153,14 @@ def set_translation_mode(mode):
 
 def get_translation_mode_display():
     """获取翻译模式的显示名称"""
-    mode = get_translation_mode()
-    return "中日双语" if mode == "bilingual" else "纯中文"
+    return TRANSLATION_MODES.get(get_translation_mode(), "纯中文")
 
 def toggle_translation_mode():
     """切换翻译模式"""
+    modes = list(TRANSLATION_MODES)
     current_mode = get_translation_mode()
-    new_mode = "chinese" if current_mode == "bilingual" else "bilingual"
+    # 按 中日双语 → 纯中文 → 双输出 循环切换
+    new_mode = modes[(modes.index(current_mode) + 1) % len(modes)] if current_mode in modes else modes[0]
     if set_translation_mode(new_mode):
         print(f"翻译模式已切换为: {get_translation_mode_display()}")
         return True
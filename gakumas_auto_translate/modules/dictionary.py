@@ -0,0 +1,175 @@
+"""
+字典模块，负责加载人名字典并进行多模式人名替换
+"""
+
+import os
+import re
+import json
+
+
+def load_name_dictionary(dict_file):
+    """加载人名字典，失败时返回None"""
+    if not os.path.exists(dict_file):
+        print(f"未找到字典文件: {dict_file}")
+        return None
+    try:
+        with open(dict_file, 'r', encoding='utf-8') as f:
+            name_dict = json.load(f)
+        print(f"已加载字典，包含 {len(name_dict)} 个替换项")
+        return name_dict
+    except Exception as e:
+        print(f"加载字典文件时出错: {e}")
+        return None
+
+
+def legacy_replace(text, items, compiled=None):
+    """按字典顺序逐项替换（原CSV字典替换的逐项算法，作为单次扫描的对照和回退）
+
+    先做带词边界的re.sub，再做不带边界的str.replace。
+    compiled为预编译好的词边界正则列表，与items一一对应。
+    """
+    if compiled is None:
+        compiled = [re.compile(r'\b' + re.escape(jp_term) + r'\b') for jp_term, _ in items]
+    for (jp_term, cn_term), pattern in zip(items, compiled):
+        text = pattern.sub(cn_term, text)
+        if jp_term in text:
+            text = text.replace(jp_term, cn_term)
+    return text
+
+
+def _trie_pattern(terms):
+    """把词条构造成前缀树形式的正则，同一起点总是优先匹配最长词条"""
+    trie = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def build(node):
+        is_end = '' in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch != '']
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if is_end:
+            # 贪婪的可选分支：先尝试更长的延伸，失败再在此处结束
+            return '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+
+def _self_overlaps(term):
+    """词条的真前缀与真后缀相同时，其出现位置可能互相重叠"""
+    return any(term[:i] == term[-i:] for i in range(1, len(term)))
+
+
+class NameReplacer:
+    """一次构建、线性扫描的人名替换器
+
+    用前缀树正则一次扫描找出文本中所有词条的出现位置，按最长匹配直接拼接替换结果。
+    每个词条的替换值预先用逐项算法对词条本身求出，因此连锁替换（A→B后B又被替换）的结果不变。
+    对逐项算法结果依赖上下文的情况（词条交叉重叠、内含更早替换的词条、替换值含自身、替换值可能与相邻文本拼出新词条），
+    该行回退到逐项算法，保证输出与原替换顺序完全一致。
+    """
+
+    def __init__(self, name_dict):
+        self.items = [(k, v) for k, v in name_dict.items()]
+        self._compiled = [re.compile(r'\b' + re.escape(k) + r'\b') for k, _ in self.items]
+        terms = [k for k, _ in self.items if k]
+        self._unsafe = set()
+        self._values = {}
+        if len(terms) != len(self.items):
+            # 空词条会在每个位置插入替换值，整体交给逐项算法
+            self._search = None
+            self._scan = None
+            return
+        body = _trie_pattern(terms)
+        self._search = re.compile(body)
+        # 零宽前瞻：在每个位置找出以该位置开头的最长词条，可发现重叠的出现
+        self._scan = re.compile('(?=(' + body + '))')
+
+        order = {term: index for index, term in enumerate(terms)}
+        for term in terms:
+            if any(other != term and other in term and order[other] < order[term] for other in terms):
+                # 词条内部含有更早被替换的词条，逐项算法会先拆开它
+                self._unsafe.add(term)
+                continue
+            value, stages = self._isolated_stages(term)
+            if not self._stages_are_closed(stages, terms):
+                self._unsafe.add(term)
+                continue
+            self._values[term] = value
+
+    def _isolated_stages(self, term):
+        """对单独的词条运行逐项算法，返回最终值和所有中间结果（附带产生它的字典项序号）"""
+        text = term
+        stages = []
+        for index, ((jp_term, cn_term), pattern) in enumerate(zip(self.items, self._compiled)):
+            if '\\' in cn_term and pattern.search(text):
+                # 替换值会被re.sub当作模板解析，无法离线推导
+                return None, None
+            new_text = pattern.sub(cn_term, text)
+            if jp_term in new_text:
+                if jp_term != cn_term and jp_term in cn_term:
+                    # 替换值含有自身，结果取决于词边界和整行内容
+                    return None, None
+                new_text = new_text.replace(jp_term, cn_term)
+            if new_text != text:
+                stages.append((index, new_text))
+                text = new_text
+        return text, stages
+
+    @staticmethod
+    def _stages_are_closed(stages, terms):
+        """检查中间结果插入任意上下文后，都不会与相邻文本拼出之后才替换的词条"""
+        if stages is None:
+            return False
+        for index, stage in stages:
+            if not stage:
+                return False
+            for other in terms[index + 1:]:
+                if other in stage and _self_overlaps(other):
+                    # 可自重叠的词条在不同上下文中的替换位置可能不同
+                    return False
+                if len(other) > len(stage) and stage in other:
+                    return False
+                for i in range(len(stage)):
+                    # 词条从中间结果内部开始，延伸到其右侧
+                    tail = stage[i:]
+                    if len(other) > len(tail) and other.startswith(tail):
+                        return False
+                for j in range(1, len(stage) + 1):
+                    # 词条从中间结果左侧开始，结束在其内部
+                    head = stage[:j]
+                    if len(other) > len(head) and other.endswith(head):
+                        return False
+        return True
+
+    def replace(self, text):
+        """替换文本中的人名和称谓，结果与逐项算法一致"""
+        if not text:
+            return text
+        if self._search is None:
+            return legacy_replace(text, self.items, self._compiled)
+        if self._search.search(text) is None:
+            return text
+
+        pieces = []
+        pos = 0
+        for match in self._scan.finditer(text):
+            start = match.start()
+            term = match.group(1)
+            if start < pos:
+                if start + len(term) <= pos:
+                    # 被已替换词条完全包含的短词条，逐项算法中会随长词条一起被替换掉
+                    continue
+                return legacy_replace(text, self.items, self._compiled)
+            if term in self._unsafe:
+                return legacy_replace(text, self.items, self._compiled)
+            pieces.append(text[pos:start])
+            pieces.append(self._values[term])
+            pos = start + len(term)
+        pieces.append(text[pos:])
+        return ''.join(pieces)
@@ -0,0 +1,139 @@
+"""
+编码识别模块，负责一次读取识别原始脚本编码，并用旁路缓存记录识别结果
+"""
+
+import os
+import json
+import codecs
+import hashlib
+
+# 旁路缓存文件名，与被识别的txt文件放在同一目录
+CACHE_FILE = ".encoding_cache.json"
+
+# 非UTF-8文件的候选编码，按旧版逐个尝试的顺序排列
+FALLBACK_ENCODINGS = ['shift-jis', 'gbk', 'cp932', 'latin1', 'cp1252']
+
+_BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+
+def sniff_encoding(data):
+    """识别字节内容的编码并解码，返回 (编码, 文本)，无法识别时返回 (None, None)
+
+    依次检查BOM、纯ASCII、UTF-8合法性；都不满足时按旧版顺序尝试候选编码，
+    失败的尝试在第一个非法字节处即停止，只有最终选中的编码会完整解码一次。
+    """
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            try:
+                return encoding, data.decode(encoding)
+            except UnicodeDecodeError:
+                break
+    if data.isascii():
+        return 'utf-8', data.decode('ascii')
+    try:
+        return 'utf-8', data.decode('utf-8')
+    except UnicodeDecodeError:
+        pass
+    for encoding in FALLBACK_ENCODINGS:
+        try:
+            return encoding, data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return None, None
+
+
+def content_hash(data):
+    """计算文件内容的快速摘要"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def load_cache(directory):
+    """加载目录下的编码缓存，返回 {文件名: 记录}"""
+    path = os.path.join(directory, CACHE_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"读取编码缓存时出错，将重新识别: {e}")
+        return {}
+
+
+def save_cache(directory, cache, source_dir=None):
+    """保存目录下的编码缓存（只保留source_dir中仍存在的文件，source_dir默认为缓存所在目录）"""
+    if not os.path.isdir(directory):
+        return False
+    source_dir = source_dir or directory
+    cache = {name: entry for name, entry in cache.items()
+             if os.path.exists(os.path.join(source_dir, name))}
+    try:
+        with open(os.path.join(directory, CACHE_FILE), 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False, indent=1, sort_keys=True)
+        return True
+    except Exception as e:
+        print(f"保存编码缓存时出错: {e}")
+        return False
+
+
+def _cached_encoding(entry, data, stat):
+    """缓存记录与文件一致时返回缓存的编码：大小和修改时间都相同，或修改时间变化但内容摘要相同"""
+    if not entry or entry.get('size') != len(data):
+        return None
+    if entry.get('mtime_ns') == stat.st_mtime_ns or entry.get('hash') == content_hash(data):
+        return entry.get('encoding')
+    return None
+
+
+def read_text(path, cache=None):
+    """读取文本文件，返回 (文本, 编码)，无法识别编码时返回 (None, None)
+
+    文件只读取一次、只完整解码一次；换行与文本模式读取一致（\\r\\n、\\r统一为\\n）。
+    cache为load_cache返回的字典，命中时直接使用记录的编码，未命中时识别后写入记录。
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    stat = os.stat(path)
+    name = os.path.basename(path)
+    entry = cache.get(name) if cache is not None else None
+
+    text = None
+    encoding = _cached_encoding(entry, data, stat)
+    if encoding:
+        try:
+            text = data.decode(encoding)
+        except (UnicodeDecodeError, LookupError):
+            encoding = None
+    if encoding is None:
+        encoding, text = sniff_encoding(data)
+        if encoding is None:
+            return None, None
+
+    if cache is not None:
+        unchanged = entry and entry.get('mtime_ns') == stat.st_mtime_ns and entry.get('size') == len(data)
+        cache[name] = {
+            'size': len(data),
+            'mtime_ns': stat.st_mtime_ns,
+            'hash': entry.get('hash') if unchanged and entry.get('hash') else content_hash(data),
+            'encoding': encoding,
+        }
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text, encoding
+
+
+def record_files(directory, filenames):
+    """识别目录中指定文件的编码并写入缓存，供后续各步骤直接复用"""
+    cache = load_cache(directory)
+    for filename in filenames:
+        path = os.path.join(directory, filename)
+        if os.path.isfile(path):
+            read_text(path, cache)
+    save_cache(directory, cache)
+    return cache
@@ -0,0 +1,171 @@
+"""
+脚本词法模块，一次线性扫描解析ADV脚本中的文本指令
+
+脚本每行是一条 [command attr=value ...] 指令，其中 message、narration、title 和
+choicegroup 中的 choice 带有需要翻译的文本。lex_script 为这些文本生成记录，
+只保存偏移量（文本、name属性、clip属性在原字符串中的区间），不复制clip等长属性内容。
+文本的截止规则与原预处理正则一致。
+"""
+
+import re
+from collections import namedtuple
+
+# kind: message / narration / title / choice；command: 所在指令名
+# start/end: 文本区间；name_start/name_end: message的name属性值区间（无则为-1）
+# clip_start/clip_end: clip属性值区间（无则为-1）；偏移量均相对于传入的完整字符串
+TextRecord = namedtuple('TextRecord', [
+    'kind', 'command', 'line_no', 'line_start', 'line_end',
+    'start', 'end', 'name_start', 'name_end', 'clip_start', 'clip_end',
+])
+
+# 只有含这些片段的行可能带有文本（message/narration/choice的text=与title的title=），其余指令行不进入逐行解析
+_CANDIDATE_LITERALS = ('text=', 'title=')
+_MESSAGE_PREFIX = '[message text='
+# message文本在下一个已知属性或 ] 前结束
+_MESSAGE_END_RE = re.compile(r'\s+(?:name|hide|isInner|se|clip)=|\]')
+# choice、title、narration文本在下一个任意属性或 ] 前结束
+_ATTR_END_RE = re.compile(r'\s+\w+=|\]')
+_MESSAGE_NAME_RE = re.compile(r'\sname=\s*([^\s\]]+)')
+_CHOICE_RE = re.compile(r'choice text=')
+_TITLE_RE = re.compile(r'\[\[?title title=')
+_NARRATION_RE = re.compile(r'\[\[?narration text=')
+_CLIP_RE = re.compile(r'\sclip=')
+_COMMAND_RE = re.compile(r'\[+(\w+)')
+_START_TIME_RE = re.compile(r'"_startTime":([\d\.]+)')
+# name属性值到空白或 ] 为止（message说话人、overwritecharactersetting等）
+_NAME_VALUE_RE = re.compile(r'[^\s\]]*')
+
+
+def _clip_span(content, pos, end):
+    """在 [pos, end) 中查找clip属性值区间，返回 (起点, 终点)，无clip时返回 (-1, -1)
+
+    clip值为 \\{...\\} 包裹的JSON，其后的属性不含花括号，因此终点取行内最后一个 \\}。
+    """
+    match = _CLIP_RE.search(content, pos, end)
+    if not match:
+        return -1, -1
+    start = match.end()
+    if content.startswith('\\{', start):
+        close = content.rfind('\\}', start, end)
+        if close >= 0:
+            return start, close + 2
+        return start, end
+    stop = _ATTR_END_RE.search(content, start, end)
+    return start, stop.start() if stop else end
+
+
+def _lex_line(content, line_no, line_start, line_end, records):
+    """解析一行（已去除首尾空白的区间），把文本记录追加到records"""
+    if content.startswith(_MESSAGE_PREFIX, line_start, line_end):
+        start = line_start + len(_MESSAGE_PREFIX)
+        stop = _MESSAGE_END_RE.search(content, start, line_end)
+        if stop:
+            end = stop.start()
+            name = _MESSAGE_NAME_RE.search(content, end, line_end)
+            name_start, name_end = name.span(1) if name else (-1, -1)
+            clip_start, clip_end = _clip_span(content, end, line_end)
+            records.append(TextRecord('message', 'message', line_no, line_start, line_end,
+                                      start, end, name_start, name_end, clip_start, clip_end))
+            return
+
+    choices = []
+    pos = line_start
+    while True:
+        match = _CHOICE_RE.search(content, pos, line_end)
+        if not match:
+            break
+        stop = _ATTR_END_RE.search(content, match.end(), line_end)
+        if not stop:
+            break
+        choices.append((match.end(), stop.start()))
+        pos = stop.end()
+    if choices:
+        clip_start, clip_end = _clip_span(content, choices[-1][1], line_end)
+        command = _COMMAND_RE.match(content, line_start, line_end)
+        command = command.group(1) if command else ''
+        for start, end in choices:
+            records.append(TextRecord('choice', command, line_no, line_start, line_end,
+                                      start, end, -1, -1, clip_start, clip_end))
+        return
+
+    for kind, prefix_re in (('title', _TITLE_RE), ('narration', _NARRATION_RE)):
+        match = prefix_re.match(content, line_start, line_end)
+        if not match:
+            continue
+        stop = _ATTR_END_RE.search(content, match.end(), line_end)
+        if stop:
+            end = stop.start()
+            clip_start, clip_end = _clip_span(content, end, line_end)
+            records.append(TextRecord(kind, kind, line_no, line_start, line_end,
+                                      match.end(), end, -1, -1, clip_start, clip_end))
+            return
+
+
+def lex_script(content):
+    """按文件顺序返回脚本中所有文本记录（TextRecord列表）
+
+    每行按 message → choice → title → narration 的优先级识别，与原预处理规则一致；
+    行号从1开始，行以\\n分隔，首尾空白不计入行区间。
+    候选片段用str.find查找，解析完一行后从行尾继续，行内的clip等长属性不会被重复扫描。
+    """
+    records = []
+    line_no = 1
+    counted = 0
+    pos = 0
+    # 每个候选片段下一次出现的位置，只在扫描位置越过它时重新查找
+    upcoming = [content.find(literal) for literal in _CANDIDATE_LITERALS]
+    while True:
+        for i, found in enumerate(upcoming):
+            if 0 <= found < pos:
+                upcoming[i] = content.find(_CANDIDATE_LITERALS[i], pos)
+        hits = [found for found in upcoming if found >= 0]
+        if not hits:
+            break
+        hit = min(hits)
+        line_start = content.rfind('\n', 0, hit) + 1
+        line_no += content.count('\n', counted, line_start)
+        counted = line_start
+        line_end = content.find('\n', hit)
+        if line_end < 0:
+            line_end = len(content)
+        pos = line_end + 1
+        # 与 line.strip() 一致地去除首尾空白
+        while line_start < line_end and content[line_start].isspace():
+            line_start += 1
+        stripped_end = line_end
+        while stripped_end > line_start and content[stripped_end - 1].isspace():
+            stripped_end -= 1
+        _lex_line(content, line_no, line_start, stripped_end, records)
+    return records
+
+
+def name_spans(content):
+    """返回所有指令中name属性值的区间列表 [(起点, 终点)]，按文件顺序"""
+    spans = []
+    pos = content.find('name=')
+    while pos >= 0:
+        start = pos + 5
+        if pos > 0 and content[pos - 1].isspace():
+            spans.append(_NAME_VALUE_RE.match(content, start).span())
+        pos = content.find('name=', start)
+    return spans
+
+
+def record_text(content, record):
+    """返回记录的原始文本"""
+    return content[record.start:record.end]
+
+
+def record_name(content, record):
+    """返回message记录的name属性值，无name时返回空字符串"""
+    if record.name_start < 0:
+        return ''
+    return content[record.name_start:record.name_end]
+
+
+def clip_start_time(content, record):
+    """从记录的clip属性中读取 _startTime，无clip或无该字段时返回None"""
+    if record.clip_start < 0:
+        return None
+    match = _START_TIME_RE.search(content, record.clip_start, record.clip_end)
+    return match.group(1) if match else None
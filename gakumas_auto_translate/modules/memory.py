@@ -0,0 +1,403 @@
+"""
+翻译记忆模块，用csv_data中已有的译文为新批次预填完全相同的原文
+"""
+
+import os
+import re
+import csv
+import json
+import struct
+import hashlib
+
+from .utils import clean_html_tags, tag_signature
+from . import carryover
+
+# 旁路缓存文件名，记录每个CSV提取出的 (原文, 译文) 对，文件未变化时不再重新读取
+CACHE_FILE = ".tm_cache.json"
+
+# 译者行中的机翻模型名称特征（gpt-4o-2024-05-13、deepseek-chat、Pro/deepseek-ai/DeepSeek-V3 等）
+_MACHINE_TRANSLATOR_RE = re.compile(
+    r'gpt|deepseek|claude|gemini|qwen|glm|llama|mistral|kimi|doubao|/|\d{4}-\d{2}-\d{2}', re.IGNORECASE)
+
+# 译文来源的优先级：人工翻译 > 未标注译者 > 机翻
+RANK_HUMAN = 2
+RANK_UNKNOWN = 1
+RANK_MACHINE = 0
+
+
+def translator_rank(translator):
+    """根据译者行的名称判断译文来源的优先级"""
+    translator = (translator or '').strip()
+    if not translator:
+        return RANK_UNKNOWN
+    if _MACHINE_TRANSLATOR_RE.search(translator):
+        return RANK_MACHINE
+    return RANK_HUMAN
+
+
+def normalize_text(text):
+    """翻译记忆的查找键：去除首尾空白的原文（保留标签和\\n记号）"""
+    return (text or '').strip()
+
+
+def read_memory_entry(path):
+    """读取一个CSV，返回 {'translator': 译者, 'pairs': [[原文, 译文], ...]}，读取失败时返回None
+
+    只收录有译文且译文标签与原文一致的行，保证预填的译文在两条输出线上都可以直接使用。
+    """
+    try:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+    except (OSError, csv.Error, UnicodeDecodeError):
+        return None
+    translator = ''
+    pairs = []
+    for row in rows:
+        row_id = row.get('id')
+        if row_id == '译者':
+            translator = row.get('name') or ''
+            continue
+        if row_id in carryover.META_IDS or not carryover.has_translation(row):
+            continue
+        text = normalize_text(row.get('text'))
+        trans = row['trans']
+        if text and tag_signature(text) == tag_signature(trans):
+            pairs.append([text, trans])
+    return {'translator': translator, 'pairs': pairs}
+
+
+def load_cache(directory):
+    """加载目录下的翻译记忆缓存，返回 {文件名: 记录}"""
+    path = os.path.join(directory, CACHE_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"读取翻译记忆缓存时出错，将重新建立: {e}")
+        return {}
+
+
+def save_cache(directory, cache):
+    """保存目录下的翻译记忆缓存"""
+    try:
+        with open(os.path.join(directory, CACHE_FILE), 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+        return True
+    except Exception as e:
+        print(f"保存翻译记忆缓存时出错: {e}")
+        return False
+
+
+class TranslationMemory:
+    """原文 → 最佳译文的精确匹配翻译记忆
+
+    同一原文有多个译文时，依次按译者优先级（人工 > 未标注 > 机翻）、出现次数选择，
+    仍相同时取文件名排序靠前的译文。
+    """
+
+    def __init__(self, entries=()):
+        candidates = {}
+        for entry in entries:
+            rank = translator_rank(entry.get('translator'))
+            for text, trans in entry.get('pairs', ()):
+                scores = candidates.setdefault(text, {})
+                score = scores.get(trans)
+                if score is None:
+                    scores[trans] = [rank, 1]
+                else:
+                    score[0] = max(score[0], rank)
+                    score[1] += 1
+        self._best = {text: max(scores.items(), key=lambda item: item[1])[0]
+                      for text, scores in candidates.items()}
+
+    def __len__(self):
+        return len(self._best)
+
+    def items(self):
+        """遍历 (原文, 最佳译文)"""
+        return self._best.items()
+
+    def lookup(self, text):
+        """返回原文对应的译文，未命中时返回None"""
+        return self._best.get(normalize_text(text))
+
+    @classmethod
+    def load(cls, directory):
+        """从目录中的CSV建立翻译记忆
+
+        旁路缓存中大小和修改时间未变的文件直接复用，只重新读取新增或修改过的文件，
+        已删除文件的记录随缓存一起移除。
+        """
+        if not os.path.isdir(directory):
+            return cls()
+        cache = load_cache(directory)
+        filenames = sorted(f for f in os.listdir(directory) if f.endswith('.csv'))
+        entries = {}
+        updated = 0
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            stat = os.stat(path)
+            entry = cache.get(filename)
+            if not entry or entry.get('size') != stat.st_size or entry.get('mtime_ns') != stat.st_mtime_ns:
+                entry = read_memory_entry(path)
+                if entry is None:
+                    continue
+                entry['size'] = stat.st_size
+                entry['mtime_ns'] = stat.st_mtime_ns
+                updated += 1
+            entries[filename] = entry
+        if updated or len(entries) != len(cache):
+            save_cache(directory, entries)
+        print(f"翻译记忆: {len(filenames)} 个文件（重新读取 {updated} 个）")
+        return cls(entries[f] for f in filenames if f in entries)
+
+    def prefill(self, rows):
+        """为trans为空的文本行填入命中的译文，返回 (新行列表, 命中行数, 待翻译行数)，不修改传入的行"""
+        result = [dict(row) for row in rows]
+        hits = 0
+        pending = 0
+        for row in result:
+            if row.get('id') in carryover.META_IDS or carryover.has_translation(row):
+                continue
+            pending += 1
+            trans = self.lookup(row.get('text'))
+            if trans is not None:
+                row['trans'] = trans
+                hits += 1
+        return result, hits, pending
+
+
+def _read_rows(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        return reader.fieldnames, list(reader)
+
+
+def _write_rows(path, fieldnames, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def prefill_batch(memory, orig_dir, dict_dir):
+    """用翻译记忆预填一个批次：按csv_orig中的原文查找，命中的译文同时写入csv_orig和csv_dict
+
+    csv_dict的text经过字典替换，因此查找统一使用csv_orig的原文；合并时从csv_orig读取已有译文。
+    返回 (命中行数, 待翻译行数)，并输出命中率。
+    """
+    total_hits = 0
+    total_pending = 0
+    for filename in sorted(f for f in os.listdir(dict_dir) if f.endswith('.csv')):
+        orig_path = os.path.join(orig_dir, filename)
+        dict_path = os.path.join(dict_dir, filename)
+        if not os.path.exists(orig_path):
+            continue
+        orig_fields, orig_rows = _read_rows(orig_path)
+        dict_fields, dict_rows = _read_rows(dict_path)
+        if len(orig_rows) != len(dict_rows):
+            print(f"警告: {filename} 的csv_orig与csv_dict行数不一致，跳过翻译记忆预填")
+            continue
+        orig_rows, hits, pending = memory.prefill(orig_rows)
+        total_hits += hits
+        total_pending += pending
+        if not hits:
+            continue
+        for orig_row, dict_row in zip(orig_rows, dict_rows):
+            if orig_row.get('id') not in carryover.META_IDS and not carryover.has_translation(dict_row):
+                dict_row['trans'] = orig_row['trans']
+        _write_rows(orig_path, orig_fields, orig_rows)
+        _write_rows(dict_path, dict_fields, dict_rows)
+        print(f"翻译记忆预填 {filename}: {hits}/{pending} 行")
+
+    rate = total_hits / total_pending if total_pending else 0.0
+    print(f"翻译记忆命中率: {total_hits}/{total_pending} 行（{rate:.1%}）")
+    return total_hits, total_pending
+
+
+# 模糊匹配：字符n-gram的MinHash签名分段做LSH取候选，再按编辑距离打分
+NGRAM_SIZE = 2
+MINHASH_SIZE = 16
+LSH_BAND_ROWS = 2
+# 同一分桶中条目过多时（如"……"之类的短句）不再从该桶取候选
+MAX_BUCKET_SIZE = 256
+# 每次查询最多对多少个候选计算编辑距离
+MAX_CANDIDATES = 16
+
+# 一次blake2b摘要切分出MINHASH_SIZE个32位哈希值
+_MINHASH_STRUCT = struct.Struct('<%dI' % MINHASH_SIZE)
+
+
+def fuzzy_key(text):
+    """模糊匹配使用的文本：去除标签、\\n记号和首尾空白"""
+    return clean_html_tags(normalize_text(text)).replace('\\n', '')
+
+
+def edit_distance(a, b):
+    """两个字符串的编辑距离（Levenshtein），使用位并行算法，每个字符只做常数次整数运算"""
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return len(a)
+    # 以较短的b为模式串
+    peq = {}
+    for i, c in enumerate(b):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    mask = (1 << len(b)) - 1
+    last = 1 << (len(b) - 1)
+    pv = mask
+    mv = 0
+    score = len(b)
+    for c in a:
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+    return score
+
+
+def similarity(a, b):
+    """按编辑距离换算的相似度，0~1"""
+    longest = max(len(a), len(b))
+    if not longest:
+        return 1.0
+    return 1.0 - edit_distance(a, b) / longest
+
+
+class _GramHashes(dict):
+    """n-gram → MINHASH_SIZE个哈希值，首次查询时计算，之后由dict直接返回"""
+
+    def __missing__(self, gram):
+        digest = hashlib.blake2b(gram.encode('utf-8'), digest_size=_MINHASH_STRUCT.size).digest()
+        signature = self[gram] = _MINHASH_STRUCT.unpack(digest)
+        return signature
+
+
+class FuzzyIndex:
+    """翻译记忆的模糊匹配索引
+
+    每条原文取字符n-gram，每个n-gram只做一次摘要得到MINHASH_SIZE个哈希值并缓存，
+    文本的MinHash签名为各列的最小值；签名每LSH_BAND_ROWS个值为一段，任一段相同即为候选，
+    候选按命中段数取前MAX_CANDIDATES个，再用编辑距离打分。支持逐条add增量加入。
+    """
+
+    def __init__(self):
+        self._texts = []
+        self._entries = []
+        self._known = {}
+        self._buckets = {}
+        self._gram_hashes = _GramHashes()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @classmethod
+    def from_memory(cls, translation_memory):
+        """用精确匹配翻译记忆中的 (原文, 最佳译文) 建立索引"""
+        index = cls()
+        for text, trans in translation_memory.items():
+            index.add(text, trans)
+        return index
+
+    def _bands(self, key):
+        """计算文本的MinHash签名，返回各段的分桶键（段号与该段哈希值合成的整数）"""
+        if len(key) < NGRAM_SIZE:
+            grams = {key}
+        else:
+            grams = {key[i:i + NGRAM_SIZE] for i in range(len(key) - NGRAM_SIZE + 1)}
+        signature = map(min, zip(*map(self._gram_hashes.__getitem__, grams)))
+        bands = []
+        band_key = 0
+        for i, value in enumerate(signature):
+            band_key = (band_key << 32) | value
+            if i % LSH_BAND_ROWS == LSH_BAND_ROWS - 1:
+                bands.append((band_key << 8) | (i // LSH_BAND_ROWS))
+                band_key = 0
+        return bands
+
+    def add(self, text, trans):
+        """加入一条 (原文, 译文)，同一原文重复加入时以最后一次的译文为准"""
+        key = fuzzy_key(text)
+        if not key:
+            return
+        text = normalize_text(text)
+        position = self._known.get(text)
+        if position is not None:
+            self._entries[position] = (text, trans)
+            return
+        position = len(self._entries)
+        self._known[text] = position
+        self._texts.append(key)
+        self._entries.append((text, trans))
+        for band in self._bands(key):
+            self._buckets.setdefault(band, []).append(position)
+
+    def suggest(self, text, top_k=3, min_score=0.6):
+        """返回与原文最相近的top_k条 [(相似度, 记忆原文, 译文)]，按相似度从高到低排列"""
+        key = fuzzy_key(text)
+        if not key:
+            return []
+        hits = {}
+        for band in self._bands(key):
+            bucket = self._buckets.get(band)
+            if bucket is None or len(bucket) > MAX_BUCKET_SIZE:
+                continue
+            for position in bucket:
+                hits[position] = hits.get(position, 0) + 1
+        candidates = sorted(hits, key=lambda position: (-hits[position], position))[:MAX_CANDIDATES]
+        scored = []
+        for position in candidates:
+            other = self._texts[position]
+            # 长度差已超过阈值的候选不必计算编辑距离
+            if min(len(key), len(other)) < min_score * max(len(key), len(other)):
+                continue
+            score = similarity(key, other)
+            if score >= min_score:
+                scored.append((score, position))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(round(score, 3),) + self._entries[position] for score, position in scored[:top_k]]
+
+
+SUGGEST_FIELDNAMES = ['id', 'name', 'text', 'tm']
+
+
+def format_suggestions(suggestions):
+    """把模糊匹配结果格式化为旁路文件的tm列，每条一行：相似度 记忆原文 => 译文"""
+    return '\n'.join(f"{score:.2f} {text} => {trans}" for score, text, trans in suggestions)
+
+
+def write_suggestions(fuzzy_index, orig_dir, output_dir, top_k=3, min_score=0.6):
+    """为批次中仍待翻译的行生成模糊匹配参考，写入output_dir下与csv_orig同名的旁路CSV（多一列tm）
+
+    返回 (有参考的行数, 待翻译行数)。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    total_suggested = 0
+    total_pending = 0
+    for filename in sorted(f for f in os.listdir(orig_dir) if f.endswith('.csv')):
+        _, rows = _read_rows(os.path.join(orig_dir, filename))
+        suggested = 0
+        output_rows = []
+        for row in rows:
+            tm = ''
+            if row.get('id') not in carryover.META_IDS and not carryover.has_translation(row):
+                total_pending += 1
+                tm = format_suggestions(fuzzy_index.suggest(row.get('text'), top_k, min_score))
+                suggested += 1 if tm else 0
+            output_rows.append({'id': row.get('id'), 'name': row.get('name'), 'text': row.get('text'), 'tm': tm})
+        total_suggested += suggested
+        if suggested:
+            _write_rows(os.path.join(output_dir, filename), SUGGEST_FIELDNAMES, output_rows)
+    print(f"翻译记忆模糊匹配: {total_suggested}/{total_pending} 行有参考译文，已写入 {output_dir}")
+    return total_suggested, total_pending
@@ -0,0 +1,86 @@
+"""
+合并清单模块，记录每个输出文件的输入摘要，重复合并时跳过输入未改动的文件
+"""
+
+import os
+import json
+import hashlib
+from . import encoding as encoding_cache
+from . import staging
+
+# 清单文件名，与合并输出的txt文件放在同一目录
+MANIFEST_FILE = ".merge_manifest.json"
+
+# 合并规则（替换、渲染格式、后处理）变化时递增，旧清单记录自动失效
+MERGE_VERSION = 1
+
+
+def load(output_dir):
+    """加载输出目录下的合并清单，返回 {文件名: 输入摘要}"""
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"读取合并清单时出错，将重新合并全部文件: {e}")
+        return {}
+
+
+def save(output_dir, manifest):
+    """保存输出目录下的合并清单（只保留目录中仍存在的输出文件）"""
+    if not os.path.isdir(output_dir):
+        return False
+    manifest = {name: key for name, key in manifest.items()
+                if os.path.exists(os.path.join(output_dir, name))}
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+        return True
+    except Exception as e:
+        print(f"保存合并清单时出错: {e}")
+        return False
+
+
+def file_hash(path, entry=None):
+    """返回文件内容摘要，文件不存在时返回空字符串
+
+    entry为编码缓存中该文件的记录，大小和修改时间都一致时直接使用记录的摘要，不再读取文件。
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return ''
+    if entry and entry.get('hash') and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+        return entry['hash']
+    with open(path, 'rb') as f:
+        return encoding_cache.content_hash(f.read())
+
+
+def dict_hash(name_dict):
+    """人名字典的摘要，与键的顺序无关"""
+    data = json.dumps(name_dict, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return encoding_cache.content_hash(data)
+
+
+def input_key(label, *hashes):
+    """合并一个输出文件的全部输入（合并版本、输出格式、各输入文件摘要）的组合摘要"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (str(MERGE_VERSION), label) + hashes:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def write_if_changed(path, text):
+    """内容与已有文件相同时不重写，返回是否写入了文件（替换文件而不是原地改写，不影响硬链接到它的文件）"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == text:
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
+    with staging.replace_file(path) as f:
+        f.write(text)
+    return True
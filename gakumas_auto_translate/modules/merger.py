@@ -3,23 +3,180 @@
 """
 
 import os
-import re
 import csv
 import json
-import shutil
-from .utils import clean_html_tags, process_unit_files_in_folder  # 添加导入
-from .config import get_translation_mode  # 添加导入
+import bisect
+import fnmatch
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from .utils import clean_html_tags, process_unit_content  # 添加导入
+from .workspace import Workspace
+from . import encoding as encoding_cache
+from . import parse_cache
+from . import carryover
+from . import merge_manifest
+from . import staging
 
-def merge_translations():
-    """合并翻译文件的主函数"""
+# 可替换区间的类别：lexer记录的四类文本和所有name属性
+SLOT_KINDS = ('message', 'narration', 'title', 'choice', 'name')
+
+
+def _script_slots(content, cache_dir=None, key=None):
+    """解析原始脚本（优先读取cache_dir中的解析缓存），返回 {类别: [[起点, 终点, 当前值], ...]}，区间按文件顺序排列"""
+    records, names = parse_cache.lex_cached(content, cache_dir, key)
+    slots = {kind: [] for kind in SLOT_KINDS}
+    for record in records:
+        slots[record.kind].append([record.start, record.end, content[record.start:record.end]])
+    for start, end in names:
+        slots['name'].append([start, end, content[start:end]])
+    return slots
+
+
+class SlotIndex:
+    """同一类别的区间按当前值建立的索引，替换结果与对全部区间逐个做前缀替换一致
+
+    以orig开头的区间只可能是当前值等于orig的区间，或当前值以某个待替换原文为真前缀的区间；
+    前者按值直接查到，后者在建立索引和每次替换后记录下来（通常为空），因此每行只访问自己的区间。
+    """
+
+    def __init__(self, slots, prefixes):
+        self._prefixes = {prefix for prefix in prefixes if prefix}
+        self._max_prefix = max(map(len, self._prefixes), default=0)
+        self._buckets = {}
+        self._prefixed = {}
+        for slot in slots:
+            self._add(slot)
+
+    def _add(self, slot):
+        value = slot[2]
+        self._buckets.setdefault(value, {})[slot[0]] = slot
+        if any(value[:i] in self._prefixes for i in range(1, min(len(value), self._max_prefix + 1))):
+            self._prefixed[slot[0]] = slot
+
+    def _remove(self, slot):
+        bucket = self._buckets[slot[2]]
+        del bucket[slot[0]]
+        if not bucket:
+            del self._buckets[slot[2]]
+        self._prefixed.pop(slot[0], None)
+
+    def replace_prefix(self, orig, replacement, matched=None):
+        """把以orig开头的区间值的这一前缀替换为replacement，返回发生变化的区间数
+
+        matched不为None时追加所有匹配区间的 (起点, 是否与orig完全相同, 值是否变化)，包括替换后值不变的区间。
+        """
+        matches = list(self._buckets.get(orig, {}).values())
+        matches.extend(slot for slot in self._prefixed.values() if slot[2] != orig and slot[2].startswith(orig))
+        changed = 0
+        for slot in matches:
+            value = slot[2]
+            new_value = replacement + value[len(orig):]
+            if matched is not None:
+                matched.append((slot[0], value == orig, new_value != value))
+            if new_value != value:
+                self._remove(slot)
+                slot[2] = new_value
+                self._add(slot)
+                changed += 1
+        return changed
+
+
+class MergeCoverage:
+    """统计一个文件中每行译文的应用情况，在替换时顺带记录，不额外扫描脚本
+
+    applied: 已替换；covered: 剧本中重复出现的台词，已由前面原文相同的行一并替换；
+    not_found: 脚本中没有以该原文开头的文本；ambiguous: 按前缀改写了更长的文本，或改写数多于CSV中相同原文的行数
+    （译文与原文相同时替换不改变内容，不算作匹配不唯一）。
+    未找到和匹配不唯一的行作为警告写入错误报告，不影响生成输出文件。
+    """
+
+    STATUSES = ('applied', 'covered', 'not_found', 'ambiguous')
+
+    def __init__(self, csv_file, content, rows, match_key='text'):
+        self.csv_file = csv_file
+        self.content = content
+        self.expected = Counter(row.get(match_key) or row.get('text') or '' for row in rows)
+        self.counts = dict.fromkeys(self.STATUSES, 0)
+        self._applied = set()
+        self._line_starts = None
+
+    def _line_of(self, pos):
+        """区间起点所在的脚本行号（从1开始），只在需要报告时计算一次各行起点"""
+        if self._line_starts is None:
+            self._line_starts = [i for i, char in enumerate(self.content) if char == '\n']
+        return bisect.bisect_left(self._line_starts, pos) + 1
+
+    def replace(self, index, kind, row, orig, replacement, result):
+        """用index替换原文为orig的区间并记录该行的应用情况，返回发生变化的区间数"""
+        matched = []
+        changed = index.replace_prefix(orig, replacement, matched)
+        key = (kind, orig)
+        detail = None
+        if not matched:
+            if key in self._applied:
+                status = 'covered'
+            else:
+                status = 'not_found'
+                detail = f"原始脚本中没有以该原文开头的{kind}文本"
+        elif any(not exact and changed_slot for _, exact, changed_slot in matched):
+            status = 'ambiguous'
+            detail = "只按前缀匹配到更长的文本并改写了其开头"
+        elif changed > self.expected[orig]:
+            status = 'ambiguous'
+            detail = f"改写了 {changed} 处，CSV中相同原文只有 {self.expected[orig]} 行"
+        else:
+            status = 'applied'
+        if matched:
+            self._applied.add(key)
+        self.counts[status] += 1
+
+        if detail:
+            row_id = row.get('id', '')
+            location = f"CSV第{row.get('_line', '?')}行"
+            if matched:
+                location += "，脚本第" + "、".join(str(self._line_of(start)) for start, _, _ in sorted(matched)) + "行"
+            error_type = "译文未应用" if status == 'not_found' else "匹配不唯一"
+            result['messages'].append(f"警告: 文件 {self.csv_file} 中ID为 {row_id} 的条目{error_type}（{location}）：{detail}")
+            result['error_rows'].append([self.csv_file, row_id, error_type, row.get('text', ''), row.get('trans', ''),
+                                         f"{location}：{detail}"])
+        return changed
+
+
+def _slot_indexes(slots, rows, match_key='text'):
+    """为四类文本区间建立SlotIndex，待替换原文取各行的match_key列"""
+    texts = [row.get(match_key) or row.get('text') or '' for row in rows]
+    return {kind: SlotIndex(slots[kind], texts) for kind in SLOT_KINDS if kind != 'name'}
+
+
+def _render_slots(content, slots):
+    """按文件顺序把区间当前值拼回原文，一次join生成输出内容"""
+    spans = sorted((slot for kind_slots in slots.values() for slot in kind_slots), key=lambda slot: slot[0])
+    pieces = []
+    pos = 0
+    for start, end, value in spans:
+        pieces.append(content[pos:start])
+        pieces.append(value)
+        pos = end
+    pieces.append(content[pos:])
+    return ''.join(pieces)
+
+
+def merge_translations(workers=1, workspace=None, name_dict=None):
+    """合并翻译文件的主函数
+
+    workers>1时第4步按文件分发到进程池生成txt（workers<=0表示使用全部CPU核心），结果与单进程一致。
+    workspace默认为当前目录的工作区，合并模式取工作区的翻译模式；name_dict为已加载的人名字典，未给出时读取字典文件。
+    返回合并是否没有错误；翻译目录缺失或不一致、未能开始合并时返回None。
+    """
+    workspace = workspace or Workspace.default()
     # 步骤1: 检查目录文件一致性
-    gakumas_translated_dir = "./GakumasPreTranslation/tmp/translated"
-    gakumas_untranslated_dir = "./GakumasPreTranslation/tmp/untranslated"
+    gakumas_translated_dir = workspace.gakumas_translated_dir
+    gakumas_untranslated_dir = workspace.gakumas_untranslated_dir
     
     # 检查目录是否存在
     if not os.path.exists(gakumas_translated_dir) or not os.path.exists(gakumas_untranslated_dir):
         print("错误：Gakumas翻译目录不存在，请先完成翻译流程")
-        return False
+        return None
     
     # 获取两个目录的CSV文件列表
     translated_files = set(f for f in os.listdir(gakumas_translated_dir) if f.endswith(".csv"))
@@ -30,22 +187,19 @@ def merge_translations():
         print("错误：翻译目录文件不一致")
         print(f"未翻译目录文件: {untranslated_files - translated_files}")
         print(f"多余翻译文件: {translated_files - untranslated_files}")
-        return False
+        return None
     
-    # 步骤2: 复制CSV文件到临时目录
-    target_csv_dir = "./todo/translated/csv"
+    # 步骤2: 放置CSV文件到临时目录（同一文件系统上用硬链接，步骤3改写时替换文件、不影响翻译工具目录）
+    target_csv_dir = workspace.translated_csv_dir
     os.makedirs(target_csv_dir, exist_ok=True)
     
-    print("正在复制翻译后的CSV文件...")
-    for filename in translated_files:
-        src = os.path.join(gakumas_translated_dir, filename)
-        dst = os.path.join(target_csv_dir, filename)
-        shutil.copy2(src, dst)
-        print(f"已复制: {filename}")
+    print("正在放置翻译后的CSV文件...")
+    counts = staging.place_files(gakumas_translated_dir, target_csv_dir, sorted(translated_files))
+    print(f"已放置{len(translated_files)}个文件（{staging.format_counts(counts)}）")
     
     # 步骤3: 修复使用原始未替换的text字段
-    csv_orig_dir = "./todo/untranslated/csv_orig"  # 使用csv_orig目录
-    translation_mode = get_translation_mode()
+    csv_orig_dir = workspace.csv_orig_dir  # 使用csv_orig目录
+    translation_mode = workspace.mode
     
     print("\n正在恢复原始text字段，保留翻译结果...")
     # 使用sorted确保顺序一致
@@ -74,7 +228,7 @@ def merge_translations():
         # 处理译者信息行：翻译文件可能在最后添加了一行译者信息
         has_translator_row = False
         translator_info = None
-        if len(trans_rows) > len(orig_rows):
+        if trans_rows and len(trans_rows) != len(orig_rows):
             # 检查最后一行是否为译者信息行
             last_row = trans_rows[-1]
             if 'id' in last_row and last_row['id'] == '译者':
@@ -83,6 +237,13 @@ def merge_translations():
                 translator_info = trans_rows.pop()
                 print(f"检测到译者信息行: {translator_info['id']},{translator_info.get('name', '')}")
             
+        # 预处理时沿用了上一版译文的文件只送翻译了待翻译行，按顺序填回完整行列表
+        if len(trans_rows) < len(orig_rows):
+            spliced = carryover.splice_translations(orig_rows, trans_rows)
+            if spliced is not None:
+                print(f"文件 {filename}: 填回沿用的已有翻译 {len(orig_rows) - len(trans_rows)} 行")
+                trans_rows = spliced
+
         # 再次检查行数是否一致
         if len(orig_rows) != len(trans_rows):
             print(f"警告: 文件 {filename} 行数不一致（原始: {len(orig_rows)}, 翻译: {len(trans_rows)}），跳过处理")
@@ -103,7 +264,7 @@ def merge_translations():
             trans_rows.append(translator_info)
         
         # 保存更新后的翻译文件
-        with open(translated_csv_path, 'w', encoding='utf-8', newline='') as f:
+        with staging.replace_file(translated_csv_path, newline='') as f:
             # 检查trans_rows是否为空
             if not trans_rows:
                 print(f"警告: 文件 {filename} 没有数据行，跳过保存")
@@ -121,27 +282,47 @@ def merge_translations():
     # 步骤4: 根据翻译模式执行不同的合并逻辑
     if translation_mode == "bilingual":
         print("\n正在执行中日双语合并模式...")
-        process_bilingual()
+        return process_bilingual(workers, workspace=workspace, name_dict=name_dict)
+    elif translation_mode == "dual":
+        print("\n正在执行双输出合并模式（中日双语 + 纯中文）...")
+        return process_dual(workers, workspace=workspace, name_dict=name_dict)
     else:
         print("\n正在执行纯中文合并模式...")
-        process_chinese_only()
-    return True
+        return process_chinese_only(workers, workspace=workspace, name_dict=name_dict)
 
 
-def process_bilingual():
-    """处理中日双语合并逻辑"""
-    # 定义路径常量
-    csv_dir = "./todo/translated/csv"
-    untranslated_txt_dir = "./todo/untranslated/txt"
-    output_dir = "./todo/translated/txt"
-    dict_file = "./name_dictionary.json"
-    error_report_file = "./error_report.csv" # 定义错误报告文件路径
-    
-    # 初始化错误记录
-    has_errors = False
-    error_rows = [['文件', 'ID', '错误类型', '原文', '翻译', '详细信息']] # 错误报告头部
-    
-    # 加载名称字典
+def build_name_index(name_dict):
+    """把名称字典编译为 说话人 -> 译名 的查找表，只保留译名非空且与原名不同的项
+
+    原实现对每行都按键长排序整个字典再逐项比较是否相等，结果就是按键精确查找。
+    """
+    return {name: translated for name, translated in name_dict.items() if translated and translated != name}
+
+
+def _translate_names(name_slots, speakers, name_index):
+    """一次遍历name区间，把以说话人原名开头的区间值的这一前缀改写为译名，返回改写的name属性数
+
+    只翻译CSV中出现过的说话人，多个原名都是前缀时取最长的一个（如 生徒B 按 生徒 改写为 学生B）；
+    每个区间只改写一次，译名以原名开头时（如 保健医→保健医生）也不会被重复叠加。
+    """
+    targets = {name: name_index[name] for name in speakers if name in name_index}
+    if not targets:
+        return 0
+    longest = max(map(len, targets))
+    count = 0
+    for slot in name_slots:
+        value = slot[2]
+        for length in range(min(len(value), longest), 0, -1):
+            translated_name = targets.get(value[:length])
+            if translated_name is not None:
+                slot[2] = translated_name + value[length:]
+                count += 1
+                break
+    return count
+
+
+def load_merge_name_dict(dict_file):
+    """加载合并时翻译name属性用的字典，不存在或读取失败时返回空字典"""
     name_dict = {}
     if os.path.exists(dict_file):
         try:
@@ -152,280 +333,119 @@ def process_bilingual():
             print(f"加载字典文件时出错: {e}")
     else:
         print(f"字典文件不存在: {dict_file}，将跳过人名翻译")
-    
-    # 创建输出目录
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # 获取CSV文件列表
-    csv_files = [f for f in os.listdir(csv_dir) if f.endswith(".csv")]
-    
+    return name_dict
+
+
+# 合并结果写出前按输出文件名依次应用的后处理：[(文件名通配符, 处理函数)]，处理函数接收并返回整个脚本内容
+# 在内存中处理，不再写出后重新读取；新增规则用register_post_process追加
+POST_PROCESS_HOOKS = [
+    ('adv_unit_*.txt', process_unit_content),  # 去除含'―'属性的r标签
+]
+
+# 进程池一次提交的最多文件数
+MERGE_WINDOW = 512
+
+# 错误报告头部
+ERROR_REPORT_HEADER = ['文件', 'ID', '错误类型', '原文', '翻译', '详细信息']
+
+
+def merge_outputs(workspace, mode):
+    """工作区中各合并模式的输出：[(名称, 输出目录, 错误报告文件)]"""
+    bilingual = ("中日双语", workspace.translated_txt_dir, workspace.error_report(""))
+    if mode == "bilingual":
+        return [bilingual]
+    if mode == "chinese":
+        return [("纯中文", workspace.translated_txt_dir, workspace.error_report("chinese"))]
+    # 双输出模式中纯中文结果写入单独目录，中日双语结果仍写入txt目录供菜单5归档
+    return [bilingual, ("纯中文", workspace.translated_txt_chinese_dir, workspace.error_report("chinese"))]
+
+
+def run_merge(merge_file, outputs, csv_dir, untranslated_txt_dir, dict_file, workers=1, force=False,
+              raw_csv_dir=None, hooks=None, files=None, name_dict=None, cache_dir=None):
+    """按文件执行合并，写出每种输出的合并结果和错误报告
+
+    merge_file(csv_file, csv_dir, txt_dir, name_index, encoding_entry, raw_csv_dir, cache_dir) 只在内存中生成一个文件的合并结果，
+    返回与outputs一一对应的结果列表；name_index为build_name_index编译的说话人译名表，每次运行只编译一次。
+    outputs为 [(名称, 输出目录, 错误报告文件)]；raw_csv_dir为未经人名替换的原文CSV目录，为None时直接用翻译CSV的text定位。
+    workers>1时按文件分发到进程池（workers<=0表示使用全部CPU核心）；文件按文件名排序处理，
+    父进程按同一顺序输出日志、写文件并汇总错误报告，因此结果与单进程运行完全一致。
+    每个输出目录的合并清单记录了各文件的输入摘要（原始脚本、翻译CSV、原文CSV、人名字典、输出格式、合并版本），
+    所有输出的输入都未改动且输出文件仍在时跳过该文件；force=True时忽略清单全部重新合并。
+    files给出时只合并其中的CSV文件名；dict_file为翻译name属性用的人名字典，已加载的字典可直接通过name_dict传入。
+    hooks为写出前应用的后处理（默认POST_PROCESS_HOOKS），在生成合并结果的进程中执行，处理函数需为模块级函数。
+    内容与已有输出相同的文件不重写。
+    编码缓存和解析缓存写入cache_dir，默认与原始脚本同目录；原始脚本目录不应被写入时（如dump_txt）需另外指定。
+    """
+    hooks = list(POST_PROCESS_HOOKS if hooks is None else hooks)
+    cache_dir = cache_dir or untranslated_txt_dir
+    os.makedirs(cache_dir, exist_ok=True)
+    if name_dict is None:
+        name_dict = load_merge_name_dict(dict_file)
+    name_index = build_name_index(name_dict)
+    for _, output_dir, _ in outputs:
+        os.makedirs(output_dir, exist_ok=True)
+
+    csv_files = sorted(f for f in os.listdir(csv_dir) if f.endswith(".csv") and (files is None or f in files))
+    # 编码缓存由父进程统一读写，工作进程只返回各自文件的记录
+    encodings = encoding_cache.load_cache(cache_dir)
+    manifests = [{} if force else merge_manifest.load(output_dir) for _, output_dir, _ in outputs]
+    names_hash = merge_manifest.dict_hash(name_dict)
+
+    tasks = []
+    input_keys = {}
+    skipped = 0
     for csv_file in csv_files:
-        # 构造文件路径
-        csv_path = os.path.join(csv_dir, csv_file)
         txt_file = csv_file.replace(".csv", ".txt")
-        txt_path = os.path.join(untranslated_txt_dir, txt_file)
-        output_path = os.path.join(output_dir, txt_file)
-        
-        # 检查原始TXT文件是否存在
-        if not os.path.exists(txt_path):
-            print(f"警告：跳过 {csv_file}，未找到对应的原始TXT文件")
-            # 可以选择记录此警告为错误，但当前按跳过处理
+        entry = encodings.get(txt_file)
+        hashes = (merge_manifest.file_hash(os.path.join(untranslated_txt_dir, txt_file), entry),
+                  merge_manifest.file_hash(os.path.join(csv_dir, csv_file)),
+                  merge_manifest.file_hash(os.path.join(raw_csv_dir, csv_file)) if raw_csv_dir else '',
+                  names_hash,
+                  _hooks_signature(hooks))
+        keys = [merge_manifest.input_key(label, *hashes) for label, _, _ in outputs]
+        if all(manifest.get(txt_file) == key and os.path.exists(os.path.join(output_dir, txt_file))
+               for manifest, key, (_, output_dir, _) in zip(manifests, keys, outputs)):
+            skipped += 1
             continue
-        
-        # 读取CSV内容
-        replace_items = []
-        try:
-            with open(csv_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                replace_items = list(reader)
-        except Exception as e:
-            print(f"错误: 读取文件 {csv_file} 时出错: {e}")
-            error_rows.append([csv_file, "N/A", "文件读取错误", "", "", str(e)])
-            has_errors = True
-            continue # 跳过此文件
-
-        raw_items = []
-        raw_csv_path = os.path.join("./todo/untranslated/csv_orig", csv_file)
-        if os.path.exists(raw_csv_path):
-            try:
-                with open(raw_csv_path, 'r', encoding='utf-8') as f:
-                    reader = csv.DictReader(f)
-                    raw_items = list(reader)
-            except Exception as e:
-                print(f"警告: 读取原始CSV文件 {csv_file} 时出错，将使用清理后的text字段进行匹配: {e}")
+        input_keys[csv_file] = keys
+        tasks.append((csv_file, csv_dir, untranslated_txt_dir, entry, raw_csv_dir, cache_dir))
 
-        for i, row in enumerate(replace_items):
-            if i < len(raw_items) and row.get('id') == raw_items[i].get('id'):
-                row['_match_text'] = raw_items[i].get('text', '')
-            else:
-                row['_match_text'] = row.get('text', '')
-            
-        # 按原文长度降序排序
-        replace_items.sort(key=lambda x: len(x.get('_match_text', '') or x.get('text', '') or ""), reverse=True)
-        
-        # 读取原始文本内容
-        try:
-            with open(txt_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except Exception as e:
-            print(f"错误: 读取文件 {txt_file} 时出错: {e}")
-            error_rows.append([csv_file, "N/A", "原始文件读取错误", "", "", str(e)])
-            has_errors = True
-            continue # 跳过此文件
-            
-        # 进行文本替换
-        changes_count = 0 # 记录当前文件替换次数
-        file_has_errors = False # 标记当前文件是否有错误
-        
-        for row in replace_items:
-            row_id = row.get('id', '')
-            orig = row.get('text', '')
-            trans = row.get('trans', '')
-            name = row.get('name', '')
-            match_orig = row.get('_match_text') or orig
-            
-            # 立即保存副本用于错误报告
-            orig_copy = orig
-            trans_copy = trans
-            
-            if not orig or not trans:
-                # 根据用户需求，对不同ID的空条目进行区分处理
-                if row_id == 'info' or row_id == '译者':
-                    # ID为info，原文或翻译为空是正常情况，只跳过，不记录错误，也不打印警告
-                    # print(f"警告: 文件 {csv_file} 中ID为 {row_id} 的条目原文或翻译为空，跳过处理") # 删除此行
-                    # 不记录为错误
-                    pass # 显式地什么都不做
-                else:
-                    # 其他ID，原文或翻译为空视为错误
-                    print(f"错误: 文件 {csv_file} 中ID为 {row_id} 的条目原文或翻译为空")
-                    error_rows.append([csv_file, row_id, "条目内容不完整", orig_copy, trans_copy, "原文或翻译为空"])
-                    has_errors = True
-                    file_has_errors = True # 标记文件有错误
+    if workers is not None and workers <= 0:
+        workers = os.cpu_count() or 1
+    workers = min(workers or 1, max(len(tasks), 1))
 
-                continue # 跳过处理当前条目
-            
-            # 使用通用函数清理原文中的标签
-            clean_orig = clean_html_tags(orig)
-            
-            # 临时存储当前替换后的内容，用于对比是否发生变化
-            current_content = content
-            
-            # 对于message类型，在处理前检查末尾\n是否一致（使用清理后的文本）
-            if row_id == '0000000000000' and name != '__narration__' and name != '__title__':
-                orig_ends_with_newline = clean_orig.endswith('\\n')
-                trans_ends_with_newline = trans.endswith('\\n')
-                
-                if orig_ends_with_newline != trans_ends_with_newline:
-                    print(f"警告: 文件 {csv_file} 中ID为 {row_id} 的条目，原文和翻译的末尾\\n不一致")
-                    error_rows.append([
-                        csv_file, row_id, "末尾\\n不匹配", 
-                        orig_copy, trans_copy,
-                        f"原文末尾\\n: {orig_ends_with_newline}, 翻译末尾\\n: {trans_ends_with_newline}"
-                    ])
-                    has_errors = True
-                    file_has_errors = True
-                    continue  # 跳过处理此条目
-            
-            if row_id == 'select':
-                # 处理select类型 - 仅替换文本内容
-                try:
-                    # 修正正则表达式，不再匹配引号
-                    pattern = re.compile(
-                        r'(choice text=)%s' % re.escape(match_orig),
-                    )
-                    # 修正替换逻辑，不再处理引号
-                    new_content = pattern.sub(lambda m: f'{m.group(1)}{trans}', content)
-                    if new_content != content:
-                        content = new_content
-                        changes_count += 1
-                except Exception as e:
-                    print(f"处理文件 {csv_file} 中ID为 {row_id} 的select条目时出错: {e}")
-                    error_rows.append([csv_file, row_id, "处理select错误", orig, trans, str(e)])
-                    has_errors = True
-                    file_has_errors = True
+    error_rows = [[ERROR_REPORT_HEADER] for _ in outputs]
+    counts = {'written': 0, 'unchanged': 0, 'post_processed': 0,
+              'coverage': [dict.fromkeys(MergeCoverage.STATUSES, 0) for _ in outputs]}
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_merge_worker,
+                                 initargs=(merge_file, name_index, hooks)) as executor:
+            # map按提交顺序返回结果，保证日志与错误报告顺序与单进程一致
+            results = _bounded_map(executor, tasks, workers)
+            _write_merge_results(results, outputs, encodings, error_rows, input_keys, manifests, counts)
+    else:
+        results = (_merge_one(merge_file, name_index, hooks, task) for task in tasks)
+        _write_merge_results(results, outputs, encodings, error_rows, input_keys, manifests, counts)
 
-            elif row_id == '0000000000000' and name == '__title__':
-                # 处理title类型 (id=0000000000000, name=__title__) - 只保留中文翻译，不使用双语格式
-                try:
-                    # 匹配 title title= 属性，直接替换为翻译
-                    pattern = re.compile(
-                        r'(title title=)%s' % re.escape(match_orig),
-                    )
-                    new_content = pattern.sub(lambda m: f'{m.group(1)}{trans}', content)
-                    
-                    # 检查是否发生替换并更新内容和计数
-                    if new_content != content:
-                        content = new_content
-                        changes_count += 1
-                except Exception as e:
-                    print(f"处理文件 {csv_file} 中ID为 {row_id} 的title条目时出错: {e}")
-                    error_rows.append([csv_file, row_id, "处理title错误", orig, trans, str(e)])
-                    has_errors = True
-                    file_has_errors = True
-                    continue # 跳过处理此条目
+    encoding_cache.save_cache(cache_dir, encodings, untranslated_txt_dir)
+    for (_, output_dir, _), manifest in zip(outputs, manifests):
+        merge_manifest.save(output_dir, manifest)
+    print(f"\n增量合并: 跳过输入未改动的 {skipped} 个文件，重新合并 {len(tasks)} 个文件"
+          f"（写入 {counts['written']} 个输出，内容未变化未重写 {counts['unchanged']} 个）")
+    for (output_label, _, _), coverage in zip(outputs, counts['coverage']):
+        print(f"{output_label}译文应用情况: 已替换 {coverage['applied']} 行，重复台词 {coverage['covered']} 行，"
+              f"未找到 {coverage['not_found']} 行，匹配不唯一 {coverage['ambiguous']} 行")
+    if counts['post_processed']:
+        print(f"写出前已对 {counts['post_processed']} 个输出应用后处理（{'、'.join(pattern for pattern, _ in hooks)}）")
 
-            elif row_id == '0000000000000' and name == '__narration__':
-                # 处理narration类型 (id=0000000000000, name=__narration__) - 只保留中文翻译，不使用双语格式
-                try:
-                    # 匹配 narration text= 属性，直接替换为翻译
-                    pattern = re.compile(
-                        r'(narration text=)%s' % re.escape(match_orig),
-                    )
-                    new_content = pattern.sub(lambda m: f'{m.group(1)}{trans}', content)
-                    
-                    # 检查是否发生替换并更新内容和计数
-                    if new_content != content:
-                        content = new_content
-                        changes_count += 1
-                except Exception as e:
-                    print(f"处理文件 {csv_file} 中ID为 {row_id} 的narration条目时出错: {e}")
-                    error_rows.append([csv_file, row_id, "处理narration错误", orig, trans, str(e)])
-                    has_errors = True
-                    file_has_errors = True
-                    continue # 跳过处理此条目
+    all_ok = True
+    for (_, output_dir, error_report_file), output_errors in zip(outputs, error_rows):
+        all_ok = _finish_merge_output(output_dir, error_report_file, len(output_errors) > 1, output_errors) and all_ok
+    return all_ok
 
-            elif row_id == '0000000000000' and name != '__narration__' and name != '__title__':
-                # 处理message类型 (id=0000000000000, name!=__narration__ and name!=__title__) - 需要中日双语
-                try:
-                    # 直接分割
-                    parts = clean_orig.split("\\n")
-                    trans_parts = trans.split("\\n")
-                    
-                    # 计算实际行数：末尾的空字符串不算作一行
-                    orig_line_count = len(parts) - 1 if parts and parts[-1] == '' else len(parts)
-                    trans_line_count = len(trans_parts) - 1 if trans_parts and trans_parts[-1] == '' else len(trans_parts)
-                    
-                    # 检查原文和翻译的实际行数是否一致
-                    if orig_line_count != trans_line_count:
-                        print(f"警告: 文件 {csv_file} 中ID为 {row_id} 的条目，原文和翻译的行数不一致 (原文: {orig_line_count}行, 翻译: {trans_line_count}行)")
-                        error_rows.append([
-                            csv_file, row_id, "行数不匹配", 
-                            orig_copy, trans_copy,
-                            f"原文行数: {orig_line_count}, 翻译行数: {trans_line_count}"
-                        ])
-                        has_errors = True
-                        file_has_errors = True
-                        continue  # 跳过处理此条目
-                    
-                    # 检查原文是否以\n结尾
-                    has_trailing_newline = clean_orig.endswith('\\n')
-                    
-                    # 移除末尾空字符串用于生成双语文本
-                    parts_for_text = parts[:-1] if parts and parts[-1] == '' else parts
-                    trans_parts_for_text = trans_parts[:-1] if trans_parts and trans_parts[-1] == '' else trans_parts
-                        
-                    bilingual_text = "".join(
-                        [f"<r\\={p}>{tp}</r>\\r\\n" 
-                         for p, tp in zip(parts_for_text, trans_parts_for_text)]
-                    ).rstrip('\\r\\n')
-                    
-                    # 如果原文末尾有\n，在双语文本末尾也添加\n
-                    if has_trailing_newline:
-                        bilingual_text += '\\n'
-                    # 匹配 message text= 属性
-                    pattern = re.compile(
-                        r'(message text=)%s' % re.escape(match_orig),
-                    )
-                    new_content = pattern.sub(lambda m: f'{m.group(1)}{bilingual_text}', content)
-                    
-                    # 检查是否发生替换并更新内容和计数
-                    if new_content != content:
-                        content = new_content
-                        changes_count += 1
-                except Exception as e:
-                    print(f"处理文件 {csv_file} 中ID为 {row_id} 的条目时出错: {e}")
-                    error_rows.append([csv_file, row_id, "处理错误", orig_copy, trans_copy, str(e)])
-                    has_errors = True
-                    file_has_errors = True
-                    continue # 跳过处理此条目
-
-            # 翻译name属性 (无论row_id是什么类型)
-            if name and name_dict:
-                translated_name = name
-                # 按照键长度从长到短排序，优先匹配较长的name
-                found_name_translation = None
-                for dict_name in sorted(name_dict.keys(), key=len, reverse=True):
-                    if name == dict_name:
-                        found_name_translation = name_dict[dict_name]
-                        break
-                
-                if found_name_translation and translated_name != found_name_translation:
-                    translated_name = found_name_translation
-                
-                if translated_name != name: # 如果找到了不同的翻译
-                    try:
-                        name_pattern = re.compile(
-                            r'(name=)%s' % re.escape(name),
-                        )
-                        new_content = content # 使用临时变量进行替换，避免影响后续name替换
-                        new_content = name_pattern.sub(lambda m: f'{m.group(1)}{translated_name}', new_content) # 直接替换name值，不加引号，因为name值通常没有引号
-
-                        if new_content != content:
-                            content = new_content
-                            # 不增加 changes_count，因为它不是文本内容的替换
-                    except Exception as e:
-                         print(f"处理文件 {csv_file} 中ID为 {row_id} 的name属性时出错: {e}")
-                         error_rows.append([csv_file, row_id, "处理name属性错误", name, translated_name, str(e)])
-                         has_errors = True
-                         file_has_errors = True
-
-        # 如果文件处理过程中没有错误，则写入新文件
-        if not file_has_errors:
-            try:
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                print(f"已生成中日双语文件: {output_path} (进行了 {changes_count} 处文本替换)")
-            except Exception as e:
-                print(f"错误: 写入文件 {output_path} 时出错: {e}")
-                error_rows.append([csv_file, "N/A", "文件写入错误", "", "", str(e)])
-                has_errors = True
-        else:
-            print(f"文件 {csv_file} 处理过程中存在错误，跳过生成输出文件")
-    
-    # 在处理完所有文件后调用 process_unit_files_in_folder (总是处理)
-    print("\n正在处理adv_unit_开头的文件...")
-    process_unit_files_in_folder(output_dir) # 无条件调用
-    
+
+def _finish_merge_output(output_dir, error_report_file, has_errors, error_rows):
+    """写出一个输出目录的错误报告并输出汇总"""
     # 如果有错误，写入错误报告
     if has_errors:
         try:
@@ -442,203 +462,507 @@ def process_bilingual():
         print(f"- 错误报告: {os.path.abspath(error_report_file)}")
     else:
         print("未检测到处理错误。")
+    return not has_errors
+
+
+def register_post_process(pattern, hook):
+    """追加一条写出前的后处理规则，pattern为输出文件名通配符，hook接收并返回整个脚本内容"""
+    POST_PROCESS_HOOKS.append((pattern, hook))
+
+
+def apply_post_process(filename, content, hooks=None):
+    """按顺序对文件名匹配的输出内容应用后处理，返回 (处理后的内容, 应用的规则数)"""
+    applied = 0
+    for pattern, hook in POST_PROCESS_HOOKS if hooks is None else hooks:
+        if fnmatch.fnmatchcase(filename, pattern):
+            content = hook(content)
+            applied += 1
+    return content, applied
+
+
+def _hooks_signature(hooks):
+    """后处理规则的标识，规则变化时合并清单中的记录随之失效"""
+    return ';'.join(f"{pattern}={hook.__module__}.{hook.__qualname__}" for pattern, hook in hooks)
+
+
+def _merge_one(merge_file, name_index, hooks, task):
+    """生成一个文件的合并结果并对其中的输出应用后处理"""
+    csv_file, csv_dir, txt_dir, encoding_entry, raw_csv_dir, cache_dir = task
+    results = merge_file(csv_file, csv_dir, txt_dir, name_index, encoding_entry, raw_csv_dir, cache_dir)
+    for result in results:
+        if result['output'] is not None:
+            result['output'], result['post_processed'] = apply_post_process(
+                result['filename'].replace(".csv", ".txt"), result['output'], hooks)
+    return results
+
+
+# 工作进程内的合并函数、说话人译名表和后处理规则，由_init_merge_worker在每个进程中设置一次
+_worker_merge_file = None
+_worker_name_index = None
+_worker_hooks = None
+
+
+def _init_merge_worker(merge_file, name_index, hooks):
+    global _worker_merge_file, _worker_name_index, _worker_hooks
+    _worker_merge_file = merge_file
+    _worker_name_index = name_index
+    _worker_hooks = hooks
+
+
+def _merge_task(task):
+    return _merge_one(_worker_merge_file, _worker_name_index, _worker_hooks, task)
+
+
+def _bounded_map(executor, tasks, workers):
+    """每次最多提交MERGE_WINDOW个文件，按顺序返回结果；全量重建数千个文件时在途结果占用的内存有上限"""
+    for start in range(0, len(tasks), MERGE_WINDOW):
+        window = tasks[start:start + MERGE_WINDOW]
+        yield from executor.map(_merge_task, window, chunksize=max(1, len(window) // (workers * 4)))
+
+
+def _write_merge_results(results, outputs, encodings, error_rows, input_keys, manifests, counts):
+    """按顺序输出各文件的日志，写出每种输出的合并结果，收集编码缓存记录、各输出的错误行和清单记录"""
+    for file_results in results:
+        for (output_label, output_dir, _), result, output_errors, manifest, key, coverage in zip(
+                outputs, file_results, error_rows, manifests, input_keys[file_results[0]['filename']],
+                counts['coverage']):
+            for message in result['messages']:
+                print(message)
+            txt_file = result['filename'].replace(".csv", ".txt")
+            if result['encoding_entry']:
+                encodings[txt_file] = result['encoding_entry']
+            output_errors.extend(result['error_rows'])
+            for status, count in (result['coverage'] or {}).items():
+                coverage[status] += count
+            # 有错误或警告的文件不记入清单，下次合并时重新处理并再次报告
+            manifest.pop(txt_file, None)
+            if result['output'] is None:
+                continue
+            output_path = os.path.join(output_dir, txt_file)
+            if result.get('post_processed'):
+                counts['post_processed'] += 1
+            try:
+                if merge_manifest.write_if_changed(output_path, result['output']):
+                    counts['written'] += 1
+                    print(f"已生成{output_label}文件: {output_path} "
+                          f"(进行了 {result['changes']} 处文本替换，翻译了 {result['name_changes']} 处name属性)")
+                else:
+                    counts['unchanged'] += 1
+                    print(f"{output_label}文件内容未变化: {output_path}")
+                if not result['error_rows']:
+                    manifest[txt_file] = key
+            except Exception as e:
+                print(f"错误: 写入文件 {output_path} 时出错: {e}")
+                output_errors.append([result['filename'], "N/A", "文件写入错误", "", "", str(e)])
+
+
+def _read_merge_inputs(csv_file, csv_dir, txt_dir, encoding_entry, result, cache_dir=None):
+    """读取一个文件的翻译CSV和原始脚本，返回 (行列表, 脚本内容, 区间)，失败时记录错误并返回None
+
+    解析缓存位于cache_dir，默认与原始脚本同目录。
+    """
+    csv_path = os.path.join(csv_dir, csv_file)
+    txt_file = csv_file.replace(".csv", ".txt")
+    txt_path = os.path.join(txt_dir, txt_file)
+    messages = result['messages']
 
+    # 检查原始TXT文件是否存在
+    if not os.path.exists(txt_path):
+        messages.append(f"警告：跳过 {csv_file}，未找到对应的原始TXT文件")
+        return None
 
-def process_chinese_only():
+    # 读取CSV内容
+    try:
+        with open(csv_path, 'r', encoding='utf-8') as f:
+            replace_items = read_csv_rows(f)
+    except Exception as e:
+        messages.append(f"错误: 读取文件 {csv_file} 时出错: {e}")
+        result['error_rows'].append([csv_file, "N/A", "文件读取错误", "", "", str(e)])
+        return None
+
+    # 读取原始文本内容（复用预处理记录的编码）
+    encodings = {txt_file: encoding_entry} if encoding_entry else {}
+    try:
+        content, _ = encoding_cache.read_text(txt_path, encodings)
+        if content is None:
+            raise ValueError("无法识别文件编码格式")
+    except Exception as e:
+        messages.append(f"错误: 读取文件 {txt_file} 时出错: {e}")
+        result['error_rows'].append([csv_file, "N/A", "原始文件读取错误", "", "", str(e)])
+        return None
+    result['encoding_entry'] = encodings.get(txt_file)
+
+    # 一次解析出所有文本区间和name属性区间，替换只修改区间内容
+    slots = _script_slots(content, cache_dir or txt_dir, (result['encoding_entry'] or {}).get('hash'))
+    return replace_items, content, slots
+
+
+def read_csv_rows(f):
+    """读取翻译CSV的全部行，记录每行在CSV中的行号（_line），供错误报告定位"""
+    reader = csv.DictReader(f)
+    return [dict(row, _line=reader.line_num) for row in reader]
+
+
+def _new_merge_result(csv_file):
+    """单个文件的合并结果：output为合并后的脚本内容，有错误时为None；coverage为MergeCoverage统计的各状态行数"""
+    return {'filename': csv_file, 'messages': [], 'error_rows': [], 'output': None,
+            'changes': 0, 'name_changes': 0, 'encoding_entry': None, 'coverage': None}
+
+
+def _copy_inputs(inputs):
+    """复制行列表和区间，供同一次解析生成多种输出，原始脚本内容只读可共享"""
+    replace_items, content, slots = inputs
+    return ([dict(row) for row in replace_items], content,
+            {kind: [list(slot) for slot in kind_slots] for kind, kind_slots in slots.items()})
+
+
+def _run_workspace_merge(merge_file, mode, workers, force, workspace, name_dict):
+    """用工作区的目录和人名字典执行run_merge（workspace默认为当前目录的工作区）"""
+    workspace = workspace or Workspace.default()
+    return run_merge(merge_file, merge_outputs(workspace, mode),
+                     csv_dir=workspace.translated_csv_dir, untranslated_txt_dir=workspace.todo_txt_dir,
+                     dict_file=workspace.dict_file, workers=workers, force=force,
+                     raw_csv_dir=workspace.csv_orig_dir, name_dict=name_dict)
+
+
+def process_bilingual(workers=1, force=False, workspace=None, name_dict=None):
+    """处理中日双语合并逻辑"""
+    return _run_workspace_merge(_bilingual_outputs, "bilingual", workers, force, workspace, name_dict)
+
+
+def process_chinese_only(workers=1, force=False, workspace=None, name_dict=None):
     """处理纯中文合并逻辑"""
-    # 定义路径常量
-    csv_dir = "./todo/translated/csv"
-    untranslated_txt_dir = "./todo/untranslated/txt"
-    output_dir = "./todo/translated/txt"
-    dict_file = "./name_dictionary.json"
-    error_report_file = "./error_report_chinese.csv" # 定义错误报告文件路径
-    
-    # 初始化错误记录
-    has_errors = False
-    error_rows = [['文件', 'ID', '错误类型', '原文', '翻译', '详细信息']] # 错误报告头部
-    
-    # 加载名称字典
-    name_dict = {}
-    if os.path.exists(dict_file):
+    return _run_workspace_merge(_chinese_only_outputs, "chinese", workers, force, workspace, name_dict)
+
+
+def process_dual(workers=1, force=False, workspace=None, name_dict=None):
+    """双输出合并：每个文件只读取和解析一次，同时生成中日双语和纯中文结果
+
+    中日双语结果写入txt目录（菜单5归档到data），纯中文结果写入txt_chinese目录，两种错误报告分别输出。
+    """
+    return _run_workspace_merge(_dual_outputs, "dual", workers, force, workspace, name_dict)
+
+
+def _bilingual_outputs(csv_file, csv_dir, untranslated_txt_dir, name_index, encoding_entry=None,
+                       raw_csv_dir=None, cache_dir=None):
+    return [merge_bilingual_file(csv_file, csv_dir, untranslated_txt_dir, name_index, encoding_entry, raw_csv_dir,
+                                 cache_dir)]
+
+
+def _chinese_only_outputs(csv_file, csv_dir, untranslated_txt_dir, name_index, encoding_entry=None,
+                          raw_csv_dir=None, cache_dir=None):
+    return [merge_chinese_only_file(csv_file, csv_dir, untranslated_txt_dir, name_index, encoding_entry,
+                                    cache_dir=cache_dir)]
+
+
+def _dual_outputs(csv_file, csv_dir, untranslated_txt_dir, name_index, encoding_entry=None,
+                  raw_csv_dir=None, cache_dir=None):
+    bilingual = _new_merge_result(csv_file)
+    chinese = _new_merge_result(csv_file)
+    inputs = _read_merge_inputs(csv_file, csv_dir, untranslated_txt_dir, encoding_entry, bilingual, cache_dir)
+    if inputs is None:
+        # 读取失败在两份错误报告中都要记录，日志只输出一次
+        chinese['error_rows'] = list(bilingual['error_rows'])
+        return [bilingual, chinese]
+    chinese['encoding_entry'] = bilingual['encoding_entry']
+    render_chinese_only(csv_file, _copy_inputs(inputs), name_index, chinese)
+    render_bilingual(csv_file, inputs, name_index, bilingual, raw_csv_dir)
+    return [bilingual, chinese]
+
+
+def render_rows(csv_file, rows, content, mode, name_index, slots=None, hooks=None):
+    """不读写文件，用已读取的行和原始脚本内容生成一种格式的合并结果（含写出前的后处理）
+
+    mode为"bilingual"或"chinese"；slots为_script_slots的解析结果，给出时不会被修改，可在多次调用间复用。
+    中日双语直接用行的text定位原文。返回_new_merge_result格式的字典。
+    """
+    if slots is None:
+        slots = _script_slots(content)
+    result = _new_merge_result(csv_file)
+    inputs = _copy_inputs((rows, content, slots))
+    if mode == "chinese":
+        render_chinese_only(csv_file, inputs, name_index, result)
+    else:
+        render_bilingual(csv_file, inputs, name_index, result, raw_csv_dir=None)
+    if result['output'] is not None:
+        result['output'], result['post_processed'] = apply_post_process(
+            csv_file.replace(".csv", ".txt"), result['output'], hooks)
+    return result
+
+
+# 单一输出的合并函数与输出名称，供按模式直接调用run_merge的入口（如全量重建）使用
+MODE_MERGERS = {
+    "bilingual": (_bilingual_outputs, "中日双语"),
+    "chinese": (_chinese_only_outputs, "纯中文"),
+}
+
+
+def merge_bilingual_file(csv_file, csv_dir, untranslated_txt_dir, name_index, encoding_entry=None,
+                         raw_csv_dir=None, cache_dir=None):
+    """在内存中生成一个文件的中日双语合并结果，返回_new_merge_result格式的字典"""
+    result = _new_merge_result(csv_file)
+    inputs = _read_merge_inputs(csv_file, csv_dir, untranslated_txt_dir, encoding_entry, result, cache_dir)
+    if inputs is not None:
+        render_bilingual(csv_file, inputs, name_index, result, raw_csv_dir)
+    return result
+
+
+def merge_chinese_only_file(csv_file, csv_dir, untranslated_txt_dir, name_index, encoding_entry=None,
+                            raw_csv_dir=None, cache_dir=None):
+    """在内存中生成一个文件的纯中文合并结果，返回_new_merge_result格式的字典"""
+    result = _new_merge_result(csv_file)
+    inputs = _read_merge_inputs(csv_file, csv_dir, untranslated_txt_dir, encoding_entry, result, cache_dir)
+    if inputs is not None:
+        render_chinese_only(csv_file, inputs, name_index, result)
+    return result
+
+
+def render_bilingual(csv_file, inputs, name_index, result, raw_csv_dir=None):
+    """用已读取的 (行列表, 脚本内容, 区间) 生成中日双语合并结果，写入result（会修改inputs中的行和区间）
+
+    raw_csv_dir中同名的原文CSV存在时用其中未经人名替换的text定位原文。
+    """
+    messages = result['messages']
+    error_rows = result['error_rows']
+    replace_items, content, slots = inputs
+
+    raw_items = []
+    raw_csv_path = os.path.join(raw_csv_dir, csv_file) if raw_csv_dir else None
+    if raw_csv_path and os.path.exists(raw_csv_path):
         try:
-            with open(dict_file, 'r', encoding='utf-8') as f:
-                name_dict = json.load(f)
-                print(f"已加载字典，包含 {len(name_dict)} 个替换项")
+            with open(raw_csv_path, 'r', encoding='utf-8') as f:
+                reader = csv.DictReader(f)
+                raw_items = list(reader)
         except Exception as e:
-            print(f"加载字典文件时出错: {e}")
-    else:
-        print(f"字典文件不存在: {dict_file}，将跳过人名翻译")
-    
-    # 创建输出目录
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # 获取CSV文件列表
-    csv_files = [f for f in os.listdir(csv_dir) if f.endswith(".csv")]
+            messages.append(f"警告: 读取原始CSV文件 {csv_file} 时出错，将使用清理后的text字段进行匹配: {e}")
+
+    for i, row in enumerate(replace_items):
+        if i < len(raw_items) and row.get('id') == raw_items[i].get('id'):
+            row['_match_text'] = raw_items[i].get('text', '')
+        else:
+            row['_match_text'] = row.get('text', '')
+        
+    # 按原文长度降序排序
+    replace_items.sort(key=lambda x: len(x.get('_match_text', '') or x.get('text', '') or ""), reverse=True)
+
+    # 区间按当前值建索引，每行只定位到以其原文开头的区间，不再扫描整个文件
+    indexes = _slot_indexes(slots, replace_items, '_match_text')
+    coverage = MergeCoverage(csv_file, content, replace_items, '_match_text')
+        
+    # 进行文本替换
+    changes_count = 0 # 记录当前文件替换次数
+    file_has_errors = False # 标记当前文件是否有错误
+    speakers = set() # 需要翻译name属性的说话人
     
-    for csv_file in csv_files:
-        # 构造文件路径
-        csv_path = os.path.join(csv_dir, csv_file)
-        txt_file = csv_file.replace(".csv", ".txt")
-        txt_path = os.path.join(untranslated_txt_dir, txt_file)
-        output_path = os.path.join(output_dir, txt_file)
+    for row in replace_items:
+        row_id = row.get('id', '')
+        orig = row.get('text', '')
+        trans = row.get('trans', '')
+        name = row.get('name', '')
+        match_orig = row.get('_match_text') or orig
         
-        # 检查原始TXT文件是否存在
-        if not os.path.exists(txt_path):
-            print(f"警告：跳过 {csv_file}，未找到对应的原始TXT文件")
-            continue
+        # 立即保存副本用于错误报告
+        orig_copy = orig
+        trans_copy = trans
         
-        # 读取CSV内容
-        replace_items = []
-        try:
-            with open(csv_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                replace_items = list(reader)
-        except Exception as e:
-            print(f"错误: 读取文件 {csv_file} 时出错: {e}")
-            error_rows.append([csv_file, "N/A", "文件读取错误", "", "", str(e)])
-            has_errors = True
-            continue # 跳过此文件
-            
-        # 按原文长度降序排序
-        replace_items.sort(key=lambda x: len(x.get('text', '') or ""), reverse=True)
+        if not orig or not trans:
+            # 根据用户需求，对不同ID的空条目进行区分处理
+            if row_id == 'info' or row_id == '译者':
+                # ID为info，原文或翻译为空是正常情况，只跳过，不记录错误，也不打印警告
+                pass # 显式地什么都不做
+            else:
+                # 其他ID，原文或翻译为空视为错误
+                messages.append(f"错误: 文件 {csv_file} 中ID为 {row_id} 的条目原文或翻译为空")
+                error_rows.append([csv_file, row_id, "条目内容不完整", orig_copy, trans_copy, "原文或翻译为空"])
+                file_has_errors = True # 标记文件有错误
+
+            continue # 跳过处理当前条目
         
-        # 读取原始文本内容
-        try:
-            with open(txt_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except Exception as e:
-            print(f"错误: 读取文件 {txt_file} 时出错: {e}")
-            error_rows.append([csv_file, "N/A", "原始文件读取错误", "", "", str(e)])
-            has_errors = True
-            continue # 跳过此文件
-            
-        # 进行文本替换
-        changes_count = 0 # 记录当前文件替换次数
-        file_has_errors = False # 标记当前文件是否有错误
+        # 使用通用函数清理原文中的标签
+        clean_orig = clean_html_tags(orig)
         
-        for row in replace_items:
-            row_id = row.get('id', '')
-            orig = row.get('text', '')
-            trans = row.get('trans', '')
-            name = row.get('name', '')
+        # 对于message类型，在处理前检查末尾\n是否一致（使用清理后的文本）
+        if row_id == '0000000000000' and name != '__narration__' and name != '__title__':
+            orig_ends_with_newline = clean_orig.endswith('\\n')
+            trans_ends_with_newline = trans.endswith('\\n')
             
-            if not orig or not trans:
-                # 根据用户需求，对不同ID的空条目进行区分处理
-                if row_id == 'info' or row_id == '译者':
-                    # ID为info或译者，原文或翻译为空是正常情况，只跳过，不记录错误
-                    pass
-                else:
-                    # 其他ID，原文或翻译为空视为错误
-                    print(f"错误: 文件 {csv_file} 中ID为 {row_id} 的条目原文或翻译为空")
-                    error_rows.append([csv_file, row_id, "条目内容不完整", orig, trans, "原文或翻译为空"])
-                    has_errors = True
-                    file_has_errors = True
-                continue # 跳过处理当前条目
-            
-            # 纯中文模式：直接用翻译替换原文，不需要清理原文中的标签
+            if orig_ends_with_newline != trans_ends_with_newline:
+                messages.append(f"警告: 文件 {csv_file} 中ID为 {row_id} 的条目，原文和翻译的末尾\\n不一致")
+                error_rows.append([
+                    csv_file, row_id, "末尾\\n不匹配", 
+                    orig_copy, trans_copy,
+                    f"原文末尾\\n: {orig_ends_with_newline}, 翻译末尾\\n: {trans_ends_with_newline}"
+                ])
+                file_has_errors = True
+                continue  # 跳过处理此条目
+        
+        if row_id == 'select':
+            # 处理select类型 - 仅替换文本内容
             try:
-                if row_id == 'select':
-                    # 处理select类型 - 直接替换文本内容
-                    pattern = re.compile(
-                        r'(choice text=)%s' % re.escape(orig),
-                    )
-                    new_content = pattern.sub(lambda m: f'{m.group(1)}{trans}', content)
-                    if new_content != content:
-                        content = new_content
-                        changes_count += 1
-                elif row_id == '0000000000000' and name == '__title__':
-                    # 处理title类型 (id=0000000000000, name=__title__) - 根据id和name字段判断
-                    pattern = re.compile(
-                        r'(title title=)%s' % re.escape(orig),
-                    )
-                    new_content = pattern.sub(lambda m: f'{m.group(1)}{trans}', content)
-                    if new_content != content:
-                        content = new_content
-                        changes_count += 1
-                elif row_id == '0000000000000' and name == '__narration__':
-                    # 处理narration类型 (id=0000000000000, name=__narration__) - 根据id和name字段判断
-                    pattern = re.compile(
-                        r'(narration text=)%s' % re.escape(orig),
-                    )
-                    new_content = pattern.sub(lambda m: f'{m.group(1)}{trans}', content)
-                    if new_content != content:
-                        content = new_content
-                        changes_count += 1
-                elif row_id == '0000000000000' and name != '__narration__' and name != '__title__':
-                    # 处理message类型 (id=0000000000000, name!=__narration__ and name!=__title__) - 直接替换
-                    pattern = re.compile(
-                        r'(message text=)%s' % re.escape(orig),
-                    )
-                    new_content = pattern.sub(lambda m: f'{m.group(1)}{trans}', content)
-                    if new_content != content:
-                        content = new_content
-                        changes_count += 1
-                        
+                # 只替换choice文本区间，不处理引号
+                if coverage.replace(indexes['choice'], 'choice', row, match_orig, trans, result):
+                    changes_count += 1
             except Exception as e:
-                print(f"处理文件 {csv_file} 中ID为 {row_id} 的条目时出错: {e}")
-                error_rows.append([csv_file, row_id, "纯中文处理错误", orig, trans, str(e)])
-                has_errors = True
+                messages.append(f"处理文件 {csv_file} 中ID为 {row_id} 的select条目时出错: {e}")
+                error_rows.append([csv_file, row_id, "处理select错误", orig, trans, str(e)])
                 file_has_errors = True
-                continue
 
-            # 翻译name属性 (无论row_id是什么类型)
-            if name and name_dict:
-                translated_name = name
-                # 按照键长度从长到短排序，优先匹配较长的name
-                found_name_translation = None
-                for dict_name in sorted(name_dict.keys(), key=len, reverse=True):
-                    if name == dict_name:
-                        found_name_translation = name_dict[dict_name]
-                        break
+        elif row_id == '0000000000000' and name == '__title__':
+            # 处理title类型 (id=0000000000000, name=__title__) - 只保留中文翻译，不使用双语格式
+            try:
+                # title文本区间直接替换为翻译
+                if coverage.replace(indexes['title'], 'title', row, match_orig, trans, result):
+                    changes_count += 1
+            except Exception as e:
+                messages.append(f"处理文件 {csv_file} 中ID为 {row_id} 的title条目时出错: {e}")
+                error_rows.append([csv_file, row_id, "处理title错误", orig, trans, str(e)])
+                file_has_errors = True
+                continue # 跳过处理此条目
+
+        elif row_id == '0000000000000' and name == '__narration__':
+            # 处理narration类型 (id=0000000000000, name=__narration__) - 只保留中文翻译，不使用双语格式
+            try:
+                # narration文本区间直接替换为翻译
+                if coverage.replace(indexes['narration'], 'narration', row, match_orig, trans, result):
+                    changes_count += 1
+            except Exception as e:
+                messages.append(f"处理文件 {csv_file} 中ID为 {row_id} 的narration条目时出错: {e}")
+                error_rows.append([csv_file, row_id, "处理narration错误", orig, trans, str(e)])
+                file_has_errors = True
+                continue # 跳过处理此条目
+
+        elif row_id == '0000000000000' and name != '__narration__' and name != '__title__':
+            # 处理message类型 (id=0000000000000, name!=__narration__ and name!=__title__) - 需要中日双语
+            try:
+                # 直接分割
+                parts = clean_orig.split("\\n")
+                trans_parts = trans.split("\\n")
                 
-                if found_name_translation and translated_name != found_name_translation:
-                    translated_name = found_name_translation
+                # 计算实际行数：末尾的空字符串不算作一行
+                orig_line_count = len(parts) - 1 if parts and parts[-1] == '' else len(parts)
+                trans_line_count = len(trans_parts) - 1 if trans_parts and trans_parts[-1] == '' else len(trans_parts)
                 
-                if translated_name != name: # 如果找到了不同的翻译
-                    try:
-                        name_pattern = re.compile(
-                            r'(name=)%s' % re.escape(name),
-                        )
-                        new_content = name_pattern.sub(lambda m: f'{m.group(1)}{translated_name}', content)
-                        if new_content != content:
-                            content = new_content
-                            # 不增加 changes_count，因为它不是文本内容的替换
-                    except Exception as e:
-                         print(f"处理文件 {csv_file} 中ID为 {row_id} 的name属性时出错: {e}")
-                         error_rows.append([csv_file, row_id, "处理name属性错误", name, translated_name, str(e)])
-                         has_errors = True
-                         file_has_errors = True
-
-        # 如果文件处理过程中没有错误，则写入新文件
-        if not file_has_errors:
-            try:
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                print(f"已生成纯中文文件: {output_path} (进行了 {changes_count} 处文本替换)")
+                # 检查原文和翻译的实际行数是否一致
+                if orig_line_count != trans_line_count:
+                    messages.append(f"警告: 文件 {csv_file} 中ID为 {row_id} 的条目，原文和翻译的行数不一致 (原文: {orig_line_count}行, 翻译: {trans_line_count}行)")
+                    error_rows.append([
+                        csv_file, row_id, "行数不匹配", 
+                        orig_copy, trans_copy,
+                        f"原文行数: {orig_line_count}, 翻译行数: {trans_line_count}"
+                    ])
+                    file_has_errors = True
+                    continue  # 跳过处理此条目
+                
+                # 检查原文是否以\n结尾
+                has_trailing_newline = clean_orig.endswith('\\n')
+                
+                # 移除末尾空字符串用于生成双语文本
+                parts_for_text = parts[:-1] if parts and parts[-1] == '' else parts
+                trans_parts_for_text = trans_parts[:-1] if trans_parts and trans_parts[-1] == '' else trans_parts
+                    
+                bilingual_text = "".join(
+                    [f"<r\\={p}>{tp}</r>\\r\\n" 
+                     for p, tp in zip(parts_for_text, trans_parts_for_text)]
+                ).rstrip('\\r\\n')
+                
+                # 如果原文末尾有\n，在双语文本末尾也添加\n
+                if has_trailing_newline:
+                    bilingual_text += '\\n'
+                # message文本区间替换为双语文本
+                if coverage.replace(indexes['message'], 'message', row, match_orig, bilingual_text, result):
+                    changes_count += 1
             except Exception as e:
-                print(f"错误: 写入文件 {output_path} 时出错: {e}")
-                error_rows.append([csv_file, "N/A", "文件写入错误", "", "", str(e)])
-                has_errors = True
-        else:
-            print(f"文件 {csv_file} 处理过程中存在错误，跳过生成输出文件")
-    
-    # 在处理完所有文件后调用 process_unit_files_in_folder (总是处理)
-    print("\n正在处理adv_unit_开头的文件...")
-    process_unit_files_in_folder(output_dir) # 无条件调用
+                messages.append(f"处理文件 {csv_file} 中ID为 {row_id} 的条目时出错: {e}")
+                error_rows.append([csv_file, row_id, "处理错误", orig_copy, trans_copy, str(e)])
+                file_has_errors = True
+                continue # 跳过处理此条目
+
+        # 记录需要翻译name属性的说话人 (无论row_id是什么类型)，循环结束后一次遍历改写name区间
+        if name:
+            speakers.add(name)
+
+    result['coverage'] = coverage.counts
+    # 如果文件处理过程中没有错误，则由调用方写入新文件
+    if not file_has_errors:
+        result['name_changes'] = _translate_names(slots['name'], speakers, name_index)
+        result['output'] = _render_slots(content, slots)
+        result['changes'] = changes_count
+    else:
+        messages.append(f"文件 {csv_file} 处理过程中存在错误，跳过生成输出文件")
+    return result
+
+
+def render_chinese_only(csv_file, inputs, name_index, result):
+    """用已读取的 (行列表, 脚本内容, 区间) 生成纯中文合并结果，写入result（会修改inputs中的行和区间）"""
+    messages = result['messages']
+    error_rows = result['error_rows']
+    replace_items, content, slots = inputs
+        
+    # 按原文长度降序排序
+    replace_items.sort(key=lambda x: len(x.get('text', '') or ""), reverse=True)
+
+    # 区间按当前值建索引，每行只定位到以其原文开头的区间，不再扫描整个文件
+    indexes = _slot_indexes(slots, replace_items)
+    coverage = MergeCoverage(csv_file, content, replace_items)
+        
+    # 进行文本替换
+    changes_count = 0 # 记录当前文件替换次数
+    file_has_errors = False # 标记当前文件是否有错误
+    speakers = set() # 需要翻译name属性的说话人
     
-    # 如果有错误，写入错误报告
-    if has_errors:
+    for row in replace_items:
+        row_id = row.get('id', '')
+        orig = row.get('text', '')
+        trans = row.get('trans', '')
+        name = row.get('name', '')
+        
+        if not orig or not trans:
+            # 根据用户需求，对不同ID的空条目进行区分处理
+            if row_id == 'info' or row_id == '译者':
+                # ID为info或译者，原文或翻译为空是正常情况，只跳过，不记录错误
+                pass
+            else:
+                # 其他ID，原文或翻译为空视为错误
+                messages.append(f"错误: 文件 {csv_file} 中ID为 {row_id} 的条目原文或翻译为空")
+                error_rows.append([csv_file, row_id, "条目内容不完整", orig, trans, "原文或翻译为空"])
+                file_has_errors = True
+            continue # 跳过处理当前条目
+        
+        # 纯中文模式：直接用翻译替换原文，不需要清理原文中的标签
         try:
-            with open(error_report_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerows(error_rows)
-            print(f"\n处理过程中发现错误，详细信息已保存到: {os.path.abspath(error_report_file)}")
+            if row_id == 'select':
+                # 处理select类型 - 直接替换文本内容
+                if coverage.replace(indexes['choice'], 'choice', row, orig, trans, result):
+                    changes_count += 1
+            elif row_id == '0000000000000' and name == '__title__':
+                # 处理title类型 (id=0000000000000, name=__title__) - 根据id和name字段判断
+                if coverage.replace(indexes['title'], 'title', row, orig, trans, result):
+                    changes_count += 1
+            elif row_id == '0000000000000' and name == '__narration__':
+                # 处理narration类型 (id=0000000000000, name=__narration__) - 根据id和name字段判断
+                if coverage.replace(indexes['narration'], 'narration', row, orig, trans, result):
+                    changes_count += 1
+            elif row_id == '0000000000000' and name != '__narration__' and name != '__title__':
+                # 处理message类型 (id=0000000000000, name!=__narration__ and name!=__title__) - 直接替换
+                if coverage.replace(indexes['message'], 'message', row, orig, trans, result):
+                    changes_count += 1
+                    
         except Exception as e:
-            print(f"错误: 写入错误报告时出错: {e}")
-    
-    print("\n合并完成！请检查以下目录:")
-    print(f"- 翻译结果: {os.path.abspath(output_dir)}")
-    if has_errors:
-        print(f"- 错误报告: {os.path.abspath(error_report_file)}")
+            messages.append(f"处理文件 {csv_file} 中ID为 {row_id} 的条目时出错: {e}")
+            error_rows.append([csv_file, row_id, "纯中文处理错误", orig, trans, str(e)])
+            file_has_errors = True
+            continue
+
+        # 记录需要翻译name属性的说话人 (无论row_id是什么类型)，循环结束后一次遍历改写name区间
+        if name:
+            speakers.add(name)
+
+    result['coverage'] = coverage.counts
+    # 如果文件处理过程中没有错误，则由调用方写入新文件
+    if not file_has_errors:
+        result['name_changes'] = _translate_names(slots['name'], speakers, name_index)
+        result['output'] = _render_slots(content, slots)
+        result['changes'] = changes_count
     else:
-        print("未检测到处理错误。")
+        messages.append(f"文件 {csv_file} 处理过程中存在错误，跳过生成输出文件")
+    return result
@@ -0,0 +1,141 @@
+"""
+解析缓存模块，把原始脚本的词法解析结果按内容摘要保存为紧凑的二进制文件
+"""
+
+import os
+import sys
+from array import array
+from . import lexer
+
+# 缓存目录名，与原始txt文件放在同一目录
+CACHE_DIR = ".parse_cache"
+
+# lexer规则或存储格式变化时递增，旧缓存自动失效
+FORMAT_VERSION = 1
+
+_MAGIC = b'GATP'
+_KINDS = ('message', 'narration', 'title', 'choice')
+# 每条记录保存的整数字段：kind序号、command序号，其后为TextRecord中的行号与各区间偏移
+_RECORD_FIELDS = lexer.TextRecord._fields[2:]
+_RECORD_WIDTH = 2 + len(_RECORD_FIELDS)
+
+
+def _int_array(values=()):
+    """4字节有符号整数数组，统一按小端序存储"""
+    return array('i', values)
+
+
+def encode(records, names):
+    """把文本记录和name区间编码为二进制：头部 + 命令名表 + 记录整数表 + name区间整数表"""
+    commands = sorted(set(record.command for record in records))
+    command_index = {command: i for i, command in enumerate(commands)}
+    numbers = _int_array()
+    for record in records:
+        numbers.append(_KINDS.index(record.kind))
+        numbers.append(command_index[record.command])
+        numbers.extend(record[2:])
+    spans = _int_array(value for span in names for value in span)
+    command_bytes = '\n'.join(commands).encode('utf-8')
+    header = _int_array([FORMAT_VERSION, len(command_bytes), len(records), len(names)])
+    if sys.byteorder == 'big':
+        for part in (header, numbers, spans):
+            part.byteswap()
+    return b''.join([_MAGIC, header.tobytes(), command_bytes, numbers.tobytes(), spans.tobytes()])
+
+
+def decode(data):
+    """解码encode生成的二进制，返回 (文本记录列表, name区间列表)，格式不符时返回None"""
+    if not data.startswith(_MAGIC):
+        return None
+    pos = len(_MAGIC)
+    header = _int_array()
+    header.frombytes(data[pos:pos + 16])
+    if sys.byteorder == 'big':
+        header.byteswap()
+    version, command_size, record_count, name_count = header
+    if version != FORMAT_VERSION:
+        return None
+    pos += 16
+    commands = data[pos:pos + command_size].decode('utf-8').split('\n')
+    pos += command_size
+    numbers = _int_array()
+    numbers.frombytes(data[pos:pos + record_count * _RECORD_WIDTH * 4])
+    pos += record_count * _RECORD_WIDTH * 4
+    spans = _int_array()
+    spans.frombytes(data[pos:pos + name_count * 8])
+    if len(numbers) != record_count * _RECORD_WIDTH or len(spans) != name_count * 2:
+        return None
+    if sys.byteorder == 'big':
+        numbers.byteswap()
+        spans.byteswap()
+
+    records = []
+    for i in range(0, len(numbers), _RECORD_WIDTH):
+        records.append(lexer.TextRecord(_KINDS[numbers[i]], commands[numbers[i + 1]],
+                                        *numbers[i + 2:i + _RECORD_WIDTH]))
+    names = list(zip(spans[0::2], spans[1::2]))
+    return records, names
+
+
+def cache_path(directory, key):
+    return os.path.join(directory, CACHE_DIR, f"{key}.bin")
+
+
+def load(directory, key):
+    """读取内容摘要为key的解析缓存，不存在或无效时返回None"""
+    try:
+        with open(cache_path(directory, key), 'rb') as f:
+            return decode(f.read())
+    except (OSError, ValueError, IndexError, UnicodeDecodeError):
+        return None
+
+
+def save(directory, key, records, names):
+    """写入解析缓存（先写临时文件再替换，多个进程同时写入同一文件也不会损坏）"""
+    path = cache_path(directory, key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            f.write(encode(records, names))
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        print(f"保存解析缓存时出错: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+
+def lex_cached(content, directory=None, key=None):
+    """返回脚本的 (文本记录列表, name区间列表)
+
+    directory和key（原始文件内容摘要，即编码缓存记录中的hash）都给出时优先读取缓存，
+    未命中时解析并写入缓存；否则直接解析。
+    """
+    if directory and key:
+        cached = load(directory, key)
+        if cached is not None:
+            return cached
+    records = lexer.lex_script(content)
+    names = lexer.name_spans(content)
+    if directory and key:
+        save(directory, key, records, names)
+    return records, names
+
+
+def prune(directory, keys):
+    """删除不再对应任何原始文件的解析缓存，返回删除的文件数"""
+    cache_dir = os.path.join(directory, CACHE_DIR)
+    if not os.path.isdir(cache_dir):
+        return 0
+    keep = set(f"{key}.bin" for key in keys if key)
+    removed = 0
+    for filename in os.listdir(cache_dir):
+        if filename not in keep:
+            try:
+                os.remove(os.path.join(cache_dir, filename))
+                removed += 1
+            except OSError:
+                pass
+    return removed
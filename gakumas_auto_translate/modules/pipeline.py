@@ -0,0 +1,144 @@
+"""
+流水线模块，在一个进程中按顺序执行 检查 → 预处理 → 翻译 → 合并 → 清理，供无人值守的批量运行使用
+"""
+
+import json
+import shutil
+import subprocess
+import time
+from . import checker, preprocessor, translator, merger, cleaner, staging
+from .dictionary import load_name_dictionary
+
+STAGES = ["check", "preprocess", "translate", "merge", "clean"]
+
+# 命令行的合并模式，both同时生成中日双语和纯中文结果
+MODES = {"bilingual": "bilingual", "chinese": "chinese", "dual": "dual", "both": "dual"}
+
+# 翻译阶段调用的外部翻译工具命令（在GakumasPreTranslation目录下执行）
+YARN = shutil.which("yarn.cmd") or shutil.which("yarn") or "yarn"
+TRANSLATE_COMMAND = [YARN, "translate:folder"]
+
+# 阶段和整次运行的状态
+OK = "ok"
+NO_CHANGES = "no_changes"
+WAITING_TRANSLATION = "waiting_translation"
+MERGE_ERRORS = "merge_errors"
+FAILED = "failed"
+
+# 各状态对应的退出码
+EXIT_CODES = {OK: 0, NO_CHANGES: 0, FAILED: 1, WAITING_TRANSLATION: 3, MERGE_ERRORS: 4}
+
+
+class Pipeline:
+    """一个批次的流水线运行
+
+    人名字典在第一次需要时加载一次，预处理和合并共用；预处理写入的解析缓存按内容摘要供合并直接读取，
+    合并不再重新解析原始脚本。各阶段之间只通过工作区中必须保留的文件（待翻译CSV、翻译工具的输入输出、
+    合并结果）衔接，中途停止后可以用from_stage从任一阶段继续。
+    translate_command为None时翻译阶段只准备翻译工具的输入，然后以waiting_translation停止，
+    等外部完成翻译后从merge阶段继续。
+    """
+
+    def __init__(self, workspace, workers=0, translate_command=None):
+        self.workspace = workspace
+        self.workers = workers
+        self.translate_command = translate_command
+        self.queued = None
+        self.results = []
+        self._name_dict = None
+        self._dict_loaded = False
+
+    @property
+    def name_dict(self):
+        """人名字典，整次运行只读取一次；不存在或读取失败时为None"""
+        if not self._dict_loaded:
+            self._name_dict = load_name_dictionary(self.workspace.dict_file)
+            self._dict_loaded = True
+        return self._name_dict
+
+    def stage_check(self):
+        if not self.workspace.dump_txt_path:
+            print("未找到dump_txt目录配置，请先使用功能9配置程序所需目录")
+            return FAILED
+        self.queued = checker.check_new_files(self.workspace)
+        return OK if self.queued else NO_CHANGES
+
+    def stage_preprocess(self):
+        preprocessor.preprocess_txt_files(workers=self.workers, carry_over=True,
+                                          workspace=self.workspace, name_dict=self.name_dict)
+        return OK
+
+    def stage_translate(self):
+        if not translator.translate_csv_files(self.workspace):
+            return FAILED
+        if self.translate_command is None:
+            print("翻译工具的输入已准备好，完成翻译后使用 --from merge 继续")
+            return WAITING_TRANSLATION
+        print(f"正在执行翻译工具: {' '.join(self.translate_command)}")
+        completed = subprocess.run(self.translate_command, cwd=self.workspace.gakumas_dir)
+        if completed.returncode != 0:
+            print(f"翻译工具退出码为 {completed.returncode}")
+            return FAILED
+        return OK
+
+    def stage_merge(self):
+        # 字典不存在时合并同样跳过人名翻译
+        name_dict = self.name_dict if self.name_dict is not None else {}
+        result = merger.merge_translations(self.workers, self.workspace, name_dict=name_dict)
+        if result is None:
+            return FAILED
+        return OK if result else MERGE_ERRORS
+
+    def stage_clean(self):
+        return OK if cleaner.cleanup_and_copy(self.workspace) else FAILED
+
+    def run(self, from_stage="check", to_stage="merge"):
+        """依次执行from_stage到to_stage的各阶段，某一阶段未成功时停止，返回整次运行的状态"""
+        stages = STAGES[STAGES.index(from_stage):STAGES.index(to_stage) + 1]
+        if not stages:
+            raise ValueError(f"阶段顺序错误: {from_stage} → {to_stage}")
+        status = OK
+        for stage in stages:
+            print(f"\n==== {stage} ====")
+            start = time.perf_counter()
+            result = {"stage": stage}
+            try:
+                status = getattr(self, "stage_" + stage)()
+            except Exception as e:
+                print(f"{stage}阶段出错: {e}")
+                status = FAILED
+                result["error"] = str(e)
+            result["status"] = status
+            result["seconds"] = round(time.perf_counter() - start, 3)
+            self.results.append(result)
+            if status != OK:
+                break
+        return status
+
+    def summary(self, status):
+        """机器可读的运行结果"""
+        summary = {
+            "status": status,
+            "exit_code": EXIT_CODES[status],
+            "mode": self.workspace.mode,
+            "stages": self.results,
+        }
+        if self.queued is not None:
+            summary["queued_files"] = self.queued
+        return summary
+
+
+def run_pipeline(workspace, from_stage="check", to_stage="merge", workers=0,
+                 translate_command=None, status_file=None):
+    """执行流水线并输出各阶段耗时，返回退出码；status_file给出时写入JSON格式的运行结果"""
+    pipeline = Pipeline(workspace, workers, translate_command)
+    status = pipeline.run(from_stage, to_stage)
+    summary = pipeline.summary(status)
+    print("\n==== 流水线结果 ====")
+    for result in pipeline.results:
+        print(f"{result['stage']}: {result['status']}（{result['seconds']:.2f}s）")
+    print(f"状态: {status}，退出码 {summary['exit_code']}")
+    if status_file:
+        with staging.replace_file(status_file) as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary["exit_code"]
@@ -3,321 +3,269 @@
 """
 
 import os
-import re
 import csv
-import json
-import shutil
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from .utils import remove_r_tags_inplace, clean_html_tags
+from .utils import clean_html_tags
+from .dictionary import load_name_dictionary, NameReplacer
+from . import encoding as encoding_cache
+from . import lexer
+from . import parse_cache
+from . import carryover
+from .workspace import Workspace
 
-MESSAGE_TEXT_RE = re.compile(r'\[message text=(.*?)(?=\s+(?:name|hide|isInner|se|clip)=|\])')
-MESSAGE_NAME_RE = re.compile(r'(?:^|\s)name=\s*([^\s\]]+)')
+CSV_FIELDNAMES = ['id', 'name', 'text', 'trans']
 
-def preprocess_txt_files(preserve_html=False):
-    """预处理待翻译的txt文件（包含message、choice和narration）"""
-    source_dir = "./todo/untranslated/txt"
-    output_dir = "./todo/untranslated/csv_orig"
+
+def preprocess_txt_files(preserve_html=False, workers=1, carry_over=False,
+                         previous_dir=None, workspace=None, name_dict=None):
+    """预处理待翻译的txt文件（包含message、choice和narration）
+
+    每个文件在内存中依次经过 提取 → 标签去除 → 字典替换 → 最终标签清理，
+    csv_orig与csv_dict各只写一次。preserve_html=True时csv_dict与csv_orig内容相同。
+    workers>1时按文件分发到进程池处理（workers<=0表示使用全部CPU核心），
+    日志与生成的CSV与单进程运行完全一致，均按文件名排序输出。
+    carry_over=True时，previous_dir（默认为工作区的csv_data）中存在同名的上一版CSV的文件会按
+    (id, name, text) 对齐沿用已有译文，只有新增或修改过的行trans为空。
+    workspace默认为当前目录的工作区；name_dict为已加载的人名字典，未给出时读取工作区的字典文件。
+    """
+    workspace = workspace or Workspace.default()
+    source_dir = workspace.todo_txt_dir
+    output_dir = workspace.csv_orig_dir
+    dict_dir = workspace.csv_dict_dir
     
     Path(output_dir).mkdir(parents=True, exist_ok=True)
-    
-    # 常见编码列表，按尝试顺序排列
-    encodings_to_try = ['utf-8', 'shift-jis', 'gbk', 'cp932', 'latin1', 'cp1252']
-    
-    for filename in os.listdir(source_dir):
-        if not filename.endswith(".txt"):
-            continue
-            
-        input_path = os.path.join(source_dir, filename)
-        output_path = os.path.join(output_dir, filename.replace(".txt", ".csv"))
-        
-        extracted_data = []
-        
-        # 尝试不同的编码格式
-        file_content = None
-        
-        for encoding in encodings_to_try:
-            try:
-                with open(input_path, 'r', encoding=encoding) as f:
-                    file_content = f.readlines()
-                print(f"成功使用 {encoding} 编码读取文件: {filename}")
-                break
-            except UnicodeDecodeError:
-                continue
-        
-        if file_content is None:
-            print(f"无法识别文件编码格式，跳过文件: {filename}")
-            continue
-            
-        for line in file_content:
-            line = line.strip()
-              # 匹配message类型
-            message_match = MESSAGE_TEXT_RE.match(line)
-            if message_match:
-                text_content = message_match.group(1).strip('"')
-                name_match = MESSAGE_NAME_RE.search(line)
-                name_content = name_match.group(1).strip('"') if name_match else ''
-                extracted_data.append({
-                    'id': '0000000000000',
-                    'name': name_content,
-                    'text': text_content,
-                    'trans': ''
-                })
-                continue
-            
-            # 匹配choices类型
-            choices_match = re.findall(r'choice text=(.*?)(?:\s+\w+=|\])', line)
-            if choices_match:
-                for choice_text in choices_match:
-                    clean_text = choice_text.strip('"')
-                    extracted_data.append({
-                        'id': 'select',
-                        'name': '',
-                        'text': clean_text,
-                        'trans': ''
-                    })
-                    continue
-            
-            # 匹配title类型
-            title_match = re.match(r'\[\[?title title=(.*?)(?:\]|\s+\w+=)', line)
-            if title_match:
-                text_content = title_match.group(1).strip('"')
-                extracted_data.append({
-                    'id': '0000000000000',
-                    'name': '__title__',
-                    'text': text_content,
-                    'trans': ''
-                })
-                continue
-            
-            # 匹配narration类型
-            narration_match = re.match(r'\[\[?narration text=(.*?)(?:\]|\s+\w+=)', line)
-            if narration_match:
-                text_content = narration_match.group(1).strip('"')
-                extracted_data.append({
-                    'id': '0000000000000',
-                    'name': '__narration__',
-                    'text': text_content,
-                    'trans': ''
-                })
-                continue
-        
-        # 记录添加info行前的数据量
-        original_length = len(extracted_data)
-        # 添加info行到列表末尾
-        extracted_data.append({
-            'id': 'info',
-            'name': filename,
-            'text': '',
-            'trans': ''
-        })
-        
-        # 仅当存在有效数据时才生成CSV文件
-        if original_length > 0:
-            # 写入CSV文件
-            with open(output_path, 'w', encoding='utf-8', newline='') as csvfile:
-                fieldnames = ['id', 'name', 'text', 'trans']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                for row in extracted_data:
-                    writer.writerow(row)
-
-            print(f"已生成预处理文件: {output_path}")
-
-            # （1）先复制到csv_dict
-            dict_output_path = output_path.replace("csv_orig", "csv_dict")
-            Path(dict_output_path).parent.mkdir(parents=True, exist_ok=True)
-            shutil.copy2(output_path, dict_output_path)
-            print(f"已复制到词典替换目录: {dict_output_path}")
-
-            if preserve_html:
-                print(f"保留HTML标签: {dict_output_path}")
-            else:
-                # （2）然后在dict文件中清理标签
-                remove_r_tags_inplace(dict_output_path)
-                print(f"已去除<\\r=></r>标签: {dict_output_path}")
-        else:
-            print(f"跳过文件 {filename}，未找到可翻译内容")
+    Path(dict_dir).mkdir(parents=True, exist_ok=True)
+
+    if preserve_html:
+        name_dict = None
+    elif name_dict is None:
+        name_dict = load_name_dictionary(workspace.dict_file)
+        if name_dict is None:
+            print("跳过字典替换步骤")
+    replacer = NameReplacer(name_dict) if name_dict is not None else None
+    stages = build_text_stages(preserve_html, replacer)
+
+    filenames = sorted(f for f in os.listdir(source_dir) if f.endswith(".txt"))
+    if workers is not None and workers <= 0:
+        workers = os.cpu_count() or 1
+    workers = min(workers or 1, max(len(filenames), 1))
+    # 编码缓存由父进程统一读写，工作进程只返回各自文件的记录
+    cache = encoding_cache.load_cache(source_dir)
+    previous_dir = (previous_dir or workspace.csv_data_dir) if carry_over else None
+    tasks = [(filename, source_dir, output_dir, dict_dir, cache.get(filename), previous_dir)
+             for filename in filenames]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(preserve_html, name_dict)) as executor:
+            # map按提交顺序返回结果，保证日志顺序与单进程一致
+            results = executor.map(_preprocess_task, tasks, chunksize=max(1, len(tasks) // (workers * 4)))
+            totals = _report_results(results, stages, cache)
+    else:
+        results = (preprocess_file(filename, source, output, dict_out, stages, entry, previous)
+                   for filename, source, output, dict_out, entry, previous in tasks)
+        totals = _report_results(results, stages, cache)
+    carried_totals = totals.pop(_CARRY_OVER_LABEL)
+    encoding_cache.save_cache(source_dir, cache)
+    parse_cache.prune(source_dir, [cache[f].get('hash') for f in filenames if f in cache])
+    if carry_over:
+        carried_files, carried_rows, total_rows = carried_totals
+        print(f"\n沿用已有翻译：{carried_files} 个文件，共沿用 {carried_rows}/{total_rows} 行")
 
     if preserve_html:
         print("\n保标签预处理完成，跳过字典替换和HTML清理")
         return True
-    
-    # 预处理完成后，立即进行字典替换
-    print("\n正在执行字典替换...")
-    replace_names_in_csv()
-
-    # 在字典替换后，对csv_dict中的所有CSV文件进行HTML标签清理
-    print("\n正在清理CSV文件中的HTML标签...")
-    clean_html_in_csv_dict() # 新增调用
 
+    for label, (file_count, row_count) in totals.items():
+        if file_count:
+            print(f"\n完成{label}！处理了 {file_count} 个文件，共处理 {row_count} 行")
+        else:
+            print(f"\n未发现需要{label}的内容")
     return True
 
 
-def replace_names_in_csv():
-    """使用字典替换CSV文件中的人名和常见称谓"""
-    # 定义路径常量
-    csv_dir = "./todo/untranslated/csv_dict"
-    dict_file = "./name_dictionary.json"
-    
-    # 检查字典文件是否存在
-    if not os.path.exists(dict_file):
-        print(f"未找到字典文件: {dict_file}")
-        print("跳过字典替换步骤")
-        return False
-    
-    # 加载字典文件
-    try:
-        with open(dict_file, 'r', encoding='utf-8') as f:
-            name_dict = json.load(f)
-            print(f"已加载字典，包含 {len(name_dict)} 个替换项")
-    except Exception as e:
-        print(f"加载字典文件时出错: {e}")
-        return False
-    
-    # 检查是否有CSV文件
-    csv_files = [f for f in os.listdir(csv_dir) if f.endswith(".csv")]
-    if not csv_files:
-        print("没有找到需要处理的CSV文件")
-        return False
-    
-    # 处理所有CSV文件
-    processed_count = 0
-    replaced_count = 0
-    
-    for filename in csv_files:
-        file_path = os.path.join(csv_dir, filename)
-        
-        # 读取CSV文件
-        rows = []
-        fieldnames = []
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                fieldnames = reader.fieldnames
-                rows = list(reader)
-        except Exception as e:
-            print(f"读取CSV文件 {filename} 时出错: {e}")
-            continue
-        
-        if not rows or not fieldnames: # 确保读取成功且文件非空
-            print(f"跳过空文件或读取失败的文件: {filename}")
-            continue
-            
-        # 遍历每一行进行替换
-        file_replaced_by_dict = 0 # 记录字典替换次数
-        for row in rows:
-            original_text = row.get('text', '')
-            if not isinstance(original_text, str): # 确保text字段是字符串
-                original_text = str(original_text)
-            
-            # 对文本进行替换
-            replaced_text = original_text
-            for jp_term, cn_term in name_dict.items():
-                # 使用正则表达式确保完整匹配词语
-                # 注意: re.sub如果找不到匹配，会返回原字符串，所以不需要 pre-check jp_term in replaced_text
-                replaced_text = re.sub(r'\b' + re.escape(jp_term) + r'\b', cn_term, replaced_text)
-                
-                # 也检查不带词边界的情况（对日文可能更合适）
-                # 确保先进行带边界的替换，再进行不带边界的，避免部分替换问题
-                # 或者根据实际需求调整这里的逻辑，例如只用一种或根据字典项特性选择
-                if jp_term in replaced_text: # 再次检查是为了处理第一次re.sub可能未覆盖的情况
-                    replaced_text = replaced_text.replace(jp_term, cn_term)
-            
-            # 如果有替换，更新文本
-            if replaced_text != original_text:
-                row['text'] = replaced_text
-                file_replaced_by_dict += 1
-        
-        # 只有在有实际字典替换时才写回文件
-        if file_replaced_by_dict > 0:
-            try:
-                with open(file_path, 'w', encoding='utf-8', newline='') as f:
-                    writer = csv.DictWriter(f, fieldnames=fieldnames)
-                    writer.writeheader()
-                    writer.writerows(rows)
-                
-                processed_count += 1
-                replaced_count += file_replaced_by_dict
-                print(f"处理文件 {filename} (字典替换): 替换了 {file_replaced_by_dict} 处内容")
-            except Exception as e:
-                print(f"写入CSV文件 {filename} (字典替换后) 时出错: {e}")
-
-    # 输出处理摘要
-    if processed_count > 0:
-        print(f"\n完成字典替换！处理了 {processed_count} 个文件，共替换 {replaced_count} 处内容")
-    else:
-        print("\n未发现需要字典替换的内容")
-    return True # 字典替换本身无论是否替换都算完成
-
-
-def clean_html_in_csv_dict():
-    """清理csv_dict目录下所有CSV文件text列的HTML标签"""
-    csv_dir = "./todo/untranslated/csv_dict"
-    csv_files = [f for f in os.listdir(csv_dir) if f.endswith(".csv")]
-
-    if not csv_files:
-        print("在 {csv_dir} 中没有找到需要清理HTML标签的CSV文件")
-        return False
-
-    cleaned_files_count = 0
-    total_lines_cleaned = 0
-
-    for filename in csv_files:
-        file_path = os.path.join(csv_dir, filename)
-        rows = []
-        fieldnames = []
-        original_content_for_comparison = [] # 用于比较是否有实际内容变化
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                fieldnames = reader.fieldnames
-                if not fieldnames: # 处理空CSV或无表头的情况
-                    print(f"跳过文件 {filename}，无表头或为空。")
-                    continue
-                for row in reader:
-                    rows.append(dict(row)) # 创建副本，避免修改影响迭代器
-                    original_content_for_comparison.append(dict(row)) # 存储原始行用于比较
-
-        except Exception as e:
-            print(f"读取CSV文件 {filename} (HTML清理前) 时出错: {e}")
-            continue
-
-        if not rows:
-            print(f"文件 {filename} 为空或读取失败，跳过HTML清理。")
-            continue
-
-        lines_cleaned_in_file = 0
-        file_content_changed = False
-
-        for i, row in enumerate(rows):
-            original_text = row.get('text', '')
-            if not isinstance(original_text, str):
-                 original_text = str(original_text)
-
-            cleaned_text = clean_html_tags(original_text)
-
-            if cleaned_text != original_text:
-                row['text'] = cleaned_text
-                lines_cleaned_in_file += 1
-                file_content_changed = True
-        
-        if file_content_changed: # 只有当文件内容因HTML清理而改变时才写回
-            try:
-                with open(file_path, 'w', encoding='utf-8', newline='') as f:
-                    writer = csv.DictWriter(f, fieldnames=fieldnames)
-                    writer.writeheader()
-                    writer.writerows(rows)
-                print(f"处理文件 {filename} (HTML清理): 清理了 {lines_cleaned_in_file} 行的HTML标签")
-                cleaned_files_count += 1
-                total_lines_cleaned += lines_cleaned_in_file
-            except Exception as e:
-                print(f"写入CSV文件 {filename} (HTML清理后) 时出错: {e}")
-        else:
-            print(f"文件 {filename} (HTML清理): 无需清理HTML标签或内容未改变")
+# 工作进程内的处理链，由_init_worker在每个进程中构建一次
+_worker_stages = None
 
-    if cleaned_files_count > 0:
-        print(f"\n完成HTML标签清理！处理了 {cleaned_files_count} 个文件，共清理了 {total_lines_cleaned} 行的HTML标签。")
-    else:
-        print("\n未发现需要清理HTML标签的内容，或内容清理后未发生变化。")
-    return True
+
+def _init_worker(preserve_html, name_dict):
+    """进程池初始化：构建当前工作进程的处理链（字典替换器在每个进程中只构建一次）"""
+    global _worker_stages
+    replacer = NameReplacer(name_dict) if name_dict is not None else None
+    _worker_stages = build_text_stages(preserve_html, replacer)
+
+
+def _preprocess_task(task):
+    filename, source_dir, output_dir, dict_dir, encoding_entry, previous_dir = task
+    return preprocess_file(filename, source_dir, output_dir, dict_dir, _worker_stages, encoding_entry, previous_dir)
+
+
+_CARRY_OVER_LABEL = "沿用已有翻译"
+
+
+def _report_results(results, stages, cache):
+    """按顺序输出各文件的日志，收集编码缓存记录，并汇总每个阶段的 [文件数, 行数]
+
+    沿用译文的统计单独记在 _CARRY_OVER_LABEL 下：[沿用过译文的文件数, 沿用行数, 有上一版的文件行数]。
+    """
+    totals = {label: [0, 0] for label, _ in stages}
+    totals[_CARRY_OVER_LABEL] = [0, 0, 0]
+    for result in results:
+        if result['encoding_entry']:
+            cache[result['filename']] = result['encoding_entry']
+        for message in result['messages']:
+            print(message)
+        for label, changed in result['stage_counts']:
+            if changed:
+                totals[label][0] += 1
+                totals[label][1] += changed
+        if result['carried'] is not None:
+            carried, row_count = result['carried']
+            carried_total = totals[_CARRY_OVER_LABEL]
+            carried_total[0] += 1 if carried else 0
+            carried_total[1] += carried
+            carried_total[2] += row_count
+    return totals
+
+
+def build_text_stages(preserve_html=False, replacer=None):
+    """构建csv_dict中text列的处理链，每个阶段为 (名称, 文本处理函数)
+
+    默认顺序为 标签去除 → 字典替换 → 最终标签清理；保留标签模式下处理链为空。
+    """
+    if preserve_html:
+        return []
+    stages = [("去除<\\r=></r>标签", clean_html_tags)]
+    if replacer is not None:
+        stages.append(("字典替换", replacer.replace))
+    stages.append(("HTML标签清理", clean_html_tags))
+    return stages
+
+
+def apply_text_stages(rows, stages):
+    """在内存中对行数据的text列依次执行处理链，返回新行列表和每个阶段改动的行数"""
+    counts = [0] * len(stages)
+    result = []
+    for row in rows:
+        row = dict(row)
+        text = row['text']
+        for i, (_, func) in enumerate(stages):
+            new_text = func(text)
+            if new_text != text:
+                counts[i] += 1
+                text = new_text
+        row['text'] = text
+        result.append(row)
+    return result, [(label, counts[i]) for i, (label, _) in enumerate(stages)]
+
+
+def read_script(input_path, encoding_entry=None):
+    """读取原始脚本，返回 (文本, 编码, 编码缓存记录)，无法识别编码时返回 (None, None, None)
+
+    文件只读取和完整解码一次；encoding_entry为该文件此前的编码缓存记录。
+    """
+    cache = {os.path.basename(input_path): encoding_entry} if encoding_entry else {}
+    text, encoding = encoding_cache.read_text(input_path, cache)
+    if text is None:
+        return None, None, None
+    return text, encoding, cache[os.path.basename(input_path)]
+
+
+# 各类文本记录在CSV中的 (id, name)；message的name取自说话人
+RECORD_IDS = {
+    'message': ('0000000000000', None),
+    'choice': ('select', ''),
+    'title': ('0000000000000', '__title__'),
+    'narration': ('0000000000000', '__narration__'),
+}
+
+
+def extract_rows(content, records=None):
+    """从脚本内容中提取message、choice、title和narration文本行（不含末尾info行）
+
+    records为该内容已有的词法记录（如解析缓存），为None时重新解析。
+    """
+    if records is None:
+        records = lexer.lex_script(content)
+    extracted_data = []
+    for record in records:
+        row_id, name = RECORD_IDS[record.kind]
+        if name is None:
+            name = lexer.record_name(content, record).strip('"')
+        extracted_data.append({
+            'id': row_id,
+            'name': name,
+            'text': lexer.record_text(content, record).strip('"'),
+            'trans': ''
+        })
+    return extracted_data
+
+
+def write_csv_rows(path, rows, fieldnames=CSV_FIELDNAMES):
+    """把行数据写入CSV文件"""
+    with open(path, 'w', encoding='utf-8', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def preprocess_file(filename, source_dir, output_dir, dict_dir, stages, encoding_entry=None, previous_dir=None):
+    """预处理单个txt文件，csv_orig与csv_dict各写一次
+
+    previous_dir不为None时从中读取同名的上一版CSV，沿用对齐行的已有译文。
+    返回 {'filename', 'messages': 日志消息列表, 'written': 是否生成CSV,
+    'stage_counts': [(阶段名称, 改动行数)], 'encoding_entry': 编码缓存记录,
+    'carried': (沿用行数, 文本行数)，未找到上一版时为None}，由调用方统一输出日志。
+    """
+    input_path = os.path.join(source_dir, filename)
+    csv_name = filename.replace(".txt", ".csv")
+    output_path = os.path.join(output_dir, csv_name)
+    dict_output_path = os.path.join(dict_dir, csv_name)
+    result = {'filename': filename, 'messages': [], 'written': False, 'stage_counts': [],
+              'encoding_entry': None, 'carried': None}
+    messages = result['messages']
+
+    file_content, encoding, result['encoding_entry'] = read_script(input_path, encoding_entry)
+    if file_content is None:
+        messages.append(f"无法识别文件编码格式，跳过文件: {filename}")
+        return result
+    messages.append(f"成功使用 {encoding} 编码读取文件: {filename}")
+
+    # 同一内容的解析结果按摘要缓存，重复预处理时跳过词法解析
+    records, _ = parse_cache.lex_cached(file_content, source_dir, result['encoding_entry'].get('hash'))
+    extracted_data = extract_rows(file_content, records)
+    # 仅当存在有效数据时才生成CSV文件
+    if not extracted_data:
+        messages.append(f"跳过文件 {filename}，未找到可翻译内容")
+        return result
+
+    # 添加info行到列表末尾
+    extracted_data.append({
+        'id': 'info',
+        'name': filename,
+        'text': '',
+        'trans': ''
+    })
+    if previous_dir is not None:
+        previous_rows = carryover.load_previous_rows(csv_name, previous_dir)
+        if previous_rows is not None:
+            extracted_data, carried = carryover.carry_over_rows(extracted_data, previous_rows)
+            row_count = len(extracted_data) - 1
+            result['carried'] = (carried, row_count)
+            messages.append(f"沿用上一版翻译 {csv_name}: {carried}/{row_count} 行，{row_count - carried} 行待翻译")
+    write_csv_rows(output_path, extracted_data)
+    messages.append(f"已生成预处理文件: {output_path}")
+
+    dict_rows, stage_counts = apply_text_stages(extracted_data, stages)
+    write_csv_rows(dict_output_path, dict_rows)
+    messages.append(f"已生成词典替换文件: {dict_output_path}")
+    if not stages:
+        messages.append(f"保留HTML标签: {dict_output_path}")
+    for label, changed in stage_counts:
+        if changed:
+            messages.append(f"处理文件 {csv_name} ({label}): 处理了 {changed} 行")
+
+    result['written'] = True
+    result['stage_counts'] = stage_counts
+    return result
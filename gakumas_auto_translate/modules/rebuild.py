@@ -0,0 +1,131 @@
+"""
+全量重建模块，用原始脚本和csv_data中的译文重新生成data目录
+"""
+
+import os
+import time
+import shutil
+import filecmp
+from . import merger
+from . import merge_manifest
+from . import parse_cache
+from . import encoding as encoding_cache
+from . import staging
+from .workspace import Workspace
+
+# 变化文件列表最多打印的条数
+MAX_LISTED_CHANGES = 20
+
+
+def staging_dir_for(data_dir):
+    """重建结果的暂存目录，与data目录放在同一父目录下以便原子替换"""
+    return os.path.normpath(data_dir) + ".rebuild"
+
+
+def build_staging(raw_dir=None, csv_dir=None, data_dir=None, mode=None, workers=0, files=None, workspace=None):
+    """把所有 (原始脚本, csv_data译文) 重新合并到暂存目录，返回 (暂存目录, 差异统计)，失败时返回 (None, None)
+
+    未给出的raw_dir、csv_dir、data_dir和mode取自workspace（默认为当前目录的工作区），
+    即dump_txt路径、csv_data、data目录和翻译模式（双输出模式按中日双语重建）。
+    合并按文件流式分发到进程池（workers<=0表示使用全部CPU核心），在途结果数量有上限。
+    没有对应译文或原始脚本、或合并出错的文件沿用data目录中的现有版本，替换后不会丢失。
+    files给出时只重建其中的CSV文件名（如字典修改影响到的文件），其余文件全部沿用。
+    """
+    workspace = workspace or Workspace.default()
+    raw_dir = raw_dir or workspace.dump_txt_path
+    csv_dir = csv_dir or workspace.csv_data_dir
+    data_dir = data_dir or workspace.data_dir
+    if not raw_dir or not os.path.isdir(raw_dir):
+        print("错误：未找到原始脚本目录，请先使用功能9配置dump_txt路径")
+        return None, None
+    if not os.path.isdir(csv_dir):
+        print(f"错误：译文目录不存在: {csv_dir}")
+        return None, None
+    mode = mode or workspace.mode
+    merge_file, label = merger.MODE_MERGERS.get(mode, merger.MODE_MERGERS["bilingual"])
+
+    staging_dir = staging_dir_for(data_dir)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    print(f"正在以{label}模式重建: {os.path.abspath(raw_dir)} + {os.path.abspath(csv_dir)} → {os.path.abspath(staging_dir)}")
+    start = time.perf_counter()
+    # 重建时直接用csv_data的text定位原文，不读取todo中当前批次的原文CSV；
+    # 原始脚本目录只读，编码和解析缓存写入工作区的缓存目录
+    cache_dir = os.path.join(workspace.cache_dir, "rebuild")
+    merger.run_merge(merge_file, [(label, staging_dir, workspace.error_report("rebuild"))],
+                     csv_dir=csv_dir, untranslated_txt_dir=raw_dir, dict_file=workspace.dict_file,
+                     workers=workers, force=True, raw_csv_dir=None, files=files, cache_dir=cache_dir)
+    elapsed = time.perf_counter() - start
+    parse_cache.prune(cache_dir, [entry.get('hash') for entry in encoding_cache.load_cache(cache_dir).values()])
+    # 清单只对todo中的增量合并有意义，不随重建结果进入data目录
+    manifest_path = os.path.join(staging_dir, merge_manifest.MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    rebuilt = sorted(f for f in os.listdir(staging_dir) if f.endswith(".txt"))
+    total_bytes = sum(os.path.getsize(os.path.join(staging_dir, f)) for f in rebuilt)
+    print(f"\n重建了 {len(rebuilt)} 个文件，用时 {elapsed:.1f} 秒"
+          f"（{len(rebuilt) / max(elapsed, 1e-9):.1f} 个/秒，{total_bytes / 1048576 / max(elapsed, 1e-9):.1f} MB/秒）")
+
+    summary = diff_summary(staging_dir, data_dir, rebuilt)
+    print_summary(summary)
+    return staging_dir, summary
+
+
+def diff_summary(staging_dir, data_dir, rebuilt):
+    """对比重建结果与data目录，并把未重建的文件沿用到暂存目录，返回各类文件名列表"""
+    summary = {'added': [], 'changed': [], 'unchanged': [], 'kept': []}
+    rebuilt_set = set(rebuilt)
+    for filename in rebuilt:
+        current = os.path.join(data_dir, filename)
+        if not os.path.exists(current):
+            summary['added'].append(filename)
+        elif filecmp.cmp(current, os.path.join(staging_dir, filename), shallow=False):
+            summary['unchanged'].append(filename)
+        else:
+            summary['changed'].append(filename)
+    if os.path.isdir(data_dir):
+        for filename in sorted(os.listdir(data_dir)):
+            src = os.path.join(data_dir, filename)
+            if filename in rebuilt_set or not os.path.isfile(src):
+                continue
+            dst = os.path.join(staging_dir, filename)
+            # 同一文件系统上用硬链接，不复制文件内容
+            staging.link_file(src, dst)
+            summary['kept'].append(filename)
+    return summary
+
+
+def print_summary(summary):
+    """输出重建结果与data目录的差异统计"""
+    print("\n与当前data目录的差异:")
+    print(f"- 新增: {len(summary['added'])} 个文件")
+    print(f"- 内容变化: {len(summary['changed'])} 个文件")
+    print(f"- 内容相同: {len(summary['unchanged'])} 个文件")
+    print(f"- 未重建沿用原文件: {len(summary['kept'])} 个文件")
+    for filename in (summary['added'] + summary['changed'])[:MAX_LISTED_CHANGES]:
+        print(f"  {'新增' if filename in summary['added'] else '变化'}: {filename}")
+    remaining = len(summary['added']) + len(summary['changed']) - MAX_LISTED_CHANGES
+    if remaining > 0:
+        print(f"  ……另有 {remaining} 个文件")
+
+
+def swap_in(staging_dir, data_dir):
+    """用暂存目录替换data目录：两次目录重命名完成替换，失败时恢复原目录"""
+    staging.swap_dir(staging_dir, data_dir)
+    print(f"已用重建结果替换: {os.path.abspath(data_dir)}")
+    return True
+
+
+def rebuild_data(raw_dir=None, csv_dir=None, data_dir=None, mode=None, workers=0, swap=True, files=None,
+                 workspace=None):
+    """重建data目录（files给出时只重建这些文件）；swap=False时只生成暂存目录和差异统计，不替换"""
+    workspace = workspace or Workspace.default()
+    staging_dir, summary = build_staging(raw_dir, csv_dir, data_dir, mode, workers, files, workspace)
+    if staging_dir is None:
+        return False
+    data_dir = data_dir or workspace.data_dir
+    if swap:
+        swap_in(staging_dir, data_dir)
+    else:
+        print(f"重建结果保留在: {os.path.abspath(staging_dir)}")
+    return True
@@ -0,0 +1,204 @@
+"""
+本地渲染服务模块，用合并模块的同一套逻辑按需生成纯中文/中日双语txt
+"""
+
+import io
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from . import merger
+from . import encoding as encoding_cache
+
+# 缓存的原始脚本解析结果和渲染结果的默认条数
+RAW_CACHE_SIZE = 256
+OUTPUT_CACHE_SIZE = 1024
+
+MODES = ("bilingual", "chinese")
+
+
+class RenderError(ValueError):
+    """请求参数无效（脚本名、CSV路径、模式等），HTTP接口返回400"""
+
+
+class LRUCache:
+    """线程安全的最近最少使用缓存，记录命中与未命中次数"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+
+class Renderer:
+    """按 (脚本名, CSV内容, 模式) 生成合并结果
+
+    原始脚本按文件大小和修改时间校验后复用缓存的内容和解析区间；
+    渲染结果按 (脚本内容摘要, CSV内容摘要, 模式) 缓存，同一份CSV重复请求直接返回。
+    """
+
+    def __init__(self, raw_dir, csv_dir, name_dict,
+                 raw_cache_size=RAW_CACHE_SIZE, output_cache_size=OUTPUT_CACHE_SIZE):
+        self.raw_dir = raw_dir
+        self.csv_dir = csv_dir
+        self.name_index = merger.build_name_index(name_dict)
+        self.raw_cache = LRUCache(raw_cache_size)
+        self.output_cache = LRUCache(output_cache_size)
+
+    def _script_path(self, script):
+        """脚本名只允许raw_dir下的文件名，可省略.txt后缀"""
+        name = os.path.basename(script or '')
+        if not name or name != script:
+            raise RenderError(f"无效的脚本名: {script}")
+        if not name.endswith(".txt"):
+            name += ".txt"
+        return name, os.path.join(self.raw_dir, name)
+
+    def _raw_script(self, name, path):
+        """返回 (脚本内容, 内容摘要, 解析区间)，文件未改动时直接使用缓存"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            raise RenderError(f"未找到原始脚本: {name}")
+        cached = self.raw_cache.get(name)
+        if cached and cached[0] == (stat.st_size, stat.st_mtime_ns):
+            return cached[1]
+        encodings = {}
+        content, _ = encoding_cache.read_text(path, encodings)
+        if content is None:
+            raise RenderError(f"无法识别原始脚本编码: {name}")
+        entry = (content, encodings[name]['hash'], merger._script_slots(content))
+        self.raw_cache.put(name, ((stat.st_size, stat.st_mtime_ns), entry))
+        return entry
+
+    def read_csv(self, csv_path):
+        """读取csv_dir下的CSV文件内容，路径不允许离开csv_dir"""
+        root = os.path.realpath(self.csv_dir)
+        path = os.path.realpath(os.path.join(root, csv_path))
+        if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+            raise RenderError(f"无效的CSV路径: {csv_path}")
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def render(self, script, csv_text=None, mode="chinese", csv_path=None):
+        """生成一个脚本的合并结果，返回 {'output', 'errors', 'messages', 'coverage', 'cached'}
+
+        csv_text为翻译CSV内容；未给出时读取csv_dir下的csv_path。output为None表示存在错误，详见errors。
+        """
+        # 参数来自JSON请求，类型不对时同样按无效请求处理
+        for field, value, optional in (('script', script, False), ('csv', csv_text, True),
+                                       ('mode', mode, False), ('csv_path', csv_path, True)):
+            if not isinstance(value, str) and not (optional and value is None):
+                raise RenderError(f"{field}必须是字符串")
+        if mode not in MODES:
+            raise RenderError(f"无效的模式: {mode}")
+        name, path = self._script_path(script)
+        if csv_text is None:
+            if not csv_path:
+                raise RenderError("缺少CSV内容或路径")
+            csv_text = self.read_csv(csv_path)
+        content, raw_hash, slots = self._raw_script(name, path)
+        csv_hash = hashlib.blake2b(csv_text.encode('utf-8'), digest_size=16).hexdigest()
+        key = (raw_hash, csv_hash, mode)
+        cached = self.output_cache.get(key)
+        if cached is not None:
+            return dict(cached, cached=True)
+
+        rows = merger.read_csv_rows(io.StringIO(csv_text))
+        result = merger.render_rows(name.replace(".txt", ".csv"), rows, content, mode, self.name_index, slots)
+        response = {
+            'output': result['output'],
+            'errors': result['error_rows'],
+            'messages': result['messages'],
+            'coverage': result['coverage'],
+        }
+        self.output_cache.put(key, response)
+        return dict(response, cached=False)
+
+    def stats(self):
+        return {'raw_cache': self.raw_cache.stats(), 'output_cache': self.output_cache.stats()}
+
+
+class _RenderHandler(BaseHTTPRequestHandler):
+    """HTTP接口：
+    POST /render        {"script", "csv" 或 "csv_path", "mode"} → 渲染结果
+    POST /render_batch  {"items": [上述请求, ...]} → {"results": [...]}，单项出错不影响其他项
+    GET  /stats         缓存统计
+    """
+
+    renderer = None
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _render_item(self, item):
+        if not isinstance(item, dict):
+            raise RenderError("请求必须是JSON对象")
+        return self.renderer.render(item.get('script'), item.get('csv'), item.get('mode', 'chinese'),
+                                    item.get('csv_path'))
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send_json(200, self.renderer.stats())
+        else:
+            self._send_json(404, {'error': f"未知路径: {self.path}"})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            request = json.loads(self.rfile.read(length).decode('utf-8'))
+            if self.path == '/render':
+                self._send_json(200, self._render_item(request))
+            elif self.path == '/render_batch':
+                items = request.get('items', [])
+                if not isinstance(items, list):
+                    raise RenderError("items必须是数组")
+                results = []
+                for item in items:
+                    try:
+                        results.append(self._render_item(item))
+                    except RenderError as e:
+                        results.append({'error': str(e)})
+                self._send_json(200, {'results': results})
+            else:
+                self._send_json(404, {'error': f"未知路径: {self.path}"})
+        except (RenderError, ValueError, AttributeError) as e:
+            self._send_json(400, {'error': str(e)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(renderer, host="127.0.0.1", port=8765):
+    """创建渲染服务（默认只监听本机），port为0时由系统分配端口"""
+    handler = type('RenderHandler', (_RenderHandler,), {'renderer': renderer})
+    return ThreadingHTTPServer((host, port), handler)
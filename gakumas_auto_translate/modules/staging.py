@@ -0,0 +1,169 @@
+"""
+暂存模块，在工作目录之间放置文件时用硬链接、写时复制克隆或重命名代替复制，并提供目录的整体替换
+
+硬链接与源文件共用同一份数据，因此被放置的文件只读：流程中需要改写的文件一律用replace_file
+写入临时文件再替换，只会断开链接，不会改动源文件。
+"""
+
+import os
+import sys
+import shutil
+import contextlib
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Linux的FICLONE ioctl（btrfs、xfs等支持写时复制的文件系统）
+FICLONE = 0x40049409
+
+# 放置文件的方式，按优先顺序
+LINK = "硬链接"
+CLONE = "克隆"
+COPY = "复制"
+MOVE = "移动"
+
+
+def _clone(src, dst):
+    """写时复制克隆文件，文件系统不支持时抛出OSError"""
+    if fcntl is None or not sys.platform.startswith("linux"):
+        raise OSError("当前平台不支持克隆文件")
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.unlink(dst)
+        raise
+    shutil.copystat(src, dst)
+
+
+def link_file(src, dst):
+    """把src放置到dst（已存在时原子替换），返回使用的方式
+
+    依次尝试硬链接、克隆、复制；跨文件系统或不支持的文件系统自动退回到下一种方式。
+    """
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return LINK
+    tmp = dst + ".staging"
+    with contextlib.suppress(OSError):
+        os.unlink(tmp)
+    try:
+        os.link(src, tmp)
+        method = LINK
+    except OSError:
+        try:
+            _clone(src, tmp)
+            method = CLONE
+        except OSError:
+            shutil.copy2(src, tmp)
+            method = COPY
+    os.replace(tmp, dst)
+    return method
+
+
+def move_file(src, dst):
+    """把src移动到dst（已存在时替换），同一文件系统上只是重命名，返回使用的方式"""
+    try:
+        os.replace(src, dst)
+        return MOVE
+    except OSError:
+        method = link_file(src, dst)
+        os.unlink(src)
+        return method
+
+
+@contextlib.contextmanager
+def replace_file(path, mode='w', encoding='utf-8', newline=None):
+    """写入临时文件，正常结束后原子替换path；出错时保留原文件"""
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, mode, encoding=encoding, newline=newline) as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+
+def place_files(src_dir, dst_dir, filenames, move=False):
+    """把src_dir中的文件放置到dst_dir，返回 {方式: 文件数}"""
+    os.makedirs(dst_dir, exist_ok=True)
+    counts = {}
+    for filename in filenames:
+        src = os.path.join(src_dir, filename)
+        dst = os.path.join(dst_dir, filename)
+        method = move_file(src, dst) if move else link_file(src, dst)
+        counts[method] = counts.get(method, 0) + 1
+    return counts
+
+
+def format_counts(counts):
+    """把 {方式: 文件数} 格式化为“硬链接 3，复制 1”"""
+    return "，".join(f"{method} {count}" for method, count in counts.items()) or "无"
+
+
+def _old_dir(target_dir):
+    return os.path.normpath(target_dir) + ".old"
+
+
+def _staging_dir(target_dir):
+    return os.path.normpath(target_dir) + ".staging"
+
+
+def recover_dir(target_dir):
+    """恢复上次在两次重命名之间中断的目录替换，并清理遗留的暂存目录，返回是否进行了恢复"""
+    old_dir = _old_dir(target_dir)
+    recovered = False
+    if not os.path.exists(target_dir) and os.path.isdir(old_dir):
+        os.replace(old_dir, target_dir)
+        print(f"已恢复上次中断替换的目录: {os.path.abspath(target_dir)}")
+        recovered = True
+    shutil.rmtree(_staging_dir(target_dir), ignore_errors=True)
+    return recovered
+
+
+def swap_dir(staging_dir, target_dir):
+    """用暂存目录替换目标目录：两次目录重命名完成替换，失败时恢复原目录"""
+    old_dir = _old_dir(target_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    had_target = os.path.exists(target_dir)
+    if had_target:
+        os.replace(target_dir, old_dir)
+    try:
+        os.replace(staging_dir, target_dir)
+    except OSError:
+        if had_target:
+            os.replace(old_dir, target_dir)
+        raise
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def update_dir(target_dir, source_dir, filenames):
+    """把source_dir中的filenames事务性地更新到target_dir，返回 {方式: 文件数}
+
+    先在暂存目录中链接目标目录的现有内容和新文件，全部成功后再整体替换目标目录；
+    中途出错或中断时目标目录保持原样，遗留的暂存目录由recover_dir清理。
+    """
+    recover_dir(target_dir)
+    staging_dir = _staging_dir(target_dir)
+    os.makedirs(staging_dir)
+    try:
+        updated = set(filenames)
+        if os.path.isdir(target_dir):
+            for name in os.listdir(target_dir):
+                if name in updated:
+                    continue
+                src = os.path.join(target_dir, name)
+                if os.path.isdir(src):
+                    shutil.copytree(src, os.path.join(staging_dir, name), copy_function=link_file)
+                else:
+                    link_file(src, os.path.join(staging_dir, name))
+        counts = place_files(source_dir, staging_dir, filenames)
+        swap_dir(staging_dir, target_dir)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    return counts
@@ -0,0 +1,189 @@
+"""
+词条反向索引模块，记录每个文件的说话人和文本中出现的字典词条，字典修改后找出受影响的文件
+"""
+
+import os
+import re
+import csv
+import json
+from . import lexer
+from . import encoding as encoding_cache
+from .dictionary import _trie_pattern
+from .merger import build_name_index
+
+# 旁路索引文件名，默认与被索引的csv/txt文件放在同一目录
+INDEX_FILE = ".term_index.json"
+
+# 索引格式或说话人、词条的提取规则变化时递增，旧索引自动失效
+INDEX_VERSION = 1
+
+
+def load_cache(directory):
+    """加载目录下的词条索引，格式不符时返回空索引"""
+    path = os.path.join(directory, INDEX_FILE)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == INDEX_VERSION:
+                return data
+        except Exception as e:
+            print(f"读取词条索引时出错，将重新建立: {e}")
+    return {'version': INDEX_VERSION, 'dictionary': None, 'terms': [], 'files': {}}
+
+
+def save_cache(directory, data):
+    """保存目录下的词条索引"""
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, INDEX_FILE), 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+        return True
+    except Exception as e:
+        print(f"保存词条索引时出错: {e}")
+        return False
+
+
+class TermScanner:
+    """一次扫描找出文本中出现的所有词条
+
+    零宽前瞻的前缀树正则在每个位置找出最长词条，再补上是它前缀的短词条，
+    因此同一位置开始的长短词条、被长词条包含的词条都会被记录。
+    """
+
+    def __init__(self, terms):
+        self.terms = sorted(set(term for term in terms if term))
+        self._scan = re.compile('(?=(' + _trie_pattern(self.terms) + '))') if self.terms else None
+        term_set = set(self.terms)
+        self._prefixes = {term: [term[:i] for i in range(1, len(term) + 1) if term[:i] in term_set]
+                          for term in self.terms}
+
+    def find(self, text):
+        if self._scan is None or not text:
+            return set()
+        found = set()
+        for longest in set(match.group(1) for match in self._scan.finditer(text)):
+            found.update(self._prefixes[longest])
+        return found
+
+
+def read_file_terms(path, scanner):
+    """返回文件的 (说话人列表, 文本中出现的词条列表)
+
+    csv文件的说话人取原文和译文都非空的行的name列（与合并时翻译name属性的范围一致）；
+    txt原始脚本的说话人取所有name属性值，词条在整个脚本内容中查找。
+    """
+    if path.endswith('.csv'):
+        speakers = set()
+        texts = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if row.get('text') and row.get('trans'):
+                    texts.append(row['text'])
+                    if row.get('name'):
+                        speakers.add(row['name'])
+        text = '\n'.join(texts)
+    else:
+        text, _ = encoding_cache.read_text(path)
+        if text is None:
+            return None
+        speakers = set(text[start:end] for start, end in lexer.name_spans(text))
+    return sorted(speakers), sorted(scanner.find(text))
+
+
+def changed_terms(old_dict, new_dict):
+    """两版字典中译名不同（含新增、删除）的词条"""
+    return {term for term in set(old_dict) | set(new_dict) if old_dict.get(term) != new_dict.get(term)}
+
+
+def text_impact_terms(old_dict, new_dict):
+    """文本替换结果可能变化的词条：译名变化的词条，以及包含它们或替换值含有它们的词条（逐项替换会连锁）"""
+    changed = changed_terms(old_dict, new_dict)
+    impacted = set(changed)
+    for term in set(old_dict) | set(new_dict):
+        values = (old_dict.get(term) or '', new_dict.get(term) or '')
+        if any(other in term or any(other in value for value in values) for other in changed if other):
+            impacted.add(term)
+    return impacted
+
+
+class TermIndex:
+    """目录中各文件的说话人和词条，以及说话人/词条 → 文件的反向索引"""
+
+    def __init__(self, directory, data, cache_dir=None):
+        self.directory = directory
+        self.data = data
+        self.cache_dir = cache_dir or directory
+
+    @classmethod
+    def load(cls, directory, name_dict, cache_dir=None):
+        """加载并增量更新目录的词条索引
+
+        大小和修改时间未变的文件直接复用，只重新扫描新增或修改过的文件；
+        字典中出现了索引未扫描过的词条时，所有文件的文本重新扫描一次（说话人记录不受影响）。
+        索引文件保存在cache_dir，默认为被索引的目录；只读的目录（如dump_txt）需另外指定。
+        """
+        cache_dir = cache_dir or directory
+        data = load_cache(cache_dir)
+        terms = set(data['terms'])
+        full_rescan = not set(name_dict) <= terms
+        if full_rescan:
+            terms |= set(name_dict)
+        scanner = TermScanner(terms)
+        files = {}
+        updated = 0
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(('.csv', '.txt')):
+                continue
+            path = os.path.join(directory, filename)
+            stat = os.stat(path)
+            entry = data['files'].get(filename)
+            if full_rescan or not entry or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+                scanned = read_file_terms(path, scanner)
+                if scanned is None:
+                    continue
+                entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                         'speakers': scanned[0], 'terms': scanned[1]}
+                updated += 1
+            files[filename] = entry
+        data['terms'] = sorted(terms)
+        if updated or full_rescan or len(files) != len(data['files']):
+            data['files'] = files
+            save_cache(cache_dir, data)
+        print(f"词条索引 {directory}: {len(files)} 个文件（重新扫描 {updated} 个）")
+        return cls(directory, data, cache_dir)
+
+    @property
+    def snapshot(self):
+        """上次确认时的字典，尚未确认过时为None"""
+        return self.data['dictionary']
+
+    def accept(self, name_dict):
+        """记录当前字典为已确认版本，之后的修改与它比较"""
+        self.data['dictionary'] = dict(name_dict)
+        save_cache(self.cache_dir, self.data)
+
+    def _reverse(self, field):
+        index = {}
+        for filename, entry in self.data['files'].items():
+            for value in entry[field]:
+                index.setdefault(value, set()).add(filename)
+        return index
+
+    def affected(self, old_dict, new_dict):
+        """返回 (name属性译名变化的文件, 文本中含有受影响词条的文件)，均按文件名排序
+
+        前者的合并结果会变化，需要重新生成；后者预处理时的人名替换结果会变化，重新翻译时需要注意。
+        """
+        old_index = build_name_index(old_dict)
+        new_index = build_name_index(new_dict)
+        by_speaker = self._reverse('speakers')
+        name_files = set()
+        for speaker in set(old_index) | set(new_index):
+            if old_index.get(speaker) != new_index.get(speaker):
+                name_files |= by_speaker.get(speaker, set())
+        by_term = self._reverse('terms')
+        text_files = set()
+        for term in text_impact_terms(old_dict, new_dict):
+            text_files |= by_term.get(term, set())
+        return sorted(name_files), sorted(text_files)
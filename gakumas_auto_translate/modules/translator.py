@@ -4,10 +4,14 @@
 
 import os
 import shutil
+from . import carryover
+from . import memory
+from .workspace import Workspace
 
-def translate_csv_files():
-    """处理CSV文件翻译流程"""
-    gakumas_dir = "./GakumasPreTranslation"
+def translate_csv_files(workspace=None):
+    """处理CSV文件翻译流程（workspace默认为当前目录的工作区）"""
+    workspace = workspace or Workspace.default()
+    gakumas_dir = workspace.gakumas_dir
     
     # 检查Gakumas项目目录是否存在
     if not os.path.exists(gakumas_dir):
@@ -32,8 +36,8 @@ def translate_csv_files():
 
     # 检查临时目录状态
     tmp_dirs = [
-        os.path.join(gakumas_dir, "tmp", "untranslated"),
-        os.path.join(gakumas_dir, "tmp", "translated")
+        workspace.gakumas_untranslated_dir,
+        workspace.gakumas_translated_dir
     ]
     
     # 检查目录是否为空
@@ -50,7 +54,7 @@ def translate_csv_files():
         return False
 
     # 准备复制CSV文件
-    source_dir = "./todo/untranslated/csv_dict"  # 修改为csv_dict
+    source_dir = workspace.csv_dict_dir  # 修改为csv_dict
     target_dir = tmp_dirs[0]  # untranslated目录
     
     # 创建目标目录（如果不存在）
@@ -63,13 +67,23 @@ def translate_csv_files():
         print("请先执行选项2生成预处理文件")
         return False
 
-    # 执行文件复制
+    # 用csv_data中的已有译文预填完全相同的原文
+    translation_memory = memory.TranslationMemory.load(workspace.csv_data_dir)
+    memory.prefill_batch(translation_memory, workspace.csv_orig_dir, source_dir)
+    # 未命中的行生成相近原文的参考译文，供人工翻译和校对时对照
+    fuzzy_index = memory.FuzzyIndex.from_memory(translation_memory)
+    memory.write_suggestions(fuzzy_index, workspace.csv_orig_dir, workspace.csv_suggest_dir)
+
+    # 执行文件复制；已有译文（沿用上一版或翻译记忆命中）的行不再送去翻译，合并时按顺序填回
     print("正在复制翻译文件...")
     for filename in csv_files:
         src = os.path.join(source_dir, filename)
         dst = os.path.join(target_dir, filename)
-        shutil.copy2(src, dst)
-        print(f"已复制: {filename}")
+        total, pending = carryover.write_pending_csv(src, dst)
+        if pending == total:
+            print(f"已复制: {filename}")
+        else:
+            print(f"已复制: {filename}（已有翻译 {total - pending} 行，仅复制待翻译的 {pending} 行）")
 
     # 输出后续指引
     print("\n请手动执行以下操作：")
@@ -5,7 +5,7 @@
 import os
 import re
 import json
-import pandas as pd
+from functools import lru_cache
 
 def create_sample_dictionary(dict_file):
     """创建一个示例字典文件"""
@@ -22,8 +22,12 @@ def create_sample_dictionary(dict_file):
     with open(dict_file, 'w', encoding='utf-8') as f:
         json.dump(sample_dict, f, ensure_ascii=False, indent=4)
 
-def clean_html_tags(text):
-    """清理文本中的HTML样式标签，只保留标签内的内容"""
+# 标签记号：开标签 <name> / <name\=属性>、闭标签 </name>，以及 <r\=...> 可用的简写闭合 /r>
+_TAG_TOKEN_RE = re.compile(r'<(/?)([A-Za-z][A-Za-z0-9_:-]*)(\\=[^>]*)?>|/r>')
+
+
+def legacy_clean_html_tags(text):
+    """原clean_html_tags的四遍re.sub实现，作为单遍实现的对照和复杂情况的回退"""
     if text is None:
         return text
     # 匹配 <r\=...>内容</r> 只取内容
@@ -35,15 +39,65 @@ def clean_html_tags(text):
     text = re.sub(r'<([A-Za-z][A-Za-z0-9_:-]*)(?:\\=[^>]*)?>([\s\S]*?)</\1>', r'\2', text)
     return text
 
-def remove_r_tags_inplace(csv_path):
-    """移除文本中的r标签并保存回原文件"""
-    df = pd.read_csv(csv_path, dtype=str)
-    def clean_text(text):
-        if pd.isnull(text):
-            return text
-        return clean_html_tags(text)
-    df['text'] = df['text'].apply(clean_text)
-    df.to_csv(csv_path, index=False, encoding='utf-8')
+
+def _strip_flat_tags(text):
+    """一次扫描去除互不嵌套、逐对闭合的标签，结构不满足时返回None"""
+    pieces = []
+    pos = 0
+    open_name = None
+    open_attr = None
+    for match in _TAG_TOKEN_RE.finditer(text):
+        slash, name, attr = match.groups()
+        if name is None:
+            # /r> 只能闭合带非空属性的 <r\=...>
+            if open_name != 'r' or not open_attr or len(open_attr) <= 2:
+                return None
+            open_name = None
+        elif slash:
+            if attr or name != open_name:
+                return None
+            open_name = None
+        else:
+            if open_name is not None:
+                return None
+            open_name, open_attr = name, attr
+        pieces.append(text[pos:match.start()])
+        pos = match.end()
+    if open_name is not None:
+        return None
+    pieces.append(text[pos:])
+    result = ''.join(pieces)
+    # 去除标签后拼接出新的标签时，原实现的后续几遍还会继续处理，交给回退路径
+    if _TAG_TOKEN_RE.search(result):
+        return None
+    return result
+
+
+@lru_cache(maxsize=32768)
+def _clean_html_tags_cached(text):
+    result = _strip_flat_tags(text)
+    if result is None:
+        return legacy_clean_html_tags(text)
+    return result
+
+
+def clean_html_tags(text):
+    """清理文本中的HTML样式标签，只保留标签内的内容
+
+    常见的逐对标签一次扫描去除，嵌套或不成对等复杂情况回退到原四遍实现，结果与原实现一致；
+    不含标签的文本直接返回，含标签的文本（大量重复）由有界LRU缓存直接返回。
+    """
+    if text is None or '<' not in text:
+        return text
+    return _clean_html_tags_cached(text)
+
+
+def tag_signature(text):
+    """按出现顺序返回文本中的全部标签记号，用于比较原文与译文的标签是否一致"""
+    if not text or '<' not in text:
+        return []
+    return [match.group(0) for match in _TAG_TOKEN_RE.finditer(text)]
+
 
 def ensure_dir_exists(dir_path):
     """确保目录存在，如不存在则创建"""
@@ -76,33 +130,6 @@ def process_unit_text(text):
         return new_text
     return text
 
-def process_unit_file(file_path):
-    """处理单个adv_unit_开头的文件"""
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        new_lines = [process_unit_text(line) for line in lines]
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.writelines(new_lines)
-        print(f'已处理文件: {file_path}')
-        return True
-    except Exception as e:
-        print(f'处理文件失败 {file_path}: {str(e)}')
-        return False
-
-def process_unit_files_in_folder(folder_path):
-    """处理文件夹中所有adv_unit_开头的txt文件"""
-    processed_count = 0
-    for file in os.listdir(folder_path):
-        if file.startswith('adv_unit_') and file.endswith('.txt'):
-            file_path = os.path.join(folder_path, file)
-            if os.path.isfile(file_path):
-                if process_unit_file(file_path):
-                    processed_count += 1
-    
-    if processed_count > 0:
-        print(f"已处理 {processed_count} 个 adv_unit_ 文件")
-    else:
-        print("未找到需要处理的 adv_unit_ 文件")
-    
-    return processed_count
+def process_unit_content(content):
+    """对整个adv_unit_脚本内容逐行应用process_unit_text"""
+    return '\n'.join(process_unit_text(line) for line in content.split('\n'))
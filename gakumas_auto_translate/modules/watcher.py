@@ -0,0 +1,304 @@
+"""
+监视模块，持续监视dump_txt目录，新转储的脚本写入完成后立即逐个检查并预处理
+"""
+
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+from . import checker
+from . import preprocessor
+from .dictionary import load_name_dictionary, NameReplacer
+
+# 文件最后一次写入后需要保持不变的秒数，之后才认为转储完成
+SETTLE_SECONDS = 2.0
+
+# 轮询模式下的检查间隔；目录修改时间不变时每FULL_SCAN_INTERVAL秒才完整扫描一次（发现原地改写的文件）
+POLL_INTERVAL = 1.0
+FULL_SCAN_INTERVAL = 10.0
+
+# 没有待处理文件时单次等待的最长秒数（inotify模式下等待期间不占用CPU）
+IDLE_TIMEOUT = 60.0
+
+# inotify事件掩码
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class InotifySource:
+    """Linux inotify事件源，目录没有变化时阻塞等待"""
+
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, directory):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify仅在Linux上可用")
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1失败")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"无法监视目录: {directory}")
+
+    def wait(self, timeout):
+        """最多等待timeout秒，返回有变化的文件名集合；事件队列溢出时返回None，需要完整扫描"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        names = set()
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            if mask & IN_Q_OVERFLOW:
+                return None
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if name:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingSource:
+    """轮询事件源，比较两次扫描的文件大小和修改时间
+
+    目录修改时间未变时跳过扫描（新增、删除、重命名都会改变目录修改时间），
+    每full_scan_interval秒仍完整扫描一次，发现原地改写的文件。
+    """
+
+    def __init__(self, directory, interval=POLL_INTERVAL, full_scan_interval=FULL_SCAN_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.full_scan_interval = full_scan_interval
+        self.dir_mtime = os.stat(directory).st_mtime_ns
+        self.snapshot = self._scan()
+        self.last_full_scan = time.monotonic()
+
+    def _scan(self):
+        snapshot = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".txt") and entry.is_file():
+                    stat = entry.stat()
+                    snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        dir_mtime = os.stat(self.directory).st_mtime_ns
+        now = time.monotonic()
+        if dir_mtime == self.dir_mtime and now - self.last_full_scan < self.full_scan_interval:
+            return set()
+        self.dir_mtime = dir_mtime
+        self.last_full_scan = now
+        snapshot = self._scan()
+        changed = {name for name in set(snapshot) | set(self.snapshot) if snapshot.get(name) != self.snapshot.get(name)}
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+def open_source(directory, poll=False, interval=POLL_INTERVAL):
+    """优先使用inotify，不可用或poll=True时退回到轮询"""
+    if not poll:
+        try:
+            return InotifySource(directory)
+        except OSError as e:
+            print(f"inotify不可用，改为轮询: {e}")
+    return PollingSource(directory, interval)
+
+
+class DumpWatcher:
+    """监视dump_txt目录，逐个文件执行 检查 → 放入待翻译目录 → 预处理（标签去除、字典替换）
+
+    文件修改时间距今超过settle秒后才处理，转储过程中的文件不会被读到一半。
+    检查规则与checker.check_new_files一致：data中没有的文件为新增，内容摘要与清单不同的为修订。
+    监视的目录、待翻译目录和人名字典都取自workspace。
+    """
+
+    def __init__(self, workspace, source=None, settle=SETTLE_SECONDS, carry_over=True, verbose=False):
+        self.workspace = workspace
+        self.dump_txt_path = workspace.dump_txt_path
+        self.source = source or open_source(self.dump_txt_path)
+        self.settle = settle
+        self.previous_dir = workspace.csv_data_dir if carry_over else None
+        self.verbose = verbose
+        self.manifest = checker.load_manifest(workspace.dump_manifest_file)
+        self.pending = set()
+        self.latencies = []
+        self._stages = None
+        self._dict_mtime = None
+
+    def _text_stages(self):
+        """预处理的文本处理链，人名字典文件修改后重新构建"""
+        try:
+            mtime = os.stat(self.workspace.dict_file).st_mtime_ns
+        except OSError:
+            mtime = None
+        if self._stages is None or mtime != self._dict_mtime:
+            name_dict = load_name_dictionary(self.workspace.dict_file)
+            replacer = NameReplacer(name_dict) if name_dict is not None else None
+            self._stages = preprocessor.build_text_stages(False, replacer)
+            self._dict_mtime = mtime
+        return self._stages
+
+    def _queued(self, filename):
+        """文件已放入待翻译目录且已生成CSV"""
+        csv_name = filename.replace(".txt", ".csv")
+        return (os.path.exists(os.path.join(self.workspace.todo_txt_dir, filename))
+                and os.path.exists(os.path.join(self.workspace.csv_dict_dir, csv_name)))
+
+    def _classify(self, filename, stat):
+        """返回 (清单记录, 需要处理的原因)，原因为"新增"、"修订"或None
+
+        待翻译目录中的文件与dump_txt硬链接，不能用文件状态判断是否已处理；
+        清单中已有记录且内容摘要未变化、CSV也已生成时，说明这一版本已经处理过。
+        """
+        path = os.path.join(self.dump_txt_path, filename)
+        previous = self.manifest.get(filename)
+        record, changed = checker.scan_entry(path, stat, previous)
+        if not os.path.exists(os.path.join(self.workspace.data_dir, filename)):
+            reason = "新增"
+        elif changed:
+            reason = "修订"
+        else:
+            reason = None
+        if reason and previous is not None and not changed and self._queued(filename):
+            reason = None
+        return record, reason
+
+    def rescan(self):
+        """完整扫描一次dump_txt目录：启动时和inotify事件溢出时使用，把需要处理的文件加入待处理集合"""
+        current = set()
+        with os.scandir(self.dump_txt_path) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".txt") or not entry.is_file():
+                    continue
+                current.add(entry.name)
+                record, reason = self._classify(entry.name, entry.stat())
+                if reason:
+                    self.pending.add(entry.name)
+                else:
+                    self.manifest[entry.name] = record
+        for filename in sorted(set(self.manifest) - current):
+            del self.manifest[filename]
+            print(f"dump_txt中已删除: {filename}")
+        checker.save_manifest(self.manifest, self.workspace.dump_manifest_file)
+
+    def process_file(self, filename):
+        """检查并预处理一个写入完成的文件，返回处理结果（无需处理时为None）"""
+        start = time.perf_counter()
+        path = os.path.join(self.dump_txt_path, filename)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            if self.manifest.pop(filename, None) is not None:
+                print(f"dump_txt中已删除: {filename}")
+            return None
+        record, reason = self._classify(filename, stat)
+        self.manifest[filename] = record
+        if reason is None:
+            return None
+
+        workspace = self.workspace
+        cache, _ = checker.queue_files(workspace, [filename], verbose=False)
+        result = preprocessor.preprocess_file(filename, workspace.todo_txt_dir, workspace.csv_orig_dir,
+                                              workspace.csv_dict_dir, self._text_stages(), cache.get(filename),
+                                              self.previous_dir)
+        elapsed = time.perf_counter() - start
+        # 从文件最后一次写入到CSV生成完成的时间
+        latency = time.time() - stat.st_mtime_ns / 1e9
+        self.latencies.append(latency)
+        if self.verbose:
+            for message in result['messages']:
+                print(f"  {message}")
+        if result['written']:
+            status = "已生成CSV"
+            if result['carried'] is not None:
+                carried, row_count = result['carried']
+                status += f"，沿用 {carried}/{row_count} 行"
+        else:
+            status = "未生成CSV（无可翻译内容或无法识别编码）"
+        print(f"[{time.strftime('%H:%M:%S')}] {filename}（{reason}）{status}；处理 {elapsed * 1000:.0f}ms，写入后 {latency:.1f}s")
+        return result
+
+    def _next_timeout(self):
+        """距离最早一个待处理文件写入完成还需等待的秒数"""
+        if not self.pending:
+            return IDLE_TIMEOUT
+        now = time.time()
+        waits = []
+        for filename in self.pending:
+            try:
+                mtime = os.stat(os.path.join(self.dump_txt_path, filename)).st_mtime_ns / 1e9
+            except OSError:
+                return 0
+            waits.append(mtime + self.settle - now)
+        return max(0.0, min(waits))
+
+    def process_ready(self):
+        """处理待处理集合中修改时间已超过settle秒的文件，返回处理的文件数"""
+        now = time.time()
+        ready = []
+        for filename in sorted(self.pending):
+            try:
+                mtime = os.stat(os.path.join(self.dump_txt_path, filename)).st_mtime_ns / 1e9
+            except OSError:
+                mtime = 0
+            if now - mtime >= self.settle:
+                ready.append(filename)
+        for filename in ready:
+            self.pending.discard(filename)
+            self.process_file(filename)
+        if ready:
+            checker.save_manifest(self.manifest, self.workspace.dump_manifest_file)
+        return len(ready)
+
+    def poll_once(self):
+        """等待一次目录变化（或最早的待处理文件写入完成），然后处理写入完成的文件"""
+        changed = self.source.wait(self._next_timeout())
+        if changed is None:
+            print("事件队列溢出，重新扫描dump_txt目录")
+            self.rescan()
+        else:
+            self.pending.update(name for name in changed if name.endswith(".txt"))
+        return self.process_ready()
+
+    def run(self):
+        """持续监视，直到按Ctrl+C"""
+        print(f"正在监视: {os.path.abspath(self.dump_txt_path)}（{type(self.source).__name__}，写入后等待 {self.settle}s）")
+        self.rescan()
+        if self.pending:
+            print(f"启动时发现 {len(self.pending)} 个待处理文件")
+        try:
+            while True:
+                self.poll_once()
+        except KeyboardInterrupt:
+            print("\n停止监视")
+        finally:
+            checker.save_manifest(self.manifest, self.workspace.dump_manifest_file)
+            self.source.close()
+        if self.latencies:
+            average = sum(self.latencies) / len(self.latencies)
+            print(f"共处理 {len(self.latencies)} 个文件，写入后平均 {average:.1f}s 生成CSV，最长 {max(self.latencies):.1f}s")
+        print("生成的CSV在todo/untranslated目录，可继续执行选项3翻译")
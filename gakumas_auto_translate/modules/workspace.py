@@ -0,0 +1,112 @@
+"""
+工作区模块，集中管理一个翻译批次使用的目录、dump_txt路径、人名字典和翻译模式
+"""
+
+import os
+from . import config
+
+
+class Workspace:
+    """一个翻译批次的工作区
+
+    todo、data、csv_data、GakumasPreTranslation等目录和错误报告都位于root下，各模块的入口函数
+    通过workspace参数取得路径，不依赖当前工作目录；root不同的工作区可以在同一进程的多个线程中同时使用。
+    data_dir、data_chinese_dir、csv_data_dir、dict_file、gakumas_dir可单独指定，供多个批次共用同一份译文库和字典。
+    """
+
+    def __init__(self, root=".", dump_txt_path=None, mode="bilingual", dict_file=None,
+                 data_dir=None, csv_data_dir=None, gakumas_dir=None, data_chinese_dir=None):
+        self.root = root
+        self._dump_txt_path = dump_txt_path
+        self._dump_from_config = False
+        self.mode = mode
+        self.dict_file = dict_file or self.path("name_dictionary.json")
+        self.data_dir = data_dir or self.path("data")
+        # 双输出模式的纯中文结果归档目录
+        self.data_chinese_dir = data_chinese_dir or self.path("data_chinese")
+        self.csv_data_dir = csv_data_dir or self.path("csv_data")
+        self.gakumas_dir = gakumas_dir or self.path("GakumasPreTranslation")
+
+    @classmethod
+    def default(cls):
+        """当前目录下的工作区，dump_txt路径和翻译模式取自config模块（交互菜单使用）
+
+        dump_txt路径在首次使用时才读取配置，不需要它的步骤（如合并）不会加载配置文件。
+        """
+        workspace = cls(".", mode=config.get_translation_mode())
+        workspace._dump_from_config = True
+        return workspace
+
+    @property
+    def dump_txt_path(self):
+        if self._dump_txt_path is None and self._dump_from_config:
+            self._dump_txt_path = config.get_dump_txt_path()
+        return self._dump_txt_path
+
+    @dump_txt_path.setter
+    def dump_txt_path(self, path):
+        self._dump_txt_path = path
+
+    def __repr__(self):
+        return f"Workspace(root={self.root!r}, mode={self.mode!r})"
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    # 待翻译的原始脚本及预处理生成的CSV
+    @property
+    def todo_txt_dir(self):
+        return self.path("todo", "untranslated", "txt")
+
+    @property
+    def csv_orig_dir(self):
+        return self.path("todo", "untranslated", "csv_orig")
+
+    @property
+    def csv_dict_dir(self):
+        return self.path("todo", "untranslated", "csv_dict")
+
+    @property
+    def csv_suggest_dir(self):
+        return self.path("todo", "untranslated", "csv_suggest")
+
+    # 翻译完成的CSV及合并结果
+    @property
+    def translated_csv_dir(self):
+        return self.path("todo", "translated", "csv")
+
+    @property
+    def translated_txt_dir(self):
+        return self.path("todo", "translated", "txt")
+
+    @property
+    def translated_txt_chinese_dir(self):
+        return self.path("todo", "translated", "txt_chinese")
+
+    @property
+    def todo_dirs(self):
+        """检查新文件时创建的todo目录结构"""
+        return [self.todo_txt_dir, self.csv_orig_dir, self.csv_dict_dir,
+                self.translated_csv_dir, self.translated_txt_dir, self.translated_txt_chinese_dir]
+
+    # 翻译工具的输入输出目录
+    @property
+    def gakumas_untranslated_dir(self):
+        return os.path.join(self.gakumas_dir, "tmp", "untranslated")
+
+    @property
+    def gakumas_translated_dir(self):
+        return os.path.join(self.gakumas_dir, "tmp", "translated")
+
+    @property
+    def cache_dir(self):
+        """只读输入（如dump_txt）的编码、解析和词条索引缓存，不写入输入目录本身"""
+        return self.path(".cache")
+
+    @property
+    def dump_manifest_file(self):
+        return self.path(".dump_manifest.json")
+
+    def error_report(self, label):
+        """合并错误报告文件，label为""（中日双语）或"chinese"等后缀"""
+        return self.path(f"error_report_{label}.csv" if label else "error_report.csv")
@@ -3,7 +3,8 @@
 Gakumas Auto Translate 入口脚本
 """
 
+import sys
 from gakumas_auto_translate.main import main
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -18,7 +18,8 @@ import urllib.request
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
-from gakumas_auto_translate.modules import preprocessor
+from gakumas_auto_translate.modules import carryover, memory, preprocessor
+from gakumas_auto_translate.modules.workspace import Workspace
 
 CAMPUS_REPO = "DreamGallery/Campus-adv-txts"
 CAMPUS_DIR = "Resource"
@@ -104,10 +105,10 @@ def known_files(work_repo, branch):
     return known
 
 
-def download_txts(files, repo, campus_dir):
+def download_txts(workspace, files, repo, campus_dir):
     """下载并过滤空剧本（无台词的纯演出脚本），与本地菜单2的空文件过滤同构。
     返回有台词的文件列表。空文件每轮会重新检查一遍（几KB开销，无状态残留）。"""
-    target = Path("todo/untranslated/txt")
+    target = Path(workspace.todo_txt_dir)
     target.mkdir(parents=True, exist_ok=True)
     kept = []
     for name in files:
@@ -164,14 +165,17 @@ def ensure_pretranslation_env():
     p.write_text("\n".join(lines) + "\n", encoding="utf-8")
 
 
-def prepare_translate_input():
-    src = Path("todo/untranslated/csv_dict")
-    dst = PRETRANS_DIR / "tmp/untranslated"
+def prepare_translate_input(workspace):
+    src = Path(workspace.csv_dict_dir)
+    dst = Path(workspace.gakumas_untranslated_dir)
     clear_dir(dst)
-    clear_dir(PRETRANS_DIR / "tmp/translated")
+    clear_dir(workspace.gakumas_translated_dir)
+    # csv_data 中已有完全相同原文的行直接预填，只把未命中的行送去机翻
+    tm = memory.TranslationMemory.load(workspace.csv_data_dir)
+    memory.prefill_batch(tm, workspace.csv_orig_dir, str(src))
     mask_csv_tags(src)
     for f in src.glob("*.csv"):
-        shutil.copy2(f, dst / f.name)
+        carryover.write_pending_csv(f, dst / f.name)
 
 
 def mask_csv_tags(folder):
@@ -198,16 +202,16 @@ def mask_tags(text):
     return TAG_RE.sub(repl, text or "")
 
 
-def restore_csvs():
-    src = PRETRANS_DIR / "tmp/translated"
-    out_dir = Path("todo/translated/csv")
-    csv_data = ROOT / "csv_data"
+def restore_csvs(workspace):
+    src = Path(workspace.gakumas_translated_dir)
+    out_dir = Path(workspace.translated_csv_dir)
+    csv_data = Path(workspace.csv_data_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
     csv_data.mkdir(exist_ok=True)
     stories = set()
 
     for translated in sorted(src.glob("*.csv")):
-        orig_path = Path("todo/untranslated/csv_orig") / translated.name
+        orig_path = Path(workspace.csv_orig_dir) / translated.name
         if not orig_path.exists():
             print(f"!! 缺原始 CSV，跳过: {translated.name}")
             continue
@@ -220,8 +224,11 @@ def restore_csvs():
             rows = list(reader)
 
         translator = None
-        if len(rows) > len(orig_rows) and rows[-1].get("id") == "译者":
+        if rows and len(rows) != len(orig_rows) and rows[-1].get("id") == "译者":
             translator = rows.pop()
+        if len(rows) < len(orig_rows):
+            # 翻译记忆预填的行没有送去机翻，按顺序填回
+            rows = carryover.splice_translations(orig_rows, rows) or rows
         if len(rows) != len(orig_rows):
             print(f"!! 行数不一致，跳过: {translated.name}")
             continue
@@ -290,6 +297,8 @@ def main():
         "--prefix", default="adv_",
         help="逗号分隔的前缀白名单，命中任一即处理（如 adv_cidol,adv_csprt）")
     ap.add_argument("--limit", type=int, default=0)
+    ap.add_argument("--workers", type=int, default=1,
+                    help="预处理并行进程数，0 表示使用全部 CPU 核心")
     ap.add_argument("--dry-run", action="store_true")
     args = ap.parse_args()
 
@@ -307,40 +316,38 @@ def main():
         return
 
     with tempfile.TemporaryDirectory(prefix="gat-campus-") as tmp:
-        old_cwd = Path.cwd()
-        os.chdir(tmp)
-        try:
-            for p in [
-                "todo/untranslated/txt",
-                "todo/untranslated/csv_orig",
-                "todo/untranslated/csv_dict",
-                "todo/translated/csv",
-            ]:
-                clear_dir(p)
-
-            kept = download_txts(new, args.campus_repo, args.campus_dir)
-            if not kept:
-                print("新增全部为空剧本，无需机翻")
-                return
-            preprocessor.preprocess_txt_files(preserve_html=True)
-            ensure_pretranslation_repo()
-            ensure_pretranslation_env()
-            prepare_translate_input()
-            run([YARN, "--cwd", str(PRETRANS_DIR), "translate:folder"])
-
-            stories = restore_csvs()
-            if not stories:
-                raise SystemExit("没有生成可播种的 CSV")
-            run([
-                sys.executable, str(ROOT / "tools/seed_work_repo.py"),
-                "--repo", args.work_repo,
-                "--stories", *stories,
-                "--csv-src", str(Path.cwd() / "todo/translated/csv"),
-                "--push", "--issues",
-                "--raw-dir", str(Path.cwd() / "todo/untranslated/txt"),
-            ], cwd=str(ROOT))
-        finally:
-            os.chdir(old_cwd)
+        # 本批次的todo目录放在临时工作区，译文库和翻译工具沿用仓库中的
+        workspace = Workspace(tmp, csv_data_dir=str(ROOT / "csv_data"),
+                              dict_file=str(ROOT / "name_dictionary.json"), gakumas_dir=str(PRETRANS_DIR))
+        for p in [
+            workspace.todo_txt_dir,
+            workspace.csv_orig_dir,
+            workspace.csv_dict_dir,
+            workspace.translated_csv_dir,
+        ]:
+            clear_dir(p)
+
+        kept = download_txts(workspace, new, args.campus_repo, args.campus_dir)
+        if not kept:
+            print("新增全部为空剧本，无需机翻")
+            return
+        preprocessor.preprocess_txt_files(preserve_html=True, workers=args.workers, workspace=workspace)
+        ensure_pretranslation_repo()
+        ensure_pretranslation_env()
+        prepare_translate_input(workspace)
+        run([YARN, "--cwd", str(PRETRANS_DIR), "translate:folder"])
+
+        stories = restore_csvs(workspace)
+        if not stories:
+            raise SystemExit("没有生成可播种的 CSV")
+        run([
+            sys.executable, str(ROOT / "tools/seed_work_repo.py"),
+            "--repo", args.work_repo,
+            "--stories", *stories,
+            "--csv-src", os.path.abspath(workspace.translated_csv_dir),
+            "--push", "--issues",
+            "--raw-dir", os.path.abspath(workspace.todo_txt_dir),
+        ], cwd=str(ROOT))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,400 @@
+#!/usr/bin/env python
+"""
+本地性能基准 —— 在仓库自带语料(csv_data/、data/)上对比新旧实现的吞吐。
+
+每个子命令都会先校验新旧实现输出一致，再报告速度；不一致时以非零状态退出。
+
+用法:
+  python tools/benchmark.py names            # 人名字典替换：逐项正则 vs 单次扫描
+  python tools/benchmark.py names --repeat 3
+  python tools/benchmark.py encoding         # 原始脚本编码识别：逐个编码重读 vs 一次读取+编码缓存
+  python tools/benchmark.py lexer            # 脚本文本提取：逐行多组正则 vs 共享词法扫描
+  python tools/benchmark.py parse-cache      # 脚本解析：每次词法扫描 vs 读取二进制解析缓存
+  python tools/benchmark.py tags             # 标签清理：四遍re.sub vs 单遍扫描+LRU缓存
+  python tools/benchmark.py merge            # 合并替换：逐行整文件re.sub vs 区间值索引+一次拼接
+  python tools/benchmark.py fuzzy-tm         # 翻译记忆模糊匹配：全量编辑距离 vs MinHash/LSH候选
+"""
+import argparse
+import csv
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+from gakumas_auto_translate.modules import dictionary
+from gakumas_auto_translate.modules import encoding
+from gakumas_auto_translate.modules import lexer
+from gakumas_auto_translate.modules import memory
+from gakumas_auto_translate.modules import merger
+from gakumas_auto_translate.modules import parse_cache
+from gakumas_auto_translate.modules import utils
+
+
+def load_csv_texts(csv_dir):
+    texts = []
+    for path in sorted(Path(csv_dir).glob("*.csv")):
+        with path.open(encoding="utf-8", newline="") as f:
+            texts.extend(row.get("text") or "" for row in csv.DictReader(f))
+    return texts
+
+
+def timed(func, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def report(label, count, unit, seconds):
+    rate = count / seconds if seconds else float("inf")
+    print(f"  {label:<12} {seconds:8.3f}s  {rate:12,.0f} {unit}/s")
+
+
+def bench_names(args):
+    name_dict = dictionary.load_name_dictionary(str(ROOT / "name_dictionary.json"))
+    if name_dict is None:
+        raise SystemExit("缺少人名字典")
+    texts = load_csv_texts(args.csv_dir)
+    print(f"语料: {len(texts)} 行 ({args.csv_dir})")
+
+    start = time.perf_counter()
+    replacer = dictionary.NameReplacer(name_dict)
+    print(f"  构建替换器 {time.perf_counter() - start:.3f}s")
+
+    items = replacer.items
+    compiled = replacer._compiled
+    before, t_before = timed(
+        lambda: [dictionary.legacy_replace(t, items, compiled) for t in texts], args.repeat)
+    after, t_after = timed(lambda: [replacer.replace(t) for t in texts], args.repeat)
+
+    report("逐项正则", len(texts), "rows", t_before)
+    report("单次扫描", len(texts), "rows", t_after)
+    diff = sum(a != b for a, b in zip(before, after))
+    changed = sum(a != t for a, t in zip(before, texts))
+    print(f"  发生替换 {changed} 行，输出不一致 {diff} 行，加速 {t_before / t_after:.1f}x")
+    return diff == 0
+
+
+LEGACY_ENCODINGS = ["utf-8", "shift-jis", "gbk", "cp932", "latin1", "cp1252"]
+FIXTURE_ENCODINGS = ["utf-8", "utf-8-sig", "shift-jis", "gbk", "cp932"]
+
+
+def build_encoding_fixture(data_dir, target, count):
+    """从 data/ 取样，按轮换的编码写出混合编码的原始脚本"""
+    sources = sorted(Path(data_dir).glob("*.txt"))[:count]
+    for i, src in enumerate(sources):
+        enc = FIXTURE_ENCODINGS[i % len(FIXTURE_ENCODINGS)]
+        text = src.read_text(encoding="utf-8")
+        (Path(target) / src.name).write_bytes(text.encode(enc, errors="replace"))
+    return [p.name for p in sorted(Path(target).glob("*.txt"))]
+
+
+def legacy_read(path):
+    """旧版做法：逐个编码重新打开并完整读取，返回 (行列表, 打开次数)"""
+    opens = 0
+    for enc in LEGACY_ENCODINGS:
+        opens += 1
+        try:
+            with open(path, "r", encoding=enc) as f:
+                return f.readlines(), opens
+        except UnicodeDecodeError:
+            continue
+    return None, opens
+
+
+def bench_encoding(args):
+    tmp = tempfile.mkdtemp(prefix="gat-bench-enc-")
+    try:
+        names = build_encoding_fixture(args.data_dir, tmp, args.count)
+        paths = [str(Path(tmp) / n) for n in names]
+        print(f"混合编码样本: {len(paths)} 个文件 ({', '.join(FIXTURE_ENCODINGS)} 轮换)")
+
+        legacy, t_legacy = timed(lambda: [legacy_read(p) for p in paths], args.repeat)
+        opens = sum(o for _, o in legacy)
+        report("逐个编码", len(paths), "files", t_legacy)
+        print(f"  {'':<12} 平均每文件打开并解码 {opens / len(paths):.2f} 次")
+
+        cache = {}
+        sniffed, t_sniff = timed(lambda: [encoding.read_text(p, cache) for p in paths], 1)
+        report("一次识别", len(paths), "files", t_sniff)
+        cached, t_cached = timed(lambda: [encoding.read_text(p, cache) for p in paths], args.repeat)
+        report("缓存命中", len(paths), "files", t_cached)
+        print(f"  {'':<12} 平均每文件打开并解码 1.00 次")
+
+        same = True
+        for (lines, _), (text, enc) in zip(legacy, cached):
+            if lines is None or text is None:
+                same = same and lines is None and text is None
+                continue
+            # 旧版对 UTF-8 BOM 保留 \ufeff，新版按 utf-8-sig 去除
+            if enc == "utf-8-sig" and lines and lines[0].startswith("\ufeff"):
+                lines = [lines[0][1:]] + lines[1:]
+            same = same and "".join(lines) == text
+        picked = sorted(set(enc for _, enc in sniffed))
+        print(f"  识别结果: {', '.join(picked)}；解码文本{'一致' if same else '不一致'}")
+        return same
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+LEGACY_MESSAGE_TEXT_RE = re.compile(r'\[message text=(.*?)(?=\s+(?:name|hide|isInner|se|clip)=|\])')
+LEGACY_MESSAGE_NAME_RE = re.compile(r'(?:^|\s)name=\s*([^\s\]]+)')
+
+
+def legacy_extract(content):
+    """旧版预处理的逐行提取：每行依次尝试message、choice、title、narration正则"""
+    records = []
+    for line in content.split("\n"):
+        line = line.strip()
+        match = LEGACY_MESSAGE_TEXT_RE.match(line)
+        if match:
+            name = LEGACY_MESSAGE_NAME_RE.search(line)
+            records.append(("message", match.group(1), name.group(1) if name else ""))
+            continue
+        choices = re.findall(r'choice text=(.*?)(?:\s+\w+=|\])', line)
+        if choices:
+            records.extend(("choice", text, "") for text in choices)
+            continue
+        match = re.match(r'\[\[?title title=(.*?)(?:\]|\s+\w+=)', line)
+        if match:
+            records.append(("title", match.group(1), ""))
+            continue
+        match = re.match(r'\[\[?narration text=(.*?)(?:\]|\s+\w+=)', line)
+        if match:
+            records.append(("narration", match.group(1), ""))
+    return records
+
+
+def lexer_extract(content):
+    return [(r.kind, lexer.record_text(content, r), lexer.record_name(content, r))
+            for r in lexer.lex_script(content)]
+
+
+def bench_lexer(args):
+    contents = [p.read_text(encoding="utf-8") for p in sorted(Path(args.data_dir).glob("*.txt"))]
+    lines = sum(c.count("\n") + 1 for c in contents)
+    size = sum(len(c) for c in contents)
+    print(f"语料: {len(contents)} 个文件，{lines} 行，{size / 1e6:.0f}M 字符 ({args.data_dir})")
+
+    before, t_before = timed(lambda: [legacy_extract(c) for c in contents], args.repeat)
+    after, t_after = timed(lambda: [lexer_extract(c) for c in contents], args.repeat)
+    report("逐行正则", lines, "lines", t_before)
+    report("词法扫描", lines, "lines", t_after)
+    diff = sum(a != b for a, b in zip(before, after))
+    records = sum(len(a) for a in after)
+    print(f"  文本记录 {records} 条，提取结果不一致 {diff} 个文件，加速 {t_before / t_after:.1f}x")
+    return diff == 0
+
+
+def bench_parse_cache(args):
+    paths = sorted(Path(args.data_dir).glob("*.txt"))
+    contents = [p.read_text(encoding="utf-8") for p in paths]
+    keys = [encoding.content_hash(p.read_bytes()) for p in paths]
+    print(f"语料: {len(contents)} 个文件 ({args.data_dir})")
+
+    tmp = tempfile.mkdtemp(prefix="gat-bench-parse-")
+    try:
+        def lex_all():
+            return [(lexer.lex_script(c), lexer.name_spans(c)) for c in contents]
+
+        def load_all():
+            return [parse_cache.lex_cached(c, tmp, k) for c, k in zip(contents, keys)]
+
+        parsed, t_lex = timed(lex_all, args.repeat)
+        _, t_fill = timed(load_all, 1)
+        cached, t_load = timed(load_all, args.repeat)
+        size = sum(f.stat().st_size for f in Path(tmp, parse_cache.CACHE_DIR).iterdir())
+        report("词法扫描", len(contents), "files", t_lex)
+        report("首次写缓存", len(contents), "files", t_fill)
+        report("读取缓存", len(contents), "files", t_load)
+        same = parsed == cached
+        print(f"  缓存大小 {size / 1e6:.1f}MB，解析结果{'一致' if same else '不一致'}，加速 {t_lex / t_load:.1f}x")
+        return same
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_tags(args):
+    texts = load_csv_texts(args.csv_dir)
+    tagged = sum("<" in t for t in texts)
+    print(f"语料: {len(texts)} 行，其中含标签 {tagged} 行 ({args.csv_dir})")
+
+    def single_pass():
+        # 每轮清空缓存，计入首次处理的成本
+        utils._clean_html_tags_cached.cache_clear()
+        return [utils.clean_html_tags(t) for t in texts]
+
+    before, t_before = timed(lambda: [utils.legacy_clean_html_tags(t) for t in texts], args.repeat)
+    after, t_after = timed(single_pass, args.repeat)
+    # 预处理和合并各清理一遍，第二遍全部命中缓存
+    _, t_warm = timed(lambda: [utils.clean_html_tags(t) for t in texts], args.repeat)
+    report("四遍正则", len(texts), "rows", t_before)
+    report("单遍扫描", len(texts), "rows", t_after)
+    report("缓存命中", len(texts), "rows", t_warm)
+    diff = sum(a != b for a, b in zip(before, after))
+    print(f"  {utils._clean_html_tags_cached.cache_info()}")
+    print(f"  输出不一致 {diff} 行，加速 {t_before / t_after:.1f}x（缓存命中 {t_before / t_warm:.1f}x）")
+    return diff == 0
+
+
+def build_merge_fixture(data_dir, csv_dir):
+    """data/中是已合并的脚本，按文件顺序把文本区间换回csv_data中的原文，得到 (文件名, 原始脚本, 行列表)"""
+    fixture = []
+    for path in sorted(Path(data_dir).glob("*.txt")):
+        csv_path = Path(csv_dir) / (path.stem + ".csv")
+        if not csv_path.exists():
+            continue
+        with csv_path.open(encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+        content = path.read_text(encoding="utf-8")
+        slots = merger._script_slots(content)
+        positions = dict.fromkeys(slots, 0)
+        for row in rows:
+            kind = merge_row_kind(row)
+            if kind is None or positions[kind] >= len(slots[kind]):
+                continue
+            slots[kind][positions[kind]][2] = row.get("text") or ""
+            positions[kind] += 1
+        slots["name"] = []
+        fixture.append((path.name, merger._render_slots(content, slots), rows))
+    return fixture
+
+
+MERGE_ROW_KINDS = {
+    ("0000000000000", "__title__"): "title",
+    ("0000000000000", "__narration__"): "narration",
+}
+MERGE_PREFIXES = {"message": "message text=", "narration": "narration text=", "title": "title title=", "choice": "choice text="}
+
+
+def merge_row_kind(row):
+    if row.get("id") == "select":
+        return "choice"
+    return MERGE_ROW_KINDS.get((row.get("id"), row.get("name")), "message" if row.get("id") == "0000000000000" else None)
+
+
+def merge_rows(rows):
+    """纯中文合并的替换顺序：跳过无原文或无译文的行，按原文长度降序"""
+    items = [r for r in rows if r.get("text") and r.get("trans") and merge_row_kind(r)]
+    return sorted(items, key=lambda r: len(r["text"]), reverse=True)
+
+
+def legacy_merge(content, rows):
+    for row in merge_rows(rows):
+        pattern = re.compile(r"(%s)%s" % (re.escape(MERGE_PREFIXES[merge_row_kind(row)]), re.escape(row["text"])))
+        content = pattern.sub(lambda m: f"{m.group(1)}{row['trans']}", content)
+    return content
+
+
+def slot_index_merge(content, rows):
+    slots = merger._script_slots(content)
+    items = merge_rows(rows)
+    indexes = merger._slot_indexes(slots, items)
+    for row in items:
+        indexes[merge_row_kind(row)].replace_prefix(row["text"], row["trans"])
+    return merger._render_slots(content, slots)
+
+
+def bench_merge(args):
+    fixture = build_merge_fixture(args.data_dir, args.csv_dir)
+    largest = sorted(fixture, key=lambda item: len(item[1]), reverse=True)[:args.largest]
+    print(f"语料: {len(fixture)} 个文件，最大 {largest[0][0]} ({len(largest[0][1]) / 1e3:.0f}K 字符, {len(largest[0][2])} 行)")
+
+    ok = True
+    for label, files in (("全部文件", fixture), (f"最大{len(largest)}个", largest)):
+        before, t_before = timed(lambda: [legacy_merge(c, r) for _, c, r in files], args.repeat)
+        after, t_after = timed(lambda: [slot_index_merge(c, r) for _, c, r in files], args.repeat)
+        diff = sum(a != b for a, b in zip(before, after))
+        print(label)
+        report("逐行re.sub", len(files), "files", t_before)
+        report("区间索引", len(files), "files", t_after)
+        print(f"  输出不一致 {diff} 个文件，加速 {t_before / t_after:.1f}x")
+        ok = ok and diff == 0
+    return ok
+
+
+def bench_fuzzy_tm(args):
+    entries = [memory.read_memory_entry(str(p)) for p in sorted(Path(args.csv_dir).glob("*.csv"))]
+    tm = memory.TranslationMemory(e for e in entries if e)
+    index, t_build = timed(lambda: memory.FuzzyIndex.from_memory(tm), args.repeat)
+    print(f"语料: {len(tm)} 条不同原文 ({args.csv_dir})")
+
+    # 把原文中间的一个字符换成别的字符，模拟只差一个助词的近似句
+    rng = random.Random(0)
+    sources = rng.sample(sorted(k for k, _ in tm.items() if len(memory.fuzzy_key(k)) >= 6), args.queries)
+    queries = [q[:len(q) // 2] + "の" + q[len(q) // 2 + 1:] for q in sources]
+    suggestions, t_query = timed(lambda: [index.suggest(q, top_k=1) for q in queries], args.repeat)
+
+    keys = [memory.fuzzy_key(k) for k, _ in tm.items()]
+
+    def brute_best(query):
+        key = memory.fuzzy_key(query)
+        return max((memory.similarity(key, other) for other in keys
+                    if min(len(key), len(other)) >= 0.6 * max(len(key), len(other))), default=0.0)
+
+    brute = queries[:args.brute]
+    best, t_brute = timed(lambda: [brute_best(q) for q in brute], 1)
+    found = sum(bool(s) and s[0][0] >= round(b, 3) for s, b in zip(suggestions, best) if b >= 0.6)
+    expected = sum(b >= 0.6 for b in best)
+    report("建立索引", len(tm), "texts", t_build)
+    report("全量比对", len(brute), "queries", t_brute)
+    report("LSH查询", len(queries), "queries", t_query)
+    print(f"  每次查询 {t_query / len(queries) * 1000:.3f}ms，"
+          f"最佳匹配召回 {found}/{expected}，加速 {t_brute / len(brute) / (t_query / len(queries)):.0f}x")
+    return expected == 0 or found / expected >= 0.9
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=1, help="重复次数，取最快一次")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("names", help="人名字典替换")
+    p.add_argument("--csv-dir", default=str(ROOT / "csv_data"))
+    p.set_defaults(func=bench_names)
+
+    p = sub.add_parser("encoding", help="原始脚本编码识别")
+    p.add_argument("--data-dir", default=str(ROOT / "data"))
+    p.add_argument("--count", type=int, default=500)
+    p.set_defaults(func=bench_encoding)
+
+    p = sub.add_parser("lexer", help="脚本文本提取")
+    p.add_argument("--data-dir", default=str(ROOT / "data"))
+    p.set_defaults(func=bench_lexer)
+
+    p = sub.add_parser("parse-cache", help="脚本解析缓存")
+    p.add_argument("--data-dir", default=str(ROOT / "data"))
+    p.set_defaults(func=bench_parse_cache)
+
+    p = sub.add_parser("tags", help="HTML样式标签清理")
+    p.add_argument("--csv-dir", default=str(ROOT / "csv_data"))
+    p.set_defaults(func=bench_tags)
+
+    p = sub.add_parser("merge", help="合并时的文本替换")
+    p.add_argument("--data-dir", default=str(ROOT / "data"))
+    p.add_argument("--csv-dir", default=str(ROOT / "csv_data"))
+    p.add_argument("--largest", type=int, default=10)
+    p.set_defaults(func=bench_merge)
+
+    p = sub.add_parser("fuzzy-tm", help="翻译记忆模糊匹配")
+    p.add_argument("--csv-dir", default=str(ROOT / "csv_data"))
+    p.add_argument("--queries", type=int, default=2000)
+    p.add_argument("--brute", type=int, default=20, help="用全量比对核对召回率的查询数")
+    p.set_defaults(func=bench_fuzzy_tm)
+
+    args = ap.parse_args()
+    if not args.func(args):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+字典修改影响分析 —— 修改 name_dictionary.json 后找出受影响的文件，只重建这些文件。
+
+csv_data/（以及 --raw-dir 指定的原始 txt 目录）各维护一份词条反向索引（.term_index.json），
+按文件大小和修改时间增量更新。原始 txt 目录只读，其索引保存在 .cache/raw_term_index/。与上次确认的字典比较：
+  - name 属性译名变化的文件：合并结果会变化，--rebuild 时只重新合并这些文件并替换进 data/
+  - 文本中含有受影响词条的文件：预处理人名替换结果会变化，重新翻译时需要注意
+
+首次运行只建立索引并把当前字典记为已确认版本。
+
+用法:
+  python tools/dict_impact.py                  # 列出受影响的文件
+  python tools/dict_impact.py --rebuild        # 重新合并受影响的 data/ 文件并确认当前字典
+  python tools/dict_impact.py --accept         # 不重建，直接确认当前字典
+  python tools/dict_impact.py --raw-dir <dump_txt>  # 同时检查尚未翻译的原始脚本
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from gakumas_auto_translate.modules import config, dictionary, rebuild, term_index
+from gakumas_auto_translate.modules.workspace import Workspace
+
+
+def print_files(title, files, limit):
+    print(f"{title}: {len(files)} 个文件")
+    for filename in files[:limit]:
+        print(f"  {filename}")
+    if len(files) > limit:
+        print(f"  ……另有 {len(files) - limit} 个文件")
+
+
+def main():
+    # 当前目录的工作区，翻译模式和dump_txt路径取自config.json
+    workspace = Workspace.default()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--csv-dir", default=workspace.csv_data_dir)
+    ap.add_argument("--raw-dir", default=None, help="同时索引的原始 txt 目录（如 dump_txt）")
+    ap.add_argument("--data-dir", default=workspace.data_dir)
+    ap.add_argument("--mode", default=None, help="重建模式 bilingual/chinese，默认当前翻译模式")
+    ap.add_argument("--workers", type=int, default=0)
+    ap.add_argument("--limit", type=int, default=20, help="每类最多列出的文件数")
+    group = ap.add_mutually_exclusive_group()
+    group.add_argument("--rebuild", action="store_true")
+    group.add_argument("--accept", action="store_true")
+    args = ap.parse_args()
+
+    # 与合并时使用同一份字典文件
+    name_dict = dictionary.load_name_dictionary(workspace.dict_file)
+    if name_dict is None:
+        sys.exit(1)
+
+    index = term_index.TermIndex.load(args.csv_dir, name_dict)
+    # 不向原始脚本目录写入索引文件
+    raw_cache_dir = os.path.join(workspace.cache_dir, "raw_term_index")
+    raw_index = term_index.TermIndex.load(args.raw_dir, name_dict, raw_cache_dir) if args.raw_dir else None
+    if index.snapshot is None:
+        for each in (index, raw_index):
+            if each is not None:
+                each.accept(name_dict)
+        print("已建立词条索引，当前字典记为已确认版本")
+        return
+
+    changed = sorted(term_index.changed_terms(index.snapshot, name_dict))
+    if not changed:
+        print("字典与上次确认的版本相同，没有受影响的文件")
+        return
+    print(f"字典变化的词条: {len(changed)} 个（{'、'.join(changed[:args.limit])}）")
+
+    name_files, text_files = index.affected(index.snapshot, name_dict)
+    print_files("name属性译名变化、需要重新合并的文件", name_files, args.limit)
+    print_files("文本中含有受影响词条的文件", text_files, args.limit)
+    if raw_index is not None and raw_index.snapshot is not None:
+        raw_name_files, raw_text_files = raw_index.affected(raw_index.snapshot, name_dict)
+        print_files("原始脚本中说话人受影响的文件", raw_name_files, args.limit)
+        print_files("原始脚本中文本含有受影响词条的文件", raw_text_files, args.limit)
+
+    if args.rebuild:
+        if name_files and not rebuild.rebuild_data(args.raw_dir or config.get_dump_txt_path(), args.csv_dir,
+                                                   args.data_dir, args.mode, args.workers, files=set(name_files),
+                                                   workspace=workspace):
+            sys.exit(1)
+    if args.rebuild or args.accept:
+        for each in (index, raw_index):
+            if each is not None:
+                each.accept(name_dict)
+        print("已确认当前字典")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,28 @@
 import os
 import csv
 import re
+import sys
 from collections import defaultdict
+from itertools import groupby
+from operator import attrgetter
+from pathlib import Path
 
-# --- 正则表达式 ---
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from gakumas_auto_translate.modules import encoding as encoding_cache
+from gakumas_auto_translate.modules import lexer
 
-# === 用于双语文件 (BILINGUAL) ===
-MESSAGE_NAME_RE = re.compile(r"(?:^|\s)name=\s*([^\s\]]+)")
+# --- 正则表达式 ---
+# 指令行的切分由 lexer.lex_script 完成，这里只需要从双语文本中取出中文部分
 BILINGUAL_R_TAG_EXTRACTOR_RE = re.compile(r"<r\\=[\s\S]*?>([\s\S]*?)(?:</r>|/r>)")
-BILINGUAL_MESSAGE_RE = re.compile(r"\[message text=(?P<text>[\s\S]+?)(?=\s+(?:name|hide|isInner|se|clip)=|\])(?P<attrs>[\s\S]*?)\s+clip=.*?\"_startTime\":(?P<start>[\d\.]+).*?\]")
-BILINGUAL_NARRATION_RE = re.compile(r"\[narration text=([\s\S]+?) (?:hide=true )?clip=.*?\"_startTime\":([\d\.]+).*?\]")
-BILINGUAL_CHOICE_GROUP_RE = re.compile(r"\[choicegroup choices=\[(.*?)\] clip=.*?\"_startTime\":([\d\.]+).*?\]")
-CHOICE_TEXT_EXTRACTOR_RE = re.compile(r"choice text=([\s\S]*?)(?=\s+\w+=|\] choices=\[choice text=|\])")
 
 
-# === 用于日文原文文件 (ORIGINAL JAPANESE) ===
-ORIGINAL_MESSAGE_RE = re.compile(
-    r"\[message text=([\s\S]+?)"
-    r"\s+name=\s*(\S+)"  # 允许等号后有空格, 然后捕获非空格字符
-    r"[\s\S]*?" # 匹配 name 和 clip 之间的任何其他属性 (非贪婪)
-    r"\s*clip=.*?\"_startTime\":([\d\.]+).*?\]"
-)
-ORIGINAL_MESSAGE_RE = re.compile(r"\[message text=(?P<text>[\s\S]+?)(?=\s+(?:name|hide|isInner|se|clip)=|\])(?P<attrs>[\s\S]*?)\s+clip=.*?\"_startTime\":(?P<start>[\d\.]+).*?\]")
-ORIGINAL_NARRATION_RE = re.compile(r"\[narration text=([\s\S]+?) (?:hide=true )?clip=.*?\"_startTime\":([\d\.]+).*?\]")
-ORIGINAL_CHOICE_GROUP_RE = re.compile(r"\[choicegroup choices=\[(.*?)\] clip=.*?\"_startTime\":([\d\.]+).*?\]")
-ORIGINAL_CHOICE_TEXT_EXTRACTOR_RE = re.compile(r"choice text=([\s\S]*?)(?=\s+\w+=|\] choices=\[choice text=|\])")
+def iter_script_lines(content):
+    """按行分组脚本中的文本记录，逐行返回 (同一行的记录列表, startTime)，缺少clip/startTime的行跳过"""
+    for _, line_records in groupby(lexer.lex_script(content), key=attrgetter("line_start")):
+        line_records = list(line_records)
+        start_time = lexer.clip_start_time(content, line_records[0])
+        if start_time is not None:
+            yield line_records, start_time
 
 
 def get_raw_japanese_text(raw_text_content_from_original):
@@ -34,7 +32,7 @@ def get_raw_japanese_text(raw_text_content_from_original):
     return raw_text_content_from_original.strip()
 
 
-def parse_original_japanese_file_content(filepath):
+def parse_original_japanese_file_content(filepath, encodings=None):
     parsed_data = {
         "messages": defaultdict(list),
         "narrations": defaultdict(list),
@@ -46,43 +44,28 @@ def parse_original_japanese_file_content(filepath):
         return parsed_data
 
     try:
-        with open(filepath, 'r', encoding='utf-8') as f_orig:
-            for line_orig in f_orig:
-                line_orig = line_orig.strip()
-
-                match_msg = ORIGINAL_MESSAGE_RE.match(line_orig)
-                if match_msg:
-                    raw_jp_text_content = match_msg.group("text")
-                    name_match = MESSAGE_NAME_RE.search(match_msg.group("attrs"))
-                    jp_name = name_match.group(1).strip() if name_match else ""
-                    start_time = match_msg.group("start")
-                    processed_jp_text = get_raw_japanese_text(raw_jp_text_content) # \n 已保留
-                    parsed_data["messages"][start_time].append({"text": processed_jp_text, "name": jp_name})
-                    continue
-
-                match_nar = ORIGINAL_NARRATION_RE.match(line_orig)
-                if match_nar:
-                    raw_jp_text_content = match_nar.group(1)
-                    start_time_nar = match_nar.group(2)
-                    processed_jp_text = get_raw_japanese_text(raw_jp_text_content) # \n 已保留
-                    parsed_data["narrations"][start_time_nar].append(processed_jp_text)
-                    continue
-
-                match_cg = ORIGINAL_CHOICE_GROUP_RE.match(line_orig)
-                if match_cg:
-                    jp_choices_str = match_cg.group(1)
-                    start_time_cg = match_cg.group(2)
-                    
-                    extracted_jp_choices = [
-                        get_raw_japanese_text(choice.strip()) # \n 已保留
-                        for choice in ORIGINAL_CHOICE_TEXT_EXTRACTOR_RE.findall(jp_choices_str)
-                    ]
-                    if start_time_cg in parsed_data["choices"] and extracted_jp_choices:
-                        print(f"警告: 在日文原文件 {filepath} 中发现重复的 startTime {start_time_cg} (choice groups)。将使用后找到的。")
-                    if extracted_jp_choices:
-                        parsed_data["choices"][start_time_cg] = extracted_jp_choices
-                    elif jp_choices_str.strip() and "choice text=" in jp_choices_str :
-                         print(f"调试: 日文原文件 {filepath}, startTime {start_time_cg}: 未能从 '{jp_choices_str}' 解析出日文选项，尽管包含 'choice text='。")
+        # 复用编码缓存（encodings 为原文目录的 load_cache 结果），文件只读取解码一次
+        content, _ = encoding_cache.read_text(filepath, encodings)
+        if content is None:
+            raise ValueError("无法识别文件编码格式")
+        for line_records, start_time in iter_script_lines(content):
+            record = line_records[0]
+            if record.kind == "message":
+                raw_jp_text_content = lexer.record_text(content, record)
+                jp_name = lexer.record_name(content, record).strip()
+                processed_jp_text = get_raw_japanese_text(raw_jp_text_content) # \n 已保留
+                parsed_data["messages"][start_time].append({"text": processed_jp_text, "name": jp_name})
+            elif record.kind == "narration":
+                processed_jp_text = get_raw_japanese_text(lexer.record_text(content, record)) # \n 已保留
+                parsed_data["narrations"][start_time].append(processed_jp_text)
+            elif record.kind == "choice" and record.command == "choicegroup":
+                extracted_jp_choices = [
+                    get_raw_japanese_text(lexer.record_text(content, choice)) # \n 已保留
+                    for choice in line_records
+                ]
+                if start_time in parsed_data["choices"]:
+                    print(f"警告: 在日文原文件 {filepath} 中发现重复的 startTime {start_time} (choice groups)。将使用后找到的。")
+                parsed_data["choices"][start_time] = extracted_jp_choices
     except Exception as e:
         print(f"错误: 读取或解析日文原文件 {filepath} 时发生错误: {e}")
     return parsed_data
@@ -109,6 +92,8 @@ def process_game_scripts_main(bilingual_root_dir, original_root_dir, output_dire
     skipped_files = []
     processed_files = []
     failed_files = []
+    # 编码缓存只在本次运行的内存中使用，不向用户的原文目录写入文件
+    encodings = encoding_cache.load_cache(original_root_dir)
 
     for filename in os.listdir(bilingual_root_dir):
         if not filename.endswith(".txt"):
@@ -128,7 +113,7 @@ def process_game_scripts_main(bilingual_root_dir, original_root_dir, output_dire
 
         print(f"正在处理文件: {filename} -> 输出到: {output_csv_file_for_this_file}")
 
-        original_jp_data = parse_original_japanese_file_content(original_file_path)
+        original_jp_data = parse_original_japanese_file_content(original_file_path, encodings)
         if not any(original_jp_data.values()):
              print(f"警告: 日文原文件 {original_file_path} 为空或无法解析。对于 {filename}，日文文本和说话人名称将缺失。")
 
@@ -141,116 +126,105 @@ def process_game_scripts_main(bilingual_root_dir, original_root_dir, output_dire
 
         try:
             with open(bilingual_file_path, 'r', encoding='utf-8') as f_bilingual:
-                for line_num_in_bilingual_file, bilingual_line in enumerate(f_bilingual, 1):
-                    bilingual_line = bilingual_line.strip()
-                    jp_text_final = "[日文原文缺失]"
-                    trans_text_final = "[中文翻译缺失]"
-                    speaker_name_final = "[说话人名称缺失]" 
-
-                    match_bi_msg = BILINGUAL_MESSAGE_RE.match(bilingual_line)
-                    if match_bi_msg:
-                        bilingual_text_attr_for_cn = match_bi_msg.group(1) # text=的原始内容
-                        msg_start_time = match_bi_msg.group(2)
-                        bilingual_text_attr_for_cn = match_bi_msg.group("text")
-                        msg_start_time = match_bi_msg.group("start")
-
-                        # 检查原始文本中是否存在<r\=...>标签
-                        if BILINGUAL_R_TAG_EXTRACTOR_RE.search(bilingual_text_attr_for_cn):
-                            extracted_cn_text = extract_chinese_from_bilingual_text_node(bilingual_text_attr_for_cn)
-                            # 如果提取结果非空 (即使是多个空<r>标签连接产生的"\n"), 则使用它
-                            if extracted_cn_text: 
-                                trans_text_final = extracted_cn_text
-                            else: # <r>标签存在但提取内容为空 (例如 <r\=...></r>)
-                                print(f"信息 (双语 {filename} 行 {line_num_in_bilingual_file}): Message (startTime: {msg_start_time}) <r>标签存在但未提取到中文内容: '{bilingual_text_attr_for_cn[:50]}...'")
-                                # trans_text_final 保持 "[中文翻译缺失]"
-                        else: # 不存在 <r\=...> 标签，直接使用 text= 的内容作为中文
-                            if bilingual_text_attr_for_cn is not None:
-                                # .strip() 清除两端空白, \n 已是字面量
-                                cleaned_direct_text = bilingual_text_attr_for_cn.strip()
-                                if cleaned_direct_text:
-                                    trans_text_final = cleaned_direct_text
-                                # 如果 cleaned_direct_text 为空, trans_text_final 保持 "[中文翻译缺失]"
-                        
-                        original_jp_messages_at_time = original_jp_data["messages"].get(msg_start_time, [])
-                        current_jp_idx = sequential_match_counters["messages"][msg_start_time]
-
-                        if original_jp_messages_at_time and current_jp_idx < len(original_jp_messages_at_time):
-                            jp_message_obj = original_jp_messages_at_time[current_jp_idx]
-                            jp_text_final = jp_message_obj["text"] # \n 已保留
-                            speaker_name_final = jp_message_obj["name"] 
-                            sequential_match_counters["messages"][msg_start_time] += 1
-                        else:
-                            if trans_text_final != "[中文翻译缺失]" or \
-                               (bilingual_text_attr_for_cn is not None and bilingual_text_attr_for_cn.strip()):
-                                print(f"警告 (双语 {filename} 行 {line_num_in_bilingual_file}): 未能在日文原文件中找到 startTime {msg_start_time} 的第 {current_jp_idx + 1} 个 message (日文原文或说话人名称将缺失)。")
-                        
-                        current_file_dialogue_rows.append(["0000000000000", speaker_name_final, jp_text_final, trans_text_final])
-                        continue
-
-                    match_bi_nar = BILINGUAL_NARRATION_RE.match(bilingual_line)
-                    if match_bi_nar:
-                        bilingual_text_attr_for_cn = match_bi_nar.group(1)
-                        nar_start_time = match_bi_nar.group(2)
-                        speaker_name_final = "__narration__" 
-
-                        if BILINGUAL_R_TAG_EXTRACTOR_RE.search(bilingual_text_attr_for_cn):
-                            extracted_cn_text = extract_chinese_from_bilingual_text_node(bilingual_text_attr_for_cn)
-                            if extracted_cn_text:
-                                trans_text_final = extracted_cn_text
-                            else:
-                                print(f"信息 (双语 {filename} 行 {line_num_in_bilingual_file}): Narration (startTime: {nar_start_time}) <r>标签存在但未提取到中文内容: '{bilingual_text_attr_for_cn[:50]}...'")
-                        else:
-                            if bilingual_text_attr_for_cn is not None:
-                                cleaned_direct_text = bilingual_text_attr_for_cn.strip()
-                                if cleaned_direct_text:
-                                    trans_text_final = cleaned_direct_text
-                        
-                        original_jp_narrations_at_time = original_jp_data["narrations"].get(nar_start_time, [])
-                        current_jp_idx = sequential_match_counters["narrations"][nar_start_time]
-
-                        if original_jp_narrations_at_time and current_jp_idx < len(original_jp_narrations_at_time):
-                            jp_text_final = original_jp_narrations_at_time[current_jp_idx] # \n 已保留
-                            sequential_match_counters["narrations"][nar_start_time] += 1
-                        else:
-                            if trans_text_final != "[中文翻译缺失]" or \
-                               (bilingual_text_attr_for_cn is not None and bilingual_text_attr_for_cn.strip()):
-                                print(f"警告 (双语 {filename} 行 {line_num_in_bilingual_file}): 未能在日文原文件中找到 startTime {nar_start_time} 的第 {current_jp_idx + 1} 个 narration。")
-
-                        current_file_dialogue_rows.append(["narration", speaker_name_final, jp_text_final, trans_text_final])
-                        continue
-
-                    match_bi_cg = BILINGUAL_CHOICE_GROUP_RE.match(bilingual_line)
-                    if match_bi_cg:
-                        bilingual_choices_text_attr = match_bi_cg.group(1)
-                        cg_start_time = match_bi_cg.group(2)
-                        speaker_name_final = "" 
-
-                        chinese_choices_list = [
-                            choice.strip() # \n 已保留
-                            for choice in CHOICE_TEXT_EXTRACTOR_RE.findall(bilingual_choices_text_attr)
-                        ]
-                        
-                        if not chinese_choices_list and "choice text=" in bilingual_choices_text_attr:
-                            print(f"警告 (双语 {filename} 行 {line_num_in_bilingual_file}): 未能从 '{bilingual_choices_text_attr}' 解析出中文选项 (startTime: {cg_start_time})")
-
-                        japanese_choices_list = original_jp_data["choices"].get(cg_start_time, []) # \n 已保留
-
-                        if not japanese_choices_list and chinese_choices_list:
-                             print(f"警告 (双语 {filename} 行 {line_num_in_bilingual_file}): 未能在日文原文件中找到 startTime {cg_start_time} 的匹配日文选项组。中文选项将保留。")
-
-                        max_len = max(len(chinese_choices_list), len(japanese_choices_list))
-                        if len(chinese_choices_list) != len(japanese_choices_list) and max_len > 0 :
-                            print(f"注意 (双语 {filename} 行 {line_num_in_bilingual_file}): ChoiceGroup (startTime: {cg_start_time}) 选项数量不匹配。中文: {len(chinese_choices_list)}, 日文: {len(japanese_choices_list)}。")
-
-                        if max_len == 0 and "choice text=" in bilingual_choices_text_attr:
-                            current_file_dialogue_rows.append(["select", speaker_name_final, "[日文解析错误或缺失]", "[中文解析错误]"])
+                bilingual_content = f_bilingual.read()
+            for line_records, start_time in iter_script_lines(bilingual_content):
+                record = line_records[0]
+                line_num_in_bilingual_file = record.line_no
+                jp_text_final = "[日文原文缺失]"
+                trans_text_final = "[中文翻译缺失]"
+                speaker_name_final = "[说话人名称缺失]" 
+
+                if record.kind == "message":
+                    bilingual_text_attr_for_cn = lexer.record_text(bilingual_content, record) # text=的原始内容
+                    msg_start_time = start_time
+
+                    # 检查原始文本中是否存在<r\=...>标签
+                    if BILINGUAL_R_TAG_EXTRACTOR_RE.search(bilingual_text_attr_for_cn):
+                        extracted_cn_text = extract_chinese_from_bilingual_text_node(bilingual_text_attr_for_cn)
+                        # 如果提取结果非空 (即使是多个空<r>标签连接产生的"\n"), 则使用它
+                        if extracted_cn_text: 
+                            trans_text_final = extracted_cn_text
+                        else: # <r>标签存在但提取内容为空 (例如 <r\=...></r>)
+                            print(f"信息 (双语 {filename} 行 {line_num_in_bilingual_file}): Message (startTime: {msg_start_time}) <r>标签存在但未提取到中文内容: '{bilingual_text_attr_for_cn[:50]}...'")
+                            # trans_text_final 保持 "[中文翻译缺失]"
+                    else: # 不存在 <r\=...> 标签，直接使用 text= 的内容作为中文
+                        if bilingual_text_attr_for_cn is not None:
+                            # .strip() 清除两端空白, \n 已是字面量
+                            cleaned_direct_text = bilingual_text_attr_for_cn.strip()
+                            if cleaned_direct_text:
+                                trans_text_final = cleaned_direct_text
+                            # 如果 cleaned_direct_text 为空, trans_text_final 保持 "[中文翻译缺失]"
+                    
+                    original_jp_messages_at_time = original_jp_data["messages"].get(msg_start_time, [])
+                    current_jp_idx = sequential_match_counters["messages"][msg_start_time]
+
+                    if original_jp_messages_at_time and current_jp_idx < len(original_jp_messages_at_time):
+                        jp_message_obj = original_jp_messages_at_time[current_jp_idx]
+                        jp_text_final = jp_message_obj["text"] # \n 已保留
+                        speaker_name_final = jp_message_obj["name"] 
+                        sequential_match_counters["messages"][msg_start_time] += 1
+                    else:
+                        if trans_text_final != "[中文翻译缺失]" or \
+                           (bilingual_text_attr_for_cn is not None and bilingual_text_attr_for_cn.strip()):
+                            print(f"警告 (双语 {filename} 行 {line_num_in_bilingual_file}): 未能在日文原文件中找到 startTime {msg_start_time} 的第 {current_jp_idx + 1} 个 message (日文原文或说话人名称将缺失)。")
+                    
+                    current_file_dialogue_rows.append(["0000000000000", speaker_name_final, jp_text_final, trans_text_final])
+                    continue
+
+                if record.kind == "narration":
+                    bilingual_text_attr_for_cn = lexer.record_text(bilingual_content, record)
+                    nar_start_time = start_time
+                    speaker_name_final = "__narration__" 
+
+                    if BILINGUAL_R_TAG_EXTRACTOR_RE.search(bilingual_text_attr_for_cn):
+                        extracted_cn_text = extract_chinese_from_bilingual_text_node(bilingual_text_attr_for_cn)
+                        if extracted_cn_text:
+                            trans_text_final = extracted_cn_text
                         else:
-                            for i in range(max_len):
-                                jp_choice = japanese_choices_list[i] if i < len(japanese_choices_list) else "[日文选项缺失]"
-                                cn_choice = chinese_choices_list[i] if i < len(chinese_choices_list) else "[中文选项缺失]"
-                                current_file_dialogue_rows.append(["select", speaker_name_final, jp_choice, cn_choice])
-                        continue
-            
+                            print(f"信息 (双语 {filename} 行 {line_num_in_bilingual_file}): Narration (startTime: {nar_start_time}) <r>标签存在但未提取到中文内容: '{bilingual_text_attr_for_cn[:50]}...'")
+                    else:
+                        if bilingual_text_attr_for_cn is not None:
+                            cleaned_direct_text = bilingual_text_attr_for_cn.strip()
+                            if cleaned_direct_text:
+                                trans_text_final = cleaned_direct_text
+                    
+                    original_jp_narrations_at_time = original_jp_data["narrations"].get(nar_start_time, [])
+                    current_jp_idx = sequential_match_counters["narrations"][nar_start_time]
+
+                    if original_jp_narrations_at_time and current_jp_idx < len(original_jp_narrations_at_time):
+                        jp_text_final = original_jp_narrations_at_time[current_jp_idx] # \n 已保留
+                        sequential_match_counters["narrations"][nar_start_time] += 1
+                    else:
+                        if trans_text_final != "[中文翻译缺失]" or \
+                           (bilingual_text_attr_for_cn is not None and bilingual_text_attr_for_cn.strip()):
+                            print(f"警告 (双语 {filename} 行 {line_num_in_bilingual_file}): 未能在日文原文件中找到 startTime {nar_start_time} 的第 {current_jp_idx + 1} 个 narration。")
+
+                    current_file_dialogue_rows.append(["narration", speaker_name_final, jp_text_final, trans_text_final])
+                    continue
+
+                if record.kind == "choice" and record.command == "choicegroup":
+                    cg_start_time = start_time
+                    speaker_name_final = "" 
+
+                    chinese_choices_list = [
+                        lexer.record_text(bilingual_content, choice).strip() # \n 已保留
+                        for choice in line_records
+                    ]
+
+                    japanese_choices_list = original_jp_data["choices"].get(cg_start_time, []) # \n 已保留
+
+                    if not japanese_choices_list and chinese_choices_list:
+                         print(f"警告 (双语 {filename} 行 {line_num_in_bilingual_file}): 未能在日文原文件中找到 startTime {cg_start_time} 的匹配日文选项组。中文选项将保留。")
+
+                    max_len = max(len(chinese_choices_list), len(japanese_choices_list))
+                    if len(chinese_choices_list) != len(japanese_choices_list) and max_len > 0 :
+                        print(f"注意 (双语 {filename} 行 {line_num_in_bilingual_file}): ChoiceGroup (startTime: {cg_start_time}) 选项数量不匹配。中文: {len(chinese_choices_list)}, 日文: {len(japanese_choices_list)}。")
+
+                    for i in range(max_len):
+                        jp_choice = japanese_choices_list[i] if i < len(japanese_choices_list) else "[日文选项缺失]"
+                        cn_choice = chinese_choices_list[i] if i < len(chinese_choices_list) else "[中文选项缺失]"
+                        current_file_dialogue_rows.append(["select", speaker_name_final, jp_choice, cn_choice])
+
             all_rows_for_this_csv = []
             all_rows_for_this_csv.append(["id", "name", "text", "trans"])
             all_rows_for_this_csv.extend(current_file_dialogue_rows)
@@ -289,7 +263,7 @@ def process_game_scripts_main(bilingual_root_dir, original_root_dir, output_dire
             failed_files.append((filename, f"行 {line_num_str} 处理错误: {e}"))
             import traceback
             traceback.print_exc()
-    
+
     # 输出统计信息
     print("\n========== 处理统计 ==========")
     print(f"总计跳过文件数: {len(skipped_files)} 个")
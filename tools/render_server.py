@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+本地渲染服务 —— 按需生成纯中文/中日双语 txt，与 run.py 菜单4 使用同一套合并逻辑。
+
+网页端/批量脚本把 (脚本名, CSV 内容或 csv_data 下的路径, 模式) POST 过来，
+服务从原始 txt 目录读取脚本并返回渲染结果；原始脚本解析结果和渲染结果都有 LRU 缓存。
+
+接口:
+  POST /render        {"script": "adv_xxx.txt", "csv": "<CSV内容>", "mode": "chinese"|"bilingual"}
+                      或用 "csv_path": "adv_xxx.csv"（相对 --csv-dir）代替 "csv"
+  POST /render_batch  {"items": [上述请求, ...]}
+  GET  /stats         缓存命中统计
+
+用法:
+  python tools/render_server.py                         # 原始 txt 目录取 config.json 的 dump_txt_path
+  python tools/render_server.py --raw-dir ./raw_txt --port 8765
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from gakumas_auto_translate.modules import config, merger, render_service
+from gakumas_auto_translate.modules.workspace import Workspace
+
+
+def main():
+    workspace = Workspace()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--raw-dir", default=None, help="原始 txt 目录，默认 config.json 的 dump_txt_path")
+    ap.add_argument("--csv-dir", default=workspace.csv_data_dir, help="csv_path 允许读取的目录")
+    ap.add_argument("--dict-file", default=workspace.dict_file, help="翻译 name 属性用的人名字典")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--raw-cache", type=int, default=render_service.RAW_CACHE_SIZE)
+    ap.add_argument("--output-cache", type=int, default=render_service.OUTPUT_CACHE_SIZE)
+    args = ap.parse_args()
+
+    raw_dir = args.raw_dir or config.get_dump_txt_path()
+    if not raw_dir or not os.path.isdir(raw_dir):
+        sys.exit("未找到原始 txt 目录，请用 --raw-dir 指定或先在 run.py 菜单9 配置 dump_txt 路径")
+
+    renderer = render_service.Renderer(raw_dir, args.csv_dir, merger.load_merge_name_dict(args.dict_file),
+                                       raw_cache_size=args.raw_cache, output_cache_size=args.output_cache)
+    server = render_service.make_server(renderer, args.host, args.port)
+    print(f"渲染服务已启动: http://{args.host}:{server.server_port}  原始 txt: {os.path.abspath(raw_dir)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n渲染服务已停止")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
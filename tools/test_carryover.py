@@ -0,0 +1,42 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from gakumas_auto_translate.modules import carryover
+
+
+def row(row_id, text, trans='', name=''):
+    return {'id': row_id, 'name': name, 'text': text, 'trans': trans}
+
+
+previous = [
+    row('0000000000001', 'おはよう', '早上好', '咲季'),
+    row('narration', '朝。', '早晨。'),
+    row('0000000000003', '行こう', '走吧', '咲季'),
+    row('0000000000004', 'またね', '[中文翻译缺失]', '咲季'),
+    row('译者', '', 'someone'),
+]
+rows = [
+    row('0000000000001', 'おはよう', name='咲季'),
+    row('0000000000000', '朝。'),
+    row('0000000000002', '新しい台詞', name='咲季'),
+    row('0000000000003', '行こう', name='咲季'),
+    row('0000000000004', 'またね', name='咲季'),
+    row('info', ''),
+]
+
+carried_rows, carried = carryover.carry_over_rows(rows, previous)
+assert carried == 3
+assert [r['trans'] for r in carried_rows] == ['早上好', '早晨。', '', '走吧', '', '']
+# 不修改传入的行
+assert all(r['trans'] == '' for r in rows)
+assert carryover.carry_over_rows(rows, []) == (rows, 0)
+
+# 只送翻译待翻译行，合并时按顺序填回
+pending = carryover.pending_rows(carried_rows)
+assert [r['id'] for r in pending] == ['0000000000002', '0000000000004', 'info']
+translated = [dict(r, trans=f'译{i}') for i, r in enumerate(pending)]
+spliced = carryover.splice_translations(carried_rows, translated)
+assert [r['trans'] for r in spliced] == ['早上好', '早晨。', '译0', '走吧', '译1', '译2']
+assert carryover.splice_translations(carried_rows, translated[:-1]) is None
+assert carryover.splice_translations(carried_rows, translated[::-1]) is None
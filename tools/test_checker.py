@@ -0,0 +1,66 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from gakumas_auto_translate.modules import checker, config
+
+
+def write(path, text, mtime_ns=None):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def queued_txt():
+    return sorted(f for f in os.listdir('todo/untranslated/txt') if f.endswith('.txt'))
+
+
+def check():
+    with contextlib.redirect_stdout(io.StringIO()) as buf:
+        queued = checker.check_new_files()
+    return queued, buf.getvalue()
+
+
+cwd = os.getcwd()
+with tempfile.TemporaryDirectory() as tmp:
+    os.chdir(tmp)
+    try:
+        os.makedirs('dump')
+        os.makedirs('data')
+        config.dump_txt_path = os.path.join(tmp, 'dump')
+        write('dump/adv_a.txt', '[message text=おはよう]\n')
+        write('dump/adv_b.txt', '[message text=おやすみ]\n')
+        write('data/adv_a.txt', 'translated\n')
+
+        # 首次检查建立清单，只按文件名发现新增文件
+        queued, output = check()
+        assert queued and '已为dump_txt的2个文件建立内容清单' in output and '发现1个新增文件' in output
+        assert queued_txt() == ['adv_b.txt']
+        manifest = checker.load_manifest('.dump_manifest.json')
+        assert set(manifest) == {'adv_a.txt', 'adv_b.txt'}
+
+        # 修改时间变化但内容相同不算修订；内容变化的已翻译脚本加入待翻译
+        os.remove('todo/untranslated/txt/adv_b.txt')
+        write('data/adv_b.txt', 'translated\n')
+        write('dump/adv_a.txt', '[message text=おはよう]\n', mtime_ns=10 ** 18)
+        queued, output = check()
+        assert not queued and '没有发现新增文件' in output
+        write('dump/adv_b.txt', '[message text=おやすみなさい]\n', mtime_ns=2 * 10 ** 18)
+        write('dump/adv_c.txt', '[message text=ただいま]\n')
+        os.remove('dump/adv_a.txt')
+        queued, output = check()
+        assert queued and '发现1个内容修订的文件:\n- adv_b.txt' in output
+        assert '发现1个新增文件' in output and 'dump_txt中已删除1个文件:\n- adv_a.txt' in output
+        assert queued_txt() == ['adv_b.txt', 'adv_c.txt']
+
+        # 已加入待翻译的修订不再重复报告
+        _, output = check()
+        assert '内容修订' not in output and '已删除' not in output
+        assert set(checker.load_manifest('.dump_manifest.json')) == {'adv_b.txt', 'adv_c.txt'}
+    finally:
+        os.chdir(cwd)
@@ -0,0 +1,42 @@
+import csv
+import random
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+from gakumas_auto_translate.modules.utils import clean_html_tags, legacy_clean_html_tags
+
+
+cases = {
+    "": "",
+    "はい": "はい",
+    "<r\\=ルビ>本文</r>": "本文",
+    "<r\\=ルビ>本文/r>": "本文",
+    "十王<em\\=>社長</em>に": "十王社長に",
+    "<em>強調</em>と<b\\=x>太字</b>": "強調と太字",
+    "<r\\=>空ルビ</r>": "空ルビ",
+    "1 < 2": "1 < 2",
+}
+for text, expected in cases.items():
+    assert clean_html_tags(text) == expected, text
+    assert legacy_clean_html_tags(text) == expected, text
+assert clean_html_tags(None) is None
+
+# 嵌套、不成对、去除后拼出新标签等情况与原实现一致
+random.seed(0)
+atoms = ['<r\\=x>', '<r\\=>', '</r>', '/r>', '<em\\=a>', '<em>', '</em>', '<b>', '</b>',
+         '<e', 'm>', '<', '>', 'a', '\\=', '/', 'r', '<ruby\\=q>', '</ruby>']
+for _ in range(20000):
+    text = ''.join(random.choice(atoms) for _ in range(random.randint(1, 8)))
+    assert clean_html_tags(text) == legacy_clean_html_tags(text), text
+
+# 整个 csv_data/ 语料上与原实现逐行一致
+checked = 0
+for path in sorted((ROOT / "csv_data").glob("*.csv")):
+    with path.open(encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            for text in (row.get("text") or "", row.get("trans") or ""):
+                assert clean_html_tags(text) == legacy_clean_html_tags(text), (path.name, text)
+                checked += 1
+print(f"checked {checked} corpus strings")
@@ -0,0 +1,62 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import dict_impact
+from gakumas_auto_translate.modules import config
+
+
+def write(path, text):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def run(*args):
+    argv = sys.argv
+    sys.argv = ['dict_impact.py', '--workers', '1', *args]
+    try:
+        with contextlib.redirect_stdout(io.StringIO()) as buf:
+            dict_impact.main()
+    finally:
+        sys.argv = argv
+    return buf.getvalue()
+
+
+cwd = os.getcwd()
+mode = config.translation_mode
+with tempfile.TemporaryDirectory() as tmp:
+    os.chdir(tmp)
+    try:
+        for d in ('raw', 'csv_data', 'data'):
+            os.makedirs(d)
+        write('raw/adv_a.txt', '[message text=おはよう name=咲季]\n')
+        write('csv_data/adv_a.csv', 'id,name,text,trans\n0000000000000,咲季,おはよう,早上好\n译者,某人,,\n')
+        write('data/adv_a.txt', 'old version\n')
+        write('name_dictionary.json', json.dumps({'咲季': '咲季'}, ensure_ascii=False))
+        config.dump_txt_path = 'raw'
+        config.translation_mode = 'chinese'
+
+        # 首次运行只建立索引
+        assert '已建立词条索引' in run()
+        assert read('data/adv_a.txt') == 'old version\n'
+
+        # 未指定--mode时按配置的翻译模式（纯中文）重建受影响的文件
+        write('name_dictionary.json', json.dumps({'咲季': '咲季酱'}, ensure_ascii=False))
+        output = run('--rebuild')
+        assert '纯中文模式重建' in output, output
+        assert read('data/adv_a.txt') == '[message text=早上好 name=咲季酱]\n', read('data/adv_a.txt')
+    finally:
+        config.dump_txt_path = None
+        config.translation_mode = mode
+        os.chdir(cwd)
@@ -0,0 +1,35 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from gakumas_auto_translate.modules import lexer
+
+
+script = "\n".join([
+    '[backgroundgroup backgrounds=[background id=bg src=bg_001]]',
+    '[message text=こんにちは\\nプロデューサー name=咲季 clip=\\{"_startTime":1.5,"_duration":2.0,"sub":\\{"a":1\\}\\}]',
+    '  [narration text=——放課後。 hide=true wait=false clip=\\{"_startTime":4.0\\}]  ',
+    '[title title=第1話]',
+    '[choicegroup choices=[choice text=はい] choices=[choice text=いいえ] clip=\\{"_startTime":8.25\\}]',
+    '[message text=…… clip=\\{"_startTime":9.0\\}]',
+    '[overwritecharactersettinggroup characterColors=[overwritecharactersetting name=咲季 setting=x]]',
+])
+
+records = lexer.lex_script(script)
+assert [r.kind for r in records] == ['message', 'narration', 'title', 'choice', 'choice', 'message']
+assert [r.line_no for r in records] == [2, 3, 4, 5, 5, 6]
+assert [lexer.record_text(script, r) for r in records] == [
+    'こんにちは\\nプロデューサー', '——放課後。', '第1話', 'はい', 'いいえ', '……']
+assert lexer.record_name(script, records[0]) == '咲季'
+assert lexer.record_name(script, records[5]) == ''
+assert records[3].command == 'choicegroup'
+
+# clip区间包含嵌套的 \{ \}，不复制内容即可读取 _startTime
+first = records[0]
+assert script[first.clip_start:first.clip_end].endswith('\\}\\}')
+assert [lexer.clip_start_time(script, r) for r in records] == ['1.5', '4.0', None, '8.25', '8.25', '9.0']
+
+# name属性区间覆盖message说话人和角色设置
+assert [script[s:e] for s, e in lexer.name_spans(script)] == ['咲季', '咲季']
+
+assert lexer.lex_script('') == []
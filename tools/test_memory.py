@@ -0,0 +1,105 @@
+import csv
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from gakumas_auto_translate.modules import memory
+
+
+def write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['id', 'name', 'text', 'trans'])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def read_csv(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def row(row_id, text, trans='', name=''):
+    return {'id': row_id, 'name': name, 'text': text, 'trans': trans}
+
+
+assert memory.translator_rank('gpt-4o-2024-05-13') == memory.RANK_MACHINE
+assert memory.translator_rank('Pro/deepseek-ai/DeepSeek-V3') == memory.RANK_MACHINE
+assert memory.translator_rank('') == memory.RANK_UNKNOWN
+assert memory.translator_rank('煉金術式') == memory.RANK_HUMAN
+
+with tempfile.TemporaryDirectory() as tmp:
+    data_dir = os.path.join(tmp, 'csv_data')
+    os.makedirs(data_dir)
+    write_csv(os.path.join(data_dir, 'a.csv'), [
+        row('0000000000000', 'おはよう', '早安'),
+        row('0000000000000', '<em>行く</em>', '走'),
+        row('info', 'a.txt'),
+        row('译者', '', name='deepseek-chat'),
+    ])
+    write_csv(os.path.join(data_dir, 'b.csv'), [
+        row('0000000000000', 'おはよう', '早上好'),
+        row('0000000000000', '<em>行く</em>', '<em>走吧</em>'),
+        row('info', 'b.txt'),
+        row('译者', '', name='煉金術式'),
+    ])
+    tm = memory.TranslationMemory.load(data_dir)
+    # 人工译文优先；标签与原文不一致的译文不收录
+    assert tm.lookup(' おはよう ') == '早上好'
+    assert tm.lookup('<em>行く</em>') == '<em>走吧</em>'
+    assert tm.lookup('こんにちは') is None
+
+    # 修改文件后只重新读取该文件
+    write_csv(os.path.join(data_dir, 'b.csv'), [row('0000000000000', 'またね', '再见')])
+    tm = memory.TranslationMemory.load(data_dir)
+    assert tm.lookup('おはよう') == '早安'
+    assert tm.lookup('またね') == '再见'
+    assert set(memory.load_cache(data_dir)) == {'a.csv', 'b.csv'}
+
+    orig_dir = os.path.join(tmp, 'csv_orig')
+    dict_dir = os.path.join(tmp, 'csv_dict')
+    os.makedirs(orig_dir)
+    os.makedirs(dict_dir)
+    write_csv(os.path.join(orig_dir, 'c.csv'), [
+        row('0000000000000', 'おはよう', name='咲季'),
+        row('0000000000000', '新しい'),
+        row('info', 'c.txt'),
+    ])
+    write_csv(os.path.join(dict_dir, 'c.csv'), [
+        row('0000000000000', 'おはよう', name='咲季'),
+        row('0000000000000', '新しい'),
+        row('info', 'c.txt'),
+    ])
+    assert memory.prefill_batch(tm, orig_dir, dict_dir) == (1, 2)
+    assert [r['trans'] for r in read_csv(os.path.join(orig_dir, 'c.csv'))] == ['早安', '', '']
+    assert [r['trans'] for r in read_csv(os.path.join(dict_dir, 'c.csv'))] == ['早安', '', '']
+
+
+def levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+random.seed(0)
+for _ in range(2000):
+    a = ''.join(random.choice('あいうえ') for _ in range(random.randint(0, 12)))
+    b = ''.join(random.choice('あいうえ') for _ in range(random.randint(0, 70)))
+    assert memory.edit_distance(a, b) == levenshtein(a, b), (a, b)
+
+index = memory.FuzzyIndex()
+index.add('プロデューサー、おはようございます！', '制作人，早上好！')
+index.add('今日もレッスン、がんばりましょう。', '今天的课程也加油吧。')
+suggestions = index.suggest('プロデューサーさん、おはようございます！')
+assert [trans for _, _, trans in suggestions] == ['制作人，早上好！']
+assert 0.6 <= suggestions[0][0] < 1
+assert index.suggest('まったく関係のない文章です') == []
+# 增量加入后立即可查
+index.add('今日のレッスン、がんばりましょう！', '今天的课程加油吧！')
+assert [trans for _, _, trans in index.suggest('今日のレッスン、がんばりましょう。')] == ['今天的课程也加油吧。', '今天的课程加油吧！']
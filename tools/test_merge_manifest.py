@@ -0,0 +1,53 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from gakumas_auto_translate.modules import merge_manifest, merger
+
+
+def merge_quietly(**kwargs):
+    buf = io.StringIO()
+    with contextlib.redirect_stdout(buf):
+        merger.process_bilingual(**kwargs)
+    return [line for line in buf.getvalue().splitlines() if line.startswith('增量合并')][0]
+
+
+cwd = os.getcwd()
+with tempfile.TemporaryDirectory() as tmp:
+    os.chdir(tmp)
+    try:
+        for d in ('todo/untranslated/txt', 'todo/untranslated/csv_orig', 'todo/translated/csv'):
+            os.makedirs(d)
+        for name, text, trans in (('adv_a', 'おはよう', '早上好'), ('adv_b', 'おやすみ', '晚安')):
+            with open(f'todo/untranslated/txt/{name}.txt', 'w', encoding='utf-8') as f:
+                f.write(f'[message text={text} name=咲季]\n')
+            with open(f'todo/translated/csv/{name}.csv', 'w', encoding='utf-8', newline='') as f:
+                f.write(f'id,name,text,trans\n0000000000000,咲季,{text},{trans}\n')
+
+        assert '跳过输入未改动的 0 个文件，重新合并 2 个文件（写入 2 个输出' in merge_quietly()
+        assert set(merge_manifest.load('todo/translated/txt')) == {'adv_a.txt', 'adv_b.txt'}
+        # 输入未改动时全部跳过
+        assert '跳过输入未改动的 2 个文件，重新合并 0 个文件' in merge_quietly()
+
+        # 只重新合并改动了翻译的文件
+        with open('todo/translated/csv/adv_b.csv', 'w', encoding='utf-8', newline='') as f:
+            f.write('id,name,text,trans\n0000000000000,咲季,おやすみ,晚安哦\n')
+        assert '跳过输入未改动的 1 个文件，重新合并 1 个文件（写入 1 个输出' in merge_quietly()
+        with open('todo/translated/txt/adv_b.txt', encoding='utf-8') as f:
+            assert '晚安哦' in f.read()
+
+        # 字典变化使所有记录失效；输出内容相同的文件不重写
+        with open('name_dictionary.json', 'w', encoding='utf-8') as f:
+            f.write('{"保健医": "保健医生"}')
+        assert '重新合并 2 个文件（写入 0 个输出，内容未变化未重写 2 个）' in merge_quietly()
+
+        # 输出被删除时重新生成；force时忽略清单
+        os.remove('todo/translated/txt/adv_a.txt')
+        assert '跳过输入未改动的 1 个文件，重新合并 1 个文件（写入 1 个输出' in merge_quietly()
+        assert '跳过输入未改动的 0 个文件，重新合并 2 个文件' in merge_quietly(force=True)
+    finally:
+        os.chdir(cwd)
@@ -0,0 +1,33 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from gakumas_auto_translate.modules.dictionary import NameReplacer, legacy_replace
+
+
+name_dict = {
+    "花海社長": "花海社长",
+    "花海": "花海",
+    "客": "客人",
+    "旅行客": "旅行客",
+    "咲季": "咲季",
+    "ことね": "琴音",
+    "琴音ちゃん": "小琴音",
+    "リーリヤ": "莉莉娅",
+}
+replacer = NameReplacer(name_dict)
+samples = [
+    "",
+    "なにもない行",
+    "ことねとリーリヤ",
+    "花海社長、ことねちゃん",
+    "客がいる。旅行客もいる",
+    "客",
+    "ことねことね",
+    "ことねちゃん、リーリヤ\\nはい",
+]
+for text in samples:
+    assert replacer.replace(text) == legacy_replace(text, replacer.items), text
+
+# 替换值拼接后形成的新词条由后续字典项继续替换
+assert replacer.replace("ことねちゃん") == legacy_replace("ことねちゃん", replacer.items)
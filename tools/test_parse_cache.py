@@ -0,0 +1,28 @@
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from gakumas_auto_translate.modules import lexer, parse_cache
+
+
+script = "\n".join([
+    '[message text=おはよう name=咲季 clip=\\{"_startTime":1.0\\}]',
+    '[choicegroup choices=[choice text=はい] choices=[choice text=いいえ] clip=\\{"_startTime":2.0\\}]',
+    '[narration text=朝。]',
+])
+records = lexer.lex_script(script)
+names = lexer.name_spans(script)
+assert parse_cache.decode(parse_cache.encode(records, names)) == (records, names)
+assert parse_cache.decode(b'not a cache') is None
+
+with tempfile.TemporaryDirectory() as tmp:
+    # 未命中时解析并写入，命中时直接读取
+    assert parse_cache.lex_cached(script, tmp, 'abc') == (records, names)
+    assert parse_cache.load(tmp, 'abc') == (records, names)
+    assert parse_cache.lex_cached('', tmp, 'abc') == (records, names)
+    # 不传key时不读写缓存
+    assert parse_cache.lex_cached('', tmp, None) == ([], [])
+    assert parse_cache.prune(tmp, ['abc']) == 0
+    assert parse_cache.prune(tmp, []) == 1
+    assert parse_cache.load(tmp, 'abc') is None
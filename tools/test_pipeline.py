@@ -0,0 +1,110 @@
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from gakumas_auto_translate import main
+from gakumas_auto_translate.modules import pipeline
+from gakumas_auto_translate.modules.workspace import Workspace
+
+# 代替yarn translate:folder：把tmp/untranslated中每行译为“译:原文”写入tmp/translated
+FAKE_TRANSLATOR = '''
+import csv, os
+for name in os.listdir("tmp/untranslated"):
+    with open(os.path.join("tmp/untranslated", name), encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        row["trans"] = "译:" + row["text"]
+    os.makedirs("tmp/translated", exist_ok=True)
+    with open(os.path.join("tmp/translated", name), "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+'''
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def run(workspace, from_stage, to_stage, command, status_file):
+    with contextlib.redirect_stdout(io.StringIO()) as buf:
+        code = pipeline.run_pipeline(workspace, from_stage, to_stage, workers=1,
+                                     translate_command=command, status_file=status_file)
+    return code, buf.getvalue(), json.loads(read(status_file))
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    dump = os.path.join(tmp, 'dump')
+    for i in range(3):
+        write(os.path.join(dump, f'adv_{i}.txt'), f'[message text=台詞{i} name=咲季]\n')
+    write(os.path.join(tmp, 'name_dictionary.json'), '{"咲季": "咲季CN"}')
+    write(os.path.join(tmp, 'GakumasPreTranslation', '.env'), '')
+    write(os.path.join(tmp, 'fake_translator.py'), FAKE_TRANSLATOR)
+    command = [sys.executable, os.path.join(tmp, 'fake_translator.py')]
+    workspace = Workspace(tmp, dump, mode=pipeline.MODES['both'])
+    status_file = os.path.join(tmp, 'status.json')
+
+    # 一次运行完成全部阶段，人名字典只读取一次
+    code, output, status = run(workspace, 'check', 'clean', command, status_file)
+    assert code == 0, output
+    assert output.count('已加载字典') == 1, output
+    assert status['status'] == 'ok' and status['mode'] == 'dual'
+    assert [s['stage'] for s in status['stages']] == pipeline.STAGES
+    assert status['queued_files'] == ['adv_0.txt', 'adv_1.txt', 'adv_2.txt']
+    assert sorted(os.listdir(workspace.data_dir)) == ['adv_0.txt', 'adv_1.txt', 'adv_2.txt']
+    merged = read(os.path.join(workspace.data_dir, 'adv_1.txt'))
+    assert '台詞1' in merged and '译:台詞1' in merged and 'name=咲季CN' in merged, merged
+    # 双输出的纯中文结果在清理阶段归档到data_chinese，不随临时目录删除
+    assert sorted(os.listdir(workspace.data_chinese_dir)) == ['adv_0.txt', 'adv_1.txt', 'adv_2.txt']
+    chinese = read(os.path.join(workspace.data_chinese_dir, 'adv_1.txt'))
+    assert chinese == '[message text=译:台詞1 name=咲季CN]\n', chinese
+    assert not os.listdir(workspace.translated_txt_chinese_dir)
+
+    # 没有新文件时在检查阶段结束
+    code, output, status = run(workspace, 'check', 'clean', command, status_file)
+    assert code == 0 and status['status'] == 'no_changes' and status['queued_files'] == []
+    assert len(status['stages']) == 1
+
+    # 不执行翻译工具时停在翻译阶段，外部翻译完成后从merge继续
+    write(os.path.join(dump, 'adv_3.txt'), '[message text=新しい台詞 name=咲季]\n')
+    code, output, status = run(workspace, 'check', 'merge', None, status_file)
+    assert code == pipeline.EXIT_CODES[pipeline.WAITING_TRANSLATION] == 3
+    assert status['stages'][-1]['stage'] == 'translate'
+    assert os.listdir(workspace.gakumas_untranslated_dir) == ['adv_3.csv']
+    subprocess.run(command, cwd=workspace.gakumas_dir, check=True)
+    code, output, status = run(workspace, 'merge', 'clean', None, status_file)
+    assert code == 0, output
+    assert [s['stage'] for s in status['stages']] == ['merge', 'clean']
+    assert '译:新しい台詞' in read(os.path.join(workspace.data_dir, 'adv_3.txt'))
+    assert '译:新しい台詞' in read(os.path.join(workspace.data_chinese_dir, 'adv_3.txt'))
+
+    # 翻译工具输出缺失时合并阶段失败
+    write(os.path.join(dump, 'adv_4.txt'), '[message text=台詞4]\n')
+    code, output, status = run(workspace, 'check', 'translate', None, status_file)
+    assert code == 3
+    code, output, status = run(workspace, 'merge', 'clean', None, status_file)
+    assert code == 1 and status['status'] == 'failed' and status['stages'][0]['stage'] == 'merge'
+
+# 未配置dump_txt路径时watch子命令以失败退出码返回
+cwd = os.getcwd()
+with tempfile.TemporaryDirectory() as tmp:
+    os.chdir(tmp)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()) as buf:
+            code = main.main(['watch'])
+        assert code == pipeline.EXIT_CODES[pipeline.FAILED] == 1, buf.getvalue()
+    finally:
+        os.chdir(cwd)
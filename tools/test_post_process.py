@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from gakumas_auto_translate.modules import merger, utils
+
+
+script = "\n".join([
+    '[message text=<r\\=―ただいま>我回来了</r> name=咲季]',
+    '[narration text=<r\\=おかえり>欢迎回来</r><r\\=――>……</r>]',
+    '[title title=<r\\=―>不处理</r>]',
+    '[choicegroup choices=[choice text=<r\\=―はい>是</r>]]',
+    '',
+])
+
+# 只去除message和narration中属性含“―”的r标签，保留标签内文本
+expected = "\n".join([
+    '[message text=我回来了 name=咲季]',
+    '[narration text=<r\\=おかえり>欢迎回来</r>……]',
+    '[title title=<r\\=―>不处理</r>]',
+    '[choicegroup choices=[choice text=<r\\=―はい>是</r>]]',
+    '',
+])
+assert utils.process_unit_content(script) == expected
+
+# 按文件名匹配规则
+assert merger.apply_post_process('adv_unit_01-01_01.txt', script) == (expected, 1)
+assert merger.apply_post_process('adv_event_001.txt', script) == (script, 0)
+hooks = [('adv_unit_*.txt', utils.process_unit_content), ('adv_*.txt', str.upper)]
+assert merger.apply_post_process('adv_unit_01.txt', script, hooks) == (expected.upper(), 2)
@@ -0,0 +1,77 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from gakumas_auto_translate.modules import rebuild
+
+
+def write(path, text):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+cwd = os.getcwd()
+with tempfile.TemporaryDirectory() as tmp:
+    os.chdir(tmp)
+    try:
+        for d in ('raw', 'csv_data', 'data'):
+            os.makedirs(d)
+        for name, text, trans in (('adv_a', 'おはよう', '早上好'), ('adv_b', 'おやすみ', '晚安'), ('adv_c', 'ただいま', '我回来了')):
+            write(f'raw/{name}.txt', f'[message text={text} name=咲季]\n')
+            write(f'csv_data/{name}.csv', f'id,name,text,trans\n0000000000000,咲季,{text},{trans}\n译者,某人,,\n')
+        # todo中当前批次的原文CSV不参与重建
+        os.makedirs('todo/untranslated/csv_orig')
+        write('todo/untranslated/csv_orig/adv_a.csv', 'id,name,text,trans\n0000000000000,咲季,別の文,\n')
+
+        buf = io.StringIO()
+        with contextlib.redirect_stdout(buf):
+            staging_dir, _ = rebuild.build_staging('raw', 'csv_data', 'data', 'bilingual', workers=1)
+        expected = {name: read(os.path.join(staging_dir, name)) for name in ('adv_a.txt', 'adv_b.txt', 'adv_c.txt')}
+        # adv_a按csv_data的text定位，译文正常写入
+        assert '早上好' in expected['adv_a.txt']
+        os.rename(staging_dir, 'reference')
+
+        write('data/adv_a.txt', expected['adv_a.txt'])
+        write('data/adv_b.txt', 'old version\n')
+        write('data/adv_old.txt', 'no csv for this one\n')
+        with contextlib.redirect_stdout(buf):
+            assert rebuild.rebuild_data('raw', 'csv_data', 'data', 'bilingual', workers=1)
+        output = buf.getvalue()
+        assert '新增: 1 个文件' in output and '内容变化: 1 个文件' in output
+        assert '内容相同: 1 个文件' in output and '未重建沿用原文件: 1 个文件' in output
+        # 替换后data中是重建结果，未重建的文件保留，暂存目录和旧目录都已移除
+        for name, text in expected.items():
+            assert read(f'data/{name}') == text
+        assert read('data/adv_old.txt') == 'no csv for this one\n'
+        assert sorted(os.listdir('data')) == ['adv_a.txt', 'adv_b.txt', 'adv_c.txt', 'adv_old.txt']
+        assert not os.path.exists('data.rebuild') and not os.path.exists('data.old')
+
+        # 只重建指定的文件，其余沿用
+        write('data/adv_b.txt', 'old version\n')
+        write('data/adv_c.txt', 'old version\n')
+        with contextlib.redirect_stdout(buf):
+            staging_dir, summary = rebuild.build_staging('raw', 'csv_data', 'data', 'bilingual', workers=1,
+                                                         files={'adv_b.csv'})
+        assert summary['changed'] == ['adv_b.txt'] and summary['kept'] == ['adv_a.txt', 'adv_c.txt', 'adv_old.txt']
+        assert read(os.path.join(staging_dir, 'adv_c.txt')) == 'old version\n'
+
+        # 纯中文模式
+        with contextlib.redirect_stdout(buf):
+            staging_dir, summary = rebuild.build_staging('raw', 'csv_data', 'data', 'chinese', workers=1)
+        assert len(summary['changed']) == 3 and read(os.path.join(staging_dir, 'adv_b.txt')) != expected['adv_b.txt']
+
+        # 原始脚本目录只读：编码和解析缓存写入工作区的.cache，不写入raw
+        assert sorted(os.listdir('raw')) == ['adv_a.txt', 'adv_b.txt', 'adv_c.txt']
+        assert os.path.exists('.cache/rebuild/.encoding_cache.json')
+        assert len(os.listdir('.cache/rebuild/.parse_cache')) == 3
+    finally:
+        os.chdir(cwd)
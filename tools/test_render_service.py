@@ -0,0 +1,113 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from gakumas_auto_translate.modules import merger, render_service
+
+name_dict = {'保健医': '保健医生'}
+
+with tempfile.TemporaryDirectory() as tmp:
+    raw_dir = os.path.join(tmp, 'raw')
+    csv_dir = os.path.join(tmp, 'csv')
+    os.makedirs(raw_dir)
+    os.makedirs(csv_dir)
+    script = ('[message text=<r\\=―おはよう>おはよう</r> name=保健医]\n'
+              '[narration text=朝。]\n'
+              '[choicegroup choices=[choice text=はい]]\n')
+    csv_text = ('id,name,text,trans\n'
+                '0000000000000,保健医,<r\\=―おはよう>おはよう</r>,早上好\n'
+                '0000000000000,__narration__,朝。,早晨。\n'
+                'select,,はい,好的\n')
+    with open(os.path.join(raw_dir, 'adv_unit_test.txt'), 'w', encoding='utf-8') as f:
+        f.write(script)
+    with open(os.path.join(csv_dir, 'adv_unit_test.csv'), 'w', encoding='utf-8', newline='') as f:
+        f.write(csv_text)
+
+    # 与菜单4合并（含adv_unit后处理）的结果一致
+    renderer = render_service.Renderer(raw_dir, csv_dir, name_dict)
+    name_index = merger.build_name_index(name_dict)
+    for mode, merge_file in (('chinese', merger.merge_chinese_only_file), ('bilingual', merger.merge_bilingual_file)):
+        expected = merge_file('adv_unit_test.csv', csv_dir, raw_dir, name_index, raw_csv_dir=None)['output']
+        expected, _ = merger.apply_post_process('adv_unit_test.txt', expected)
+        rendered = renderer.render('adv_unit_test', csv_text, mode)
+        assert rendered['output'] == expected and not rendered['cached'] and not rendered['errors']
+        assert renderer.render('adv_unit_test.txt', csv_path='adv_unit_test.csv', mode=mode)['cached']
+    assert '保健医生' in rendered['output']
+    assert renderer.stats()['raw_cache'] == {'size': 1, 'maxsize': 256, 'hits': 3, 'misses': 1}
+
+    # 原始脚本改动后重新读取
+    with open(os.path.join(raw_dir, 'adv_unit_test.txt'), 'a', encoding='utf-8') as f:
+        f.write('[narration text=夜。]\n')
+    os.utime(os.path.join(raw_dir, 'adv_unit_test.txt'), ns=(1, 1))
+    assert not renderer.render('adv_unit_test', csv_text, 'chinese')['cached']
+
+    # 有错误的CSV返回错误行，不生成输出
+    broken = renderer.render('adv_unit_test', 'id,name,text,trans\n0000000000000,,朝。,\n', 'chinese')
+    assert broken['output'] is None and broken['errors'][0][2] == '条目内容不完整'
+
+    # LRU淘汰最久未使用的条目
+    cache = render_service.LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert cache.get('b') is None and cache.get('a') == 1
+
+    for bad in (dict(script='../raw/adv_unit_test.txt', csv_text=csv_text),
+                dict(script='adv_missing', csv_text=csv_text),
+                dict(script='adv_unit_test', csv_path='../raw/adv_unit_test.txt'),
+                dict(script='adv_unit_test', csv_text=csv_text, mode='dual'),
+                dict(script=123, csv_text='a'),
+                dict(script=None, csv_text=csv_text),
+                dict(script='adv_unit_test', csv_path=5),
+                dict(script='adv_unit_test', csv_text=b'a'),
+                dict(script='adv_unit_test', csv_text=csv_text, mode=['chinese'])):
+        try:
+            renderer.render(**bad)
+            raise AssertionError(bad)
+        except render_service.RenderError:
+            pass
+
+    # HTTP接口
+    server = render_service.make_server(renderer, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        base = f"http://127.0.0.1:{server.server_port}"
+
+        def post(path, data):
+            request = urllib.request.Request(base + path, json.dumps(data).encode('utf-8'),
+                                             {'Content-Type': 'application/json'})
+            try:
+                with urllib.request.urlopen(request) as response:
+                    return response.status, json.load(response)
+            except urllib.error.HTTPError as e:
+                return e.code, json.load(e)
+
+        status, body = post('/render', {'script': 'adv_unit_test.txt', 'csv': csv_text, 'mode': 'chinese'})
+        assert status == 200 and body['cached'] and '早晨。' in body['output']
+        status, body = post('/render_batch', {'items': [{'script': 'adv_unit_test', 'csv_path': 'adv_unit_test.csv'},
+                                                        {'script': 'adv_missing', 'csv': csv_text}]})
+        assert status == 200 and '好的' in body['results'][0]['output'] and 'error' in body['results'][1]
+        assert post('/render', {'script': '../x', 'csv': csv_text})[0] == 400
+        # 参数类型错误返回400，批量请求中只影响出错的一项
+        assert post('/render', {'script': 123, 'csv': 'a'})[0] == 400
+        assert post('/render', {'script': 'adv_unit_test.txt', 'csv_path': 5})[0] == 400
+        assert post('/render', {'script': 'adv_unit_test.txt', 'csv': csv_text, 'mode': {}})[0] == 400
+        assert post('/render_batch', {'items': 5})[0] == 400
+        status, body = post('/render_batch', {'items': [{'script': 123, 'csv': 'a'},
+                                                        {'script': 'adv_unit_test', 'csv_path': 5},
+                                                        {'script': 'adv_unit_test', 'csv': csv_text}]})
+        assert status == 200 and 'error' in body['results'][0] and 'error' in body['results'][1]
+        assert '早晨。' in body['results'][2]['output']
+        with urllib.request.urlopen(base + '/stats') as response:
+            assert json.load(response)['output_cache']['size'] >= 2
+    finally:
+        server.shutdown()
+        server.server_close()
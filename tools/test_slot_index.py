@@ -0,0 +1,94 @@
+import copy
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from gakumas_auto_translate.modules import merger
+
+
+def replace_slot_prefix(slots, orig, replacement):
+    """把以orig开头的区间值的这一前缀替换为replacement（与原先逐行re.sub的匹配规则一致），返回是否有区间发生变化"""
+    changed = False
+    for slot in slots:
+        value = slot[2]
+        if value.startswith(orig):
+            new_value = replacement + value[len(orig):]
+            if new_value != value:
+                slot[2] = new_value
+                changed = True
+    return changed
+
+
+# 索引替换与逐个区间前缀替换的结果一致，包括前缀互相包含、替换值又以其他原文开头的情况
+random.seed(0)
+alphabet = 'あいう'
+for _ in range(3000):
+    values = [''.join(random.choice(alphabet) for _ in range(random.randint(1, 4))) for _ in range(random.randint(1, 8))]
+    slots = [[i * 10, i * 10 + 1, value] for i, value in enumerate(values)]
+    rows = [(''.join(random.choice(alphabet) for _ in range(random.randint(1, 3))),
+             ''.join(random.choice(alphabet + '中') for _ in range(random.randint(0, 4))))
+            for _ in range(random.randint(1, 6))]
+    expected = copy.deepcopy(slots)
+    index = merger.SlotIndex(slots, [orig for orig, _ in rows])
+    for orig, replacement in rows:
+        assert bool(index.replace_prefix(orig, replacement)) == replace_slot_prefix(expected, orig, replacement)
+        assert slots == expected, (values, rows)
+
+# name属性每个区间只改写一次，取最长的说话人前缀
+name_slots = [[0, 1, '保健医'], [5, 6, '生徒B'], [9, 10, '生徒たち'], [12, 13, '咲季']]
+name_index = merger.build_name_index({'保健医': '保健医生', '生徒': '学生', '生徒たち': '学生们', '咲季': '咲季', '広': '广'})
+assert merger._translate_names(name_slots, {'保健医', '生徒', '生徒たち', '咲季'}, name_index) == 3
+assert [slot[2] for slot in name_slots] == ['保健医生', '学生B', '学生们', '咲季']
+
+# 双输出模式一次读取生成的两种结果与分别合并的结果一致
+import os
+import shutil
+import tempfile
+
+work_dir = tempfile.mkdtemp()
+try:
+    csv_dir = os.path.join(work_dir, 'csv')
+    txt_dir = os.path.join(work_dir, 'txt')
+    os.makedirs(csv_dir)
+    os.makedirs(txt_dir)
+    with open(os.path.join(txt_dir, 'adv_test.txt'), 'w', encoding='utf-8') as f:
+        f.write('[message text=おはよう name=咲季]\n[message text=おやすみ name=保健医]\n')
+    with open(os.path.join(csv_dir, 'adv_test.csv'), 'w', encoding='utf-8', newline='') as f:
+        f.write('id,name,text,trans\n0000000000000,咲季,おはよう,早上好\n0000000000000,保健医,おやすみ,晚安\n译者,,,\n')
+    name_index = merger.build_name_index({'保健医': '保健医生'})
+    bilingual, chinese = merger._dual_outputs('adv_test.csv', csv_dir, txt_dir, name_index)
+    assert bilingual == merger.merge_bilingual_file('adv_test.csv', csv_dir, txt_dir, name_index)
+    assert chinese == merger.merge_chinese_only_file('adv_test.csv', csv_dir, txt_dir, name_index)
+    assert bilingual['output'] != chinese['output'] and '晚安' in chinese['output']
+finally:
+    shutil.rmtree(work_dir)
+
+# 译文应用情况：重复台词、未找到、按前缀改写更长文本的行分别统计，警告带CSV和脚本行号
+work_dir = tempfile.mkdtemp()
+try:
+    csv_dir = os.path.join(work_dir, 'csv')
+    txt_dir = os.path.join(work_dir, 'txt')
+    os.makedirs(csv_dir)
+    os.makedirs(txt_dir)
+    with open(os.path.join(txt_dir, 'adv_cover.txt'), 'w', encoding='utf-8') as f:
+        f.write('[message text=はい name=咲季]\n'
+                '[message text=はい name=咲季]\n'
+                '[choicegroup choices=[choice text=青紫] choices=[choice text=青]]\n'
+                '[message text=……。 name=咲季]\n')
+    with open(os.path.join(csv_dir, 'adv_cover.csv'), 'w', encoding='utf-8', newline='') as f:
+        f.write('id,name,text,trans\n'
+                '0000000000000,咲季,はい,好的\n'
+                '0000000000000,咲季,はい,好的\n'
+                'select,,青,蓝色\n'
+                '0000000000000,咲季,……,……\n'
+                '0000000000000,咲季,いいえ,不\n')
+    result = merger.merge_chinese_only_file('adv_cover.csv', csv_dir, txt_dir, name_index)
+    assert result['coverage'] == {'applied': 2, 'covered': 1, 'not_found': 1, 'ambiguous': 1}
+    reports = {row[2]: row[5] for row in result['error_rows']}
+    assert reports['译文未应用'].startswith('CSV第6行')
+    assert reports['匹配不唯一'].startswith('CSV第4行，脚本第3、3行')
+    # 警告不影响生成输出
+    assert '[choice text=蓝色紫]' in result['output']
+finally:
+    shutil.rmtree(work_dir)
@@ -0,0 +1,91 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from gakumas_auto_translate.modules import staging
+
+
+def write(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    src_dir = os.path.join(tmp, 'src')
+    data_dir = os.path.join(tmp, 'data')
+    os.makedirs(src_dir)
+    os.makedirs(os.path.join(data_dir, 'sub'))
+    write(os.path.join(src_dir, 'a.txt'), 'new a')
+    write(os.path.join(src_dir, 'b.txt'), 'new b')
+    write(os.path.join(data_dir, 'a.txt'), 'old a')
+    write(os.path.join(data_dir, 'c.txt'), 'old c')
+    write(os.path.join(data_dir, 'sub', 'd.txt'), 'old d')
+
+    # 同一文件系统上硬链接，已存在的目标被替换
+    dst = os.path.join(tmp, 'placed.txt')
+    write(dst, 'stale')
+    assert staging.link_file(os.path.join(src_dir, 'a.txt'), dst) == staging.LINK
+    assert os.path.samefile(dst, os.path.join(src_dir, 'a.txt'))
+    assert staging.link_file(os.path.join(src_dir, 'a.txt'), dst) == staging.LINK
+
+    # replace_file改写链接出来的文件时不影响源文件；出错时保留原内容
+    with staging.replace_file(dst) as f:
+        f.write('rewritten')
+    assert read(dst) == 'rewritten' and read(os.path.join(src_dir, 'a.txt')) == 'new a'
+    try:
+        with staging.replace_file(dst) as f:
+            f.write('partial')
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert read(dst) == 'rewritten' and not os.path.exists(dst + '.tmp')
+
+    # 中途出错时data目录保持原样，暂存目录被清理
+    original_link = staging.link_file
+    calls = []
+
+    def failing_link(src, dst):
+        calls.append(src)
+        if len(calls) == 3:
+            raise OSError('disk full')
+        return original_link(src, dst)
+
+    staging.link_file = failing_link
+    try:
+        staging.update_dir(data_dir, src_dir, ['a.txt', 'b.txt'])
+        raise AssertionError('update_dir应当失败')
+    except OSError:
+        pass
+    finally:
+        staging.link_file = original_link
+    assert sorted(os.listdir(tmp)) == ['data', 'placed.txt', 'src']
+    assert read(os.path.join(data_dir, 'a.txt')) == 'old a'
+    assert not os.path.exists(os.path.join(data_dir, 'b.txt'))
+
+    # 成功时整体替换：更新的文件来自源目录，其余文件（含子目录）保留
+    counts = staging.update_dir(data_dir, src_dir, ['a.txt', 'b.txt'])
+    assert counts == {staging.LINK: 2}
+    assert sorted(os.listdir(data_dir)) == ['a.txt', 'b.txt', 'c.txt', 'sub']
+    assert read(os.path.join(data_dir, 'a.txt')) == 'new a'
+    assert read(os.path.join(data_dir, 'c.txt')) == 'old c'
+    assert read(os.path.join(data_dir, 'sub', 'd.txt')) == 'old d'
+    assert sorted(os.listdir(tmp)) == ['data', 'placed.txt', 'src']
+
+    # 两次重命名之间中断：data不存在而data.old存在时恢复
+    os.replace(data_dir, data_dir + '.old')
+    os.makedirs(data_dir + '.staging')
+    assert staging.recover_dir(data_dir)
+    assert read(os.path.join(data_dir, 'c.txt')) == 'old c'
+    assert sorted(os.listdir(tmp)) == ['data', 'placed.txt', 'src']
+    assert not staging.recover_dir(data_dir)
+
+    # 移动：同一文件系统上只是重命名
+    assert staging.move_file(os.path.join(src_dir, 'b.txt'), os.path.join(tmp, 'b.txt')) == staging.MOVE
+    assert not os.path.exists(os.path.join(src_dir, 'b.txt'))
@@ -0,0 +1,72 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from gakumas_auto_translate.modules import term_index
+
+
+# 同一位置开始的长短词条、被长词条包含的词条都能找到
+scanner = term_index.TermScanner(['花海', '花海咲季', '咲季', '佑芽', 'P'])
+assert scanner.find('花海咲季と佑芽') == {'花海', '花海咲季', '咲季', '佑芽'}
+assert scanner.find('') == set() and term_index.TermScanner([]).find('花海') == set()
+
+# 受影响词条：译名变化的词条，以及包含它或替换值含有它的词条
+old = {'咲季': '咲季', '花海咲季': '花海咲季', '佑芽': '佑芽', 'プロデューサー': '制作人'}
+new = {'咲季': '咲季酱', '花海咲季': '花海咲季', '佑芽': '佑芽', '先生': '老师'}
+assert term_index.changed_terms(old, new) == {'咲季', 'プロデューサー', '先生'}
+assert term_index.text_impact_terms(old, new) == {'咲季', '花海咲季', 'プロデューサー', '先生'}
+
+
+def write(path, text):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+
+
+def load(directory, name_dict):
+    with contextlib.redirect_stdout(io.StringIO()) as buf:
+        index = term_index.TermIndex.load(directory, name_dict)
+    return index, buf.getvalue()
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    write(os.path.join(tmp, 'adv_a.csv'), 'id,name,text,trans\n0000000000000,咲季,おはよう,早上好\n译者,某人,,\n')
+    write(os.path.join(tmp, 'adv_b.csv'), 'id,name,text,trans\n0000000000000,佑芽,プロデューサー！,制作人！\n')
+    write(os.path.join(tmp, 'adv_c.txt'), '[message text=先生、花海咲季です name=咲季]\n')
+
+    index, output = load(tmp, old)
+    assert '重新扫描 3 个' in output
+    assert index.data['files']['adv_a.csv']['speakers'] == ['咲季']
+    assert index.data['files']['adv_c.txt']['terms'] == ['咲季', '花海咲季']
+    assert index.snapshot is None
+    index.accept(old)
+
+    # 未改动的文件直接复用；字典出现新词条时重新扫描文本
+    index, output = load(tmp, old)
+    assert '重新扫描 0 个' in output and index.snapshot == old
+    index, output = load(tmp, new)
+    assert '重新扫描 3 个' in output
+    assert index.data['files']['adv_c.txt']['terms'] == ['先生', '咲季', '花海咲季']
+    # 译者行不是说话人；咲季的译名变化只影响以咲季为说话人的文件
+    assert index.affected(index.snapshot, new) == (['adv_a.csv', 'adv_c.txt'], ['adv_b.csv', 'adv_c.txt'])
+
+    write(os.path.join(tmp, 'adv_b.csv'), 'id,name,text,trans\n0000000000000,咲季,はい,好\n')
+    os.utime(os.path.join(tmp, 'adv_b.csv'), ns=(1, 1))
+    index, output = load(tmp, new)
+    assert '重新扫描 1 个' in output
+    assert index.affected(old, new)[0] == ['adv_a.csv', 'adv_b.csv', 'adv_c.txt']
+
+# 只读目录的索引保存在单独的缓存目录，被索引的目录不写入任何文件
+with tempfile.TemporaryDirectory() as tmp:
+    raw_dir = os.path.join(tmp, 'raw')
+    cache_dir = os.path.join(tmp, '.cache', 'raw_term_index')
+    os.makedirs(raw_dir)
+    write(os.path.join(raw_dir, 'adv_a.txt'), '[message text=おはよう name=咲季]\n')
+    with contextlib.redirect_stdout(io.StringIO()):
+        term_index.TermIndex.load(raw_dir, old, cache_dir).accept(old)
+        index = term_index.TermIndex.load(raw_dir, old, cache_dir)
+    assert os.listdir(raw_dir) == ['adv_a.txt']
+    assert index.snapshot == old and index.data['files']['adv_a.txt']['speakers'] == ['咲季']
@@ -0,0 +1,102 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from gakumas_auto_translate.modules import checker, watcher
+from gakumas_auto_translate.modules.workspace import Workspace
+
+
+def write(path, text, age=None):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    if age is not None:
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+
+
+def read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def quiet(func, *args):
+    with contextlib.redirect_stdout(io.StringIO()) as buf:
+        result = func(*args)
+    return result, buf.getvalue()
+
+
+def poll_until(dump_watcher, filename, limit=5.0):
+    """轮询直到处理了filename，返回输出"""
+    output = ''
+    deadline = time.monotonic() + limit
+    while time.monotonic() < deadline:
+        _, out = quiet(dump_watcher.poll_once)
+        output += out
+        if filename in out:
+            return output
+    raise AssertionError(f'{filename}未被处理: {output}')
+
+
+def run(source_factory):
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            os.makedirs('dump')
+            os.makedirs('data')
+            write('name_dictionary.json', '{"咲季": "咲季CN"}')
+            write('dump/adv_done.txt', '[message text=翻訳済み name=咲季]\n', age=60)
+            write('data/adv_done.txt', 'translated\n')
+            write('dump/adv_old.txt', '[message text=昔の 咲季 name=咲季]\n', age=60)
+
+            dump_watcher = watcher.DumpWatcher(Workspace('.', 'dump'), source_factory('dump'), settle=0.3)
+            _, output = quiet(dump_watcher.rescan)
+            # 启动时发现未翻译的已有文件，已翻译且未修订的文件不处理
+            assert dump_watcher.pending == {'adv_old.txt'}
+            output = poll_until(dump_watcher, 'adv_old.txt')
+            assert 'adv_old.txt（新增）已生成CSV' in output
+            assert '咲季CN' in read('todo/untranslated/csv_dict/adv_old.csv')
+            assert '咲季CN' not in read('todo/untranslated/csv_orig/adv_old.csv')
+
+            # 新转储的文件等待写入完成后处理
+            write('dump/adv_new.txt', '[message text=新しい name=咲季]\n')
+            start = time.time()
+            output = poll_until(dump_watcher, 'adv_new.txt')
+            assert time.time() - start >= 0.25
+            assert 'adv_new.txt（新增）' in output and '写入后' in output
+            assert os.path.exists('todo/untranslated/csv_dict/adv_new.csv')
+
+            # 已放入待翻译目录的文件被原地改写（与todo中的文件是同一个硬链接）时重新生成CSV
+            write('dump/adv_new.txt', '[message text=こんばんは name=咲季]\n')
+            assert os.path.samefile('dump/adv_new.txt', 'todo/untranslated/txt/adv_new.txt')
+            output = poll_until(dump_watcher, 'adv_new.txt')
+            assert 'adv_new.txt（新增）已生成CSV' in output
+            assert 'こんばんは' in read('todo/untranslated/csv_orig/adv_new.csv')
+            assert 'こんばんは' in read('todo/untranslated/csv_dict/adv_new.csv')
+
+            # 已翻译脚本内容修订时重新处理
+            write('dump/adv_done.txt', '[message text=修正済み name=咲季]\n')
+            output = poll_until(dump_watcher, 'adv_done.txt')
+            assert 'adv_done.txt（修订）' in output
+            assert '修正済み' in read('todo/untranslated/csv_orig/adv_done.csv')
+
+            # 已处理的同一版本不再重复处理；删除的文件从清单移除
+            _, output = quiet(dump_watcher.rescan)
+            assert not dump_watcher.pending
+            os.remove('dump/adv_new.txt')
+            _, output = quiet(dump_watcher.rescan)
+            assert 'dump_txt中已删除: adv_new.txt' in output
+            assert set(checker.load_manifest(dump_watcher.workspace.dump_manifest_file)) == {'adv_done.txt', 'adv_old.txt'}
+            dump_watcher.source.close()
+        finally:
+            os.chdir(cwd)
+
+
+run(lambda path: watcher.PollingSource(path, interval=0.05, full_scan_interval=0))
+if sys.platform.startswith('linux'):
+    run(watcher.InotifySource)
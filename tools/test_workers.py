@@ -0,0 +1,95 @@
+import contextlib
+import csv
+import io
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from gakumas_auto_translate.modules import merger, preprocessor
+from gakumas_auto_translate.modules.workspace import Workspace
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+
+
+def snapshot(directory):
+    """目录中全部文件的内容（不含缓存和合并清单）"""
+    files = {}
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.startswith('.') or not os.path.isfile(path):
+            continue
+        with open(path, 'rb') as f:
+            files[name] = f.read()
+    return files
+
+
+def translate(workspace, index):
+    """代替翻译工具；每隔几个文件留一行未翻译，使合并产生错误报告"""
+    os.makedirs(workspace.translated_csv_dir, exist_ok=True)
+    for name in sorted(os.listdir(workspace.csv_orig_dir)):
+        with open(os.path.join(workspace.csv_orig_dir, name), encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            row['trans'] = '译:' + row['text']
+        if index[name] % 4 == 1:
+            rows[0]['trans'] = ''
+        with open(os.path.join(workspace.translated_csv_dir, name), 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def run(root, workers):
+    """在root下用workers个进程执行预处理和双输出合并，返回日志和全部输出"""
+    workspace = Workspace(root, mode="dual", dict_file=os.path.join(root, 'name_dictionary.json'))
+    write(workspace.dict_file, '{"咲季": "咲季CN", "先生": "老师"}')
+    names = [f'adv_{i:02d}.txt' for i in range(12)]
+    for i, name in enumerate(names):
+        lines = [f'[message text=<r\\=さき>咲季</r>の台詞{i}-{j} name=咲季]' for j in range(i % 5 + 1)]
+        lines.append(f'[narration text=先生と{i}]')
+        write(os.path.join(workspace.todo_txt_dir, name), '\n'.join(lines) + '\n')
+
+    with contextlib.redirect_stdout(io.StringIO()) as buf:
+        assert preprocessor.preprocess_txt_files(workers=workers, workspace=workspace)
+    preprocess_log = buf.getvalue()
+    translate(workspace, {name.replace('.txt', '.csv'): i for i, name in enumerate(names)})
+    # 双输出合并经run_merge同时写出两种结果和两份错误报告
+    with contextlib.redirect_stdout(io.StringIO()) as buf:
+        assert merger.process_dual(workers=workers, workspace=workspace) is False
+    merge_log = buf.getvalue()
+
+    outputs = {
+        'csv_orig': snapshot(workspace.csv_orig_dir),
+        'csv_dict': snapshot(workspace.csv_dict_dir),
+        'txt': snapshot(workspace.translated_txt_dir),
+        'txt_chinese': snapshot(workspace.translated_txt_chinese_dir),
+    }
+    for label in ("", "chinese"):
+        with open(workspace.error_report(label), 'rb') as f:
+            outputs['error_report_' + label] = f.read()
+    # 日志中的绝对路径按工作区根目录替换后比较
+    logs = [log.replace(os.path.abspath(root), '<root>').replace(root, '<root>')
+            for log in (preprocess_log, merge_log)]
+    return logs, outputs
+
+
+# 进程池运行的日志、生成的CSV、合并结果和错误报告与单进程运行完全一致
+with tempfile.TemporaryDirectory() as tmp:
+    serial_logs, serial_outputs = run(os.path.join(tmp, 'serial'), 1)
+    parallel_logs, parallel_outputs = run(os.path.join(tmp, 'parallel'), 2)
+
+# 有错误的文件不写出
+assert len(serial_outputs['txt']) == len(serial_outputs['txt_chinese']) == 9
+assert serial_outputs['error_report_'].count('条目内容不完整'.encode()) == 3
+assert serial_outputs == parallel_outputs
+assert serial_logs[0] == parallel_logs[0], (serial_logs[0], parallel_logs[0])
+assert serial_logs[1] == parallel_logs[1], (serial_logs[1], parallel_logs[1])
+# 日志按文件名顺序输出
+positions = [serial_logs[0].index(f'adv_{i:02d}.csv') for i in range(12)]
+assert positions == sorted(positions)
@@ -0,0 +1,89 @@
+import contextlib
+import csv
+import io
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from gakumas_auto_translate.modules import checker, cleaner, merger, preprocessor
+from gakumas_auto_translate.modules.workspace import Workspace
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def fake_translate(workspace):
+    """代替翻译工具：把csv_orig中的每行译为“译:原文”写入translated/csv"""
+    os.makedirs(workspace.translated_csv_dir, exist_ok=True)
+    for name in os.listdir(workspace.csv_orig_dir):
+        with open(os.path.join(workspace.csv_orig_dir, name), encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            if row['text']:
+                row['trans'] = '译:' + row['text']
+        with open(os.path.join(workspace.translated_csv_dir, name), 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def batch(workspace, errors):
+    try:
+        assert checker.check_new_files(workspace)
+        assert preprocessor.preprocess_txt_files(carry_over=True, workspace=workspace)
+        fake_translate(workspace)
+        assert merger.process_chinese_only(workspace=workspace)
+        assert cleaner.cleanup_and_copy(workspace)
+    except BaseException as e:
+        errors.append((workspace.root, e))
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    # 两个批次共用人名字典，各自有独立的dump、todo、data和csv_data
+    shared_dict = os.path.join(tmp, 'name_dictionary.json')
+    write(shared_dict, '{"咲季": "咲季CN"}')
+    workspaces = []
+    for prefix in ('hski', 'ttmr'):
+        root = os.path.join(tmp, prefix)
+        dump = os.path.join(root, 'dump')
+        for i in range(20):
+            write(os.path.join(dump, f'adv_{prefix}_{i:02d}.txt'), f'[message text={prefix}の台詞{i} name=咲季]\n')
+        workspaces.append(Workspace(root, dump, mode="chinese", dict_file=shared_dict))
+
+    cwd = os.getcwd()
+    errors = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        threads = [threading.Thread(target=batch, args=(workspace, errors)) for workspace in workspaces]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert not errors, errors
+    assert os.getcwd() == cwd
+
+    for workspace, prefix, other in zip(workspaces, ('hski', 'ttmr'), ('ttmr', 'hski')):
+        data = sorted(os.listdir(workspace.data_dir))
+        assert data == [f'adv_{prefix}_{i:02d}.txt' for i in range(20)], data
+        output = read(os.path.join(workspace.data_dir, f'adv_{prefix}_03.txt'))
+        assert f'译:{prefix}の台詞3' in output and 'name=咲季CN' in output
+        assert sorted(os.listdir(workspace.csv_data_dir)) == [f'adv_{prefix}_{i:02d}.csv' for i in range(20)]
+        assert not os.listdir(workspace.todo_txt_dir)
+        assert not any(other in name for name in os.listdir(workspace.data_dir))
+        assert os.path.exists(workspace.dump_manifest_file)
+
+# 默认工作区保持原来的相对路径
+default = Workspace('.')
+assert default.todo_txt_dir == './todo/untranslated/txt'
+assert default.dict_file == './name_dictionary.json'
+assert default.gakumas_translated_dir == './GakumasPreTranslation/tmp/translated'